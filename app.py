@@ -1,21 +1,33 @@
 import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
-from flask import Flask, request
+from flask import Flask, request, jsonify, g
 from flask_caching import Cache
+import os
 import time
+import multiprocessing
 
 # Importar componentes de la aplicación
 from layouts.main_layout import create_layout
 from callbacks.filter_callbacks import register_filter_callbacks
 from callbacks.data_callbacks import register_data_callbacks
+from preload import iniciar_precarga, get_estado_precarga, cargar_version
+from data.versiones import fijar_version, liberar_version, iniciar_vigilancia, get_estado_versiones
+from utils.memoria import uso_memoria
 
-# Configuración del caché - SimpleCache es compatible con todas las versiones
+# Configuración del caché - SimpleCache es compatible con todas las versiones.
+# Con varios workers (gunicorn -w N) usar un backend compartido:
+#   CACHE_TYPE=FileSystemCache (directorio CACHE_DIR) o CACHE_TYPE=RedisCache (CACHE_REDIS_URL)
+# junto con RESULTADOS_BACKEND=archivos o redis (ver data/resultados.py)
 cache_config = {
-    'CACHE_TYPE': 'SimpleCache',  # En memoria, no requiere archivos
+    'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'SimpleCache'),  # Por defecto en memoria, no requiere archivos
     'CACHE_DEFAULT_TIMEOUT': 3600,
     'CACHE_THRESHOLD': 500  # Máximo número de items en caché
 }
+if cache_config['CACHE_TYPE'] == 'FileSystemCache':
+    cache_config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache-directory'))
+elif cache_config['CACHE_TYPE'] == 'RedisCache':
+    cache_config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
 
 # Inicializar la aplicación Flask
 server = Flask(__name__)
@@ -46,8 +58,43 @@ app.css.config.serve_locally = True
 app.layout = create_layout()
 
 # Registrar callbacks
-register_filter_callbacks(app, cache)
-register_data_callbacks(app, cache)
+calculos = {}
+calculos.update(register_filter_callbacks(app, cache))
+calculos.update(register_data_callbacks(app, cache))
+
+# Precalcular las combinaciones por defecto en segundo plano (PRECARGA=0 para desactivar).
+# Los procesos del pool de cálculo (data/ejecucion.py) importan este módulo y no deben precargar.
+# Con PRECARGA_MODO=maestro (gunicorn.conf.py) la precarga la hace el proceso maestro
+# antes de crear los workers, que heredan los datos y resultados ya calculados.
+PRECARGA_MODO = os.environ.get('PRECARGA_MODO', 'hilo')
+if os.environ.get('PRECARGA', '1') != '0' and multiprocessing.parent_process() is None and PRECARGA_MODO == 'hilo':
+    iniciar_precarga(calculos, server)
+
+
+def recargar_datos():
+    """Carga una versión nueva de los datos (y la precalcula si PRECARGA no es "0")."""
+    cargar_version(calculos if os.environ.get('PRECARGA', '1') != '0' else None, server)
+
+
+# Recarga en caliente: revisar los archivos de datos cada DATOS_INTERVALO_RECARGA segundos
+# (ver data/versiones.py). Con gunicorn el hilo se inicia en cada worker (gunicorn.conf.py).
+if multiprocessing.parent_process() is None and PRECARGA_MODO == 'hilo':
+    iniciar_vigilancia(recargar_datos)
+
+# Estado de la precarga (para balanceadores y verificaciones de disponibilidad)
+@server.route('/precarga')
+def estado_precarga():
+    return jsonify(get_estado_precarga())
+
+# Memoria del proceso que atiende la petición (para comparar workers)
+@server.route('/memoria')
+def memoria():
+    return jsonify(uso_memoria())
+
+# Versiones de los datos (activa, en carga, en memoria y en uso)
+@server.route('/datos')
+def estado_datos():
+    return jsonify(get_estado_versiones())
 
 # Handler global para errores
 @server.errorhandler(Exception)
@@ -59,6 +106,13 @@ def handle_error(e):
 @server.before_request
 def before_request():
     server.start_time = time.time()
+    # Toda la petición usa la versión de datos activa al empezar, aunque se recargue mientras tanto
+    g.token_version = fijar_version()
+
+@server.teardown_request
+def teardown_request(exc):
+    if 'token_version' in g:
+        liberar_version(g.pop('token_version'))
 
 @server.after_request
 def after_request(response):
@@ -1,17 +1,41 @@
 import pandas as pd
 import numpy as np
 from dash import Input, Output, callback_context
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import time
 import json
 import hashlib
 
 from data.data_loader import load_expuestos
-from data.data_processor import asignar_periodos, calcular_tiempo_desarrollo, crear_triangulo_siniestralidad
-from data.data_processor import calcular_factores_desarrollo, procesar_expuestos, calcular_siniestralidad_ultima
+from data.data_processor import procesar_expuestos
+from data.ejecucion import ejecutar, tarea_triangulo, tarea_factores, tarea_ultima
+from data.resumen import calcular_resumen
+from data.resultados import guardar_resultado, recuperar_resultado, memoizar_resultado
 from components.charts import generate_bar_chart_figure, generate_line_chart_figure
 
 
+def resultado_requerido(handle):
+    """
+    Recupera el DataFrame de un identificador recibido de otro callback
+    (recalculándolo si fue desalojado, ver resultados.recuperar_resultado).
+    
+    Args:
+        handle: Identificador del almacén de resultados (no vacío)
+    
+    Returns:
+        DataFrame del resultado
+    
+    Raises:
+        PreventUpdate: Si el resultado no está disponible; la interfaz
+            conserva lo que muestra en lugar de quedar vacía
+    """
+    df = recuperar_resultado(handle)
+    if df is None:
+        raise PreventUpdate
+    return df
+
+
 def register_data_callbacks(app, cache):
     """
     Registra los callbacks para el procesamiento y visualización de datos.
@@ -19,9 +43,42 @@ def register_data_callbacks(app, cache):
     Args:
         app: Aplicación Dash
         cache: Objeto de caché de Flask
+    
+    Returns:
+        Diccionario con las funciones de cálculo memoizadas
     """
     
-    # Callback optimizado para métricas usando cálculos eficientes
+    # Resumen unificado de la pestaña de datos (métricas, gráficos y tabla de ocurrencia)
+    @memoizar_resultado(cache)
+    def cached_resumen(filtered_data, tipo_valor):
+        """Calcula en una pasada todos los resúmenes de los datos filtrados de manera cacheada"""
+        df = resultado_requerido(filtered_data)
+        if df.empty:
+            return None
+        
+        resumen = calcular_resumen(df, tipo_valor)
+        
+        # Tabla de ocurrencia: porcentaje de pagados y orden descendente
+        ocurrencia = resumen["ocurrencia"].copy()
+        ocurrencia["Porcentaje_Pagados"] = np.where(
+            ocurrencia["Total_Siniestros"] > 0,
+            (ocurrencia["Siniestros_Con_Pago"] / ocurrencia["Total_Siniestros"] * 100).round(1),
+            0
+        )
+        ocurrencia = ocurrencia.sort_values("Periodo_Ocurrencia", ascending=False)
+        
+        # Convertir fechas a string para JSON
+        ocurrencia["Periodo_Ocurrencia"] = ocurrencia["Periodo_Ocurrencia"].dt.strftime("%Y-%m-%d")
+        
+        return {
+            "metricas": resumen["metricas"],
+            "barras": resumen["ocurrencia"].to_dict('records'),
+            "lineas": resumen["desarrollo"].to_dict('records'),
+            "ocurrencia": ocurrencia.to_dict('records')
+        }
+    
+    
+    # Callback para las métricas
     @app.callback(
         [
             Output("total_siniestros", "children"),
@@ -36,76 +93,21 @@ def register_data_callbacks(app, cache):
     )
     def update_metrics(filtered_data, tipo_valor):
         """Actualiza las métricas basadas en los datos filtrados."""
-        if not filtered_data:
+        resumen = cached_resumen(filtered_data, tipo_valor) if filtered_data else None
+        if not resumen:
             return "0", "0", "$0", "$0"
         
-        start = time.time()
-        
-        # Extraer solo las columnas necesarias para eficiencia (en lugar de convertir todo)
-        pago_columna = f"Pago_{tipo_valor}"
-        valor_columna = "Valor"
-        
-        # Calcular métricas directamente desde los diccionarios
-        total_siniestros = len(filtered_data)
-        
-        # Usar comprensión de listas para mayor velocidad
-        siniestros_pagados = sum(1 for item in filtered_data if item.get(pago_columna, 0) > 0)
-        total_pagos = sum(item.get(pago_columna, 0) for item in filtered_data)
-        total_incurrido = sum(item.get(valor_columna, item.get(pago_columna, 0)) for item in filtered_data)
-        
-        print(f"Cálculo de métricas: {time.time() - start:.2f} segundos")
+        metricas = resumen["metricas"]
         
         # Formatear métricas
         return (
-            f"{total_siniestros:,}",
-            f"{siniestros_pagados:,}",
-            f"${total_pagos:,.0f}",
-            f"${total_incurrido:,.0f}"
+            f"{metricas['total_siniestros']:,}",
+            f"{metricas['siniestros_pagados']:,}",
+            f"${metricas['total_pagos']:,.0f}",
+            f"${metricas['total_incurrido']:,.0f}"
         )
     
     
-    # Versión cacheada para cálculos de gráficos
-    @cache.memoize()
-    def cached_calculate_chart_data(filtered_data, tipo_valor, chart_type):
-        """Calcula datos para gráficos de manera optimizada y cacheada"""
-        if not filtered_data:
-            return None
-        
-        start = time.time()
-        
-        # Convertir a DataFrame solo las columnas necesarias
-        pago_columna = f"Pago_{tipo_valor}"
-        
-        # Determinar las columnas que necesitamos
-        if chart_type == "bar":
-            periodo_col = "Periodo_Ocurrencia"
-        else:  # line
-            periodo_col = "Periodo_Desarrollo"
-        
-        # Extraer solo las columnas que necesitamos
-        df_mini = pd.DataFrame({
-            periodo_col: [item.get(periodo_col) for item in filtered_data],
-            "Conteo_Incurrido": [item.get("Conteo_Incurrido") for item in filtered_data],
-            pago_columna: [item.get(pago_columna, 0) for item in filtered_data]
-        })
-        
-        # Convertir fechas
-        df_mini[periodo_col] = pd.to_datetime(df_mini[periodo_col])
-        
-        # Agrupar para calcular resumen
-        resumen = df_mini.groupby(periodo_col).agg(
-            Total_Siniestros=("Conteo_Incurrido", "nunique"),
-            Siniestros_Con_Pago=(pago_columna, lambda x: (x > 0).sum()),
-            Total_Pagos=(pago_columna, "sum")
-        ).reset_index()
-        
-        # Ordenar por fecha
-        resumen = resumen.sort_values(periodo_col)
-        
-        print(f"Cálculo de datos para gráfico {chart_type}: {time.time() - start:.2f} segundos")
-        return resumen.to_dict('records')
-    
-    
     # Callback para el gráfico de barras de ocurrencia
     @app.callback(
         Output("grafico_barras_ocurrencia", "figure"),
@@ -119,14 +121,14 @@ def register_data_callbacks(app, cache):
         if not filtered_data:
             return go.Figure()
         
-        # Usar datos cacheados
-        chart_data = cached_calculate_chart_data(filtered_data, tipo_valor, "bar")
+        # Usar el resumen cacheado
+        resumen = cached_resumen(filtered_data, tipo_valor)
         
-        if not chart_data:
+        if not resumen or not resumen["barras"]:
             return go.Figure()
         
         # Convertir a DataFrame para el generador de gráficos
-        df = pd.DataFrame(chart_data)
+        df = pd.DataFrame(resumen["barras"])
         
         # Generar figura
         return generate_bar_chart_figure(
@@ -154,14 +156,14 @@ def register_data_callbacks(app, cache):
         if not filtered_data:
             return go.Figure()
         
-        # Usar datos cacheados
-        chart_data = cached_calculate_chart_data(filtered_data, tipo_valor, "line")
+        # Usar el resumen cacheado
+        resumen = cached_resumen(filtered_data, tipo_valor)
         
-        if not chart_data:
+        if not resumen or not resumen["lineas"]:
             return go.Figure()
         
         # Convertir a DataFrame para el generador de gráficos
-        df = pd.DataFrame(chart_data)
+        df = pd.DataFrame(resumen["lineas"])
         
         # Generar figura
         return generate_line_chart_figure(
@@ -176,61 +178,6 @@ def register_data_callbacks(app, cache):
         )
     
     
-    # Versión cacheada para tabla de ocurrencia
-    @cache.memoize()
-    def cached_ocurrencia_table(filtered_data, tipo_valor):
-        """Calcula datos para la tabla de ocurrencia de manera optimizada y cacheada"""
-        if not filtered_data:
-            return [], []
-        
-        start = time.time()
-        
-        # Pago columna basado en tipo de valor
-        pago_columna = f"Pago_{tipo_valor}"
-        
-        # Crear un DataFrame mínimo con solo las columnas necesarias
-        df_mini = pd.DataFrame({
-            "Periodo_Ocurrencia": [item.get("Periodo_Ocurrencia") for item in filtered_data],
-            "Conteo_Incurrido": [item.get("Conteo_Incurrido") for item in filtered_data],
-            pago_columna: [item.get(pago_columna, 0) for item in filtered_data]
-        })
-        
-        # Convertir fecha a datetime
-        df_mini["Periodo_Ocurrencia"] = pd.to_datetime(df_mini["Periodo_Ocurrencia"])
-        
-        # Agrupar por período de ocurrencia
-        resumen_ocurrencia = df_mini.groupby("Periodo_Ocurrencia").agg(
-            Total_Siniestros=("Conteo_Incurrido", "nunique"),
-            Siniestros_Con_Pago=(pago_columna, lambda x: (x > 0).sum()),
-            Total_Pagos=(pago_columna, "sum")
-        ).reset_index()
-        
-        # Calcular porcentaje de pagados de manera segura
-        resumen_ocurrencia["Porcentaje_Pagados"] = np.where(
-            resumen_ocurrencia["Total_Siniestros"] > 0,
-            (resumen_ocurrencia["Siniestros_Con_Pago"] / resumen_ocurrencia["Total_Siniestros"] * 100).round(1),
-            0
-        )
-        
-        # Ordenar por fecha descendente
-        resumen_ocurrencia = resumen_ocurrencia.sort_values("Periodo_Ocurrencia", ascending=False)
-        
-        # Convertir fechas a string para JSON
-        resumen_ocurrencia["Periodo_Ocurrencia"] = resumen_ocurrencia["Periodo_Ocurrencia"].dt.strftime("%Y-%m-%d")
-        
-        # Crear columnas para la tabla
-        columns = [
-            {"name": "Período de Ocurrencia", "id": "Periodo_Ocurrencia"},
-            {"name": "Total Siniestros", "id": "Total_Siniestros", "type": "numeric", "format": {"specifier": ","}},
-            {"name": "Siniestros Pagados", "id": "Siniestros_Con_Pago", "type": "numeric", "format": {"specifier": ","}},
-            {"name": "Total Pagos", "id": "Total_Pagos", "type": "numeric", "format": {"specifier": "$,.0f"}},
-            {"name": "% Pagados", "id": "Porcentaje_Pagados", "type": "numeric", "format": {"specifier": ".1f%"}}
-        ]
-        
-        print(f"Cálculo de tabla de ocurrencia: {time.time() - start:.2f} segundos")
-        return resumen_ocurrencia.to_dict('records'), columns
-    
-    
     # Callback para la tabla de ocurrencia
     @app.callback(
         Output("tabla_ocurrencia", "data"),
@@ -242,11 +189,24 @@ def register_data_callbacks(app, cache):
     )
     def update_ocurrencia_table(filtered_data, tipo_valor):
         """Actualiza la tabla de resumen por período de ocurrencia."""
-        return cached_ocurrencia_table(filtered_data, tipo_valor)
+        resumen = cached_resumen(filtered_data, tipo_valor) if filtered_data else None
+        if not resumen:
+            return [], []
+        
+        # Crear columnas para la tabla
+        columns = [
+            {"name": "Período de Ocurrencia", "id": "Periodo_Ocurrencia"},
+            {"name": "Total Siniestros", "id": "Total_Siniestros", "type": "numeric", "format": {"specifier": ","}},
+            {"name": "Siniestros Pagados", "id": "Siniestros_Con_Pago", "type": "numeric", "format": {"specifier": ","}},
+            {"name": "Total Pagos", "id": "Total_Pagos", "type": "numeric", "format": {"specifier": "$,.0f"}},
+            {"name": "% Pagados", "id": "Porcentaje_Pagados", "type": "numeric", "format": {"specifier": ".1f%"}}
+        ]
+        
+        return resumen["ocurrencia"], columns
     
     
     # Versión cacheada para datos de expuestos
-    @cache.memoize()
+    @memoizar_resultado(cache, devuelve_handle=True)
     def cached_expuestos_data(periodicidad, ramo, canal, amparo):
         """Procesa y almacena los datos de expuestos de manera cacheada"""
         start = time.time()
@@ -256,7 +216,7 @@ def register_data_callbacks(app, cache):
             
             if expuestos.empty:
                 print("No se encontraron datos de expuestos")
-                return []
+                return None
             
             # Procesar expuestos con filtros
             expuestos_procesados = procesar_expuestos(
@@ -267,15 +227,14 @@ def register_data_callbacks(app, cache):
                 amparo if amparo else None
             )
             
-            # Convertir fechas a string para JSON
             if "Periodo" in expuestos_procesados.columns:
-                expuestos_procesados["Periodo"] = pd.to_datetime(expuestos_procesados["Periodo"]).dt.strftime("%Y-%m-%d")
+                expuestos_procesados["Periodo"] = pd.to_datetime(expuestos_procesados["Periodo"])
             
             print(f"Procesamiento de expuestos: {time.time() - start:.2f} segundos")
-            return expuestos_procesados.to_dict('records')
+            return guardar_resultado(expuestos_procesados)
         except Exception as e:
             print(f"Error en procesar expuestos: {str(e)}")
-            return []
+            return None
     
     
     # Callback para procesar datos de expuestos
@@ -294,56 +253,24 @@ def register_data_callbacks(app, cache):
     
     
     # Versión cacheada para crear triángulo
-    @cache.memoize()
-    def cached_triangle_data(filtered_data, periodicidad, tipo_valor, tipo_triangulo):
+    @memoizar_resultado(cache, devuelve_handle=True)
+    def cached_triangle_data(periodicidad, tipo_valor, tipo_triangulo, ramo, canal, amparo, fecha_inicio, fecha_fin):
         """Calcula y actualiza los datos del triángulo de siniestralidad de manera cacheada"""
-        if not filtered_data:
-            return None
-        
         start = time.time()
         
         try:
-            # Convertir a DataFrame
-            df = pd.DataFrame(filtered_data)
-            
-            # Verificar que hay datos suficientes
-            if len(df) == 0:
-                print("DataFrame vacío al crear triángulo")
+            # Recortar el cubo de desarrollo en el backend de ejecución (ver data.ejecucion);
+            # los períodos vuelven como texto, igual que se muestran en la tabla
+            resultado = ejecutar(tarea_triangulo, periodicidad, tipo_valor, tipo_triangulo,
+                                 ramo, canal, amparo, fecha_inicio, fecha_fin)
+            if resultado is None:
                 return None
             
-            # Procesar datos adicionales
-            df = asignar_periodos(df)
-            df = calcular_tiempo_desarrollo(df)
-            
-            # Crear triángulo
-            triangulo = crear_triangulo_siniestralidad(df, periodicidad, tipo_valor, tipo_triangulo)
-            
-            # Verificar que el triángulo no está vacío
-            if triangulo.empty:
-                print("Triángulo resultante está vacío")
-                return None
-            
-            # Reindexar para asegurar que los índices son strings para JSON
-            triangulo = triangulo.reset_index()
-            index_col = triangulo.columns[0]
-            
-            # Convertir fechas a string en el índice
-            if pd.api.types.is_datetime64_any_dtype(triangulo[index_col]):
-                triangulo[index_col] = triangulo[index_col].dt.strftime("%Y-%m-%d")
-            
-            # Renombrar la columna de índice si es necesario
-            if index_col != "index":
-                triangulo = triangulo.rename(columns={index_col: "index"})
-            
-            # Guardar los resultados convertidos para JSON
-            result = {
-                "index": triangulo["index"].tolist(),
-                "columns": [str(col) for col in triangulo.columns if col != "index"],
-                "data": triangulo.to_dict('records')
-            }
+            periodos, desarrollos, valores = resultado
+            triangulo = pd.DataFrame(valores, index=periodos, columns=desarrollos)
             
             print(f"Creación de triángulo: {time.time() - start:.2f} segundos")
-            return result
+            return guardar_resultado(triangulo)
         except Exception as e:
             print(f"Error en triángulo: {str(e)}")
             import traceback
@@ -355,48 +282,42 @@ def register_data_callbacks(app, cache):
     @app.callback(
         Output("stored-triangle-data", "data"),
         [
-            Input("stored-filtered-data", "data"),
             Input("periodicidad", "value"),
             Input("tipo_valor", "value"),
-            Input("tipo_triangulo", "value")
+            Input("tipo_triangulo", "value"),
+            Input("ramo", "value"),
+            Input("canal", "value"),
+            Input("amparo", "value"),
+            Input("rango_fechas", "start_date"),
+            Input("rango_fechas", "end_date")
         ]
     )
-    def update_triangle_data(filtered_data, periodicidad, tipo_valor, tipo_triangulo):
+    def update_triangle_data(periodicidad, tipo_valor, tipo_triangulo, ramo, canal, amparo, fecha_inicio, fecha_fin):
         """Calcula y actualiza los datos del triángulo de siniestralidad."""
-        return cached_triangle_data(filtered_data, periodicidad, tipo_valor, tipo_triangulo)
+        if not periodicidad or not tipo_valor or not tipo_triangulo:
+            return None
+        
+        return cached_triangle_data(periodicidad, tipo_valor, tipo_triangulo, ramo, canal, amparo, fecha_inicio, fecha_fin)
     
     
     # Versión cacheada para cálculo de factores
-    @cache.memoize()
+    @memoizar_resultado(cache)
     def cached_factors_data(triangle_data):
         """Calcula y actualiza los datos de factores de desarrollo de manera cacheada"""
         if not triangle_data:
             return None
+        triangulo = resultado_requerido(triangle_data)
         
         start = time.time()
         
         try:
-            # Reconstruir el DataFrame del triángulo
-            index = triangle_data["index"]
-            columns = [int(col) for col in triangle_data["columns"]]
-            
-            # Crear DataFrame vacío
-            triangulo = pd.DataFrame(index=index, columns=columns)
-            
-            # Llenar con los datos
-            data_records = triangle_data["data"]
-            for record in data_records:
-                if "index" not in record:
-                    continue
-                
-                row_idx = record["index"]
-                for col in columns:
-                    col_str = str(col)
-                    if col_str in record and not pd.isna(record[col_str]):
-                        triangulo.loc[row_idx, col] = record[col_str]
-            
-            # Calcular factores
-            factores, estadisticas, factores_promedio, factores_acumulados = calcular_factores_desarrollo(triangulo)
+            # Calcular factores con arrays en el backend de ejecución
+            factores, estadisticas, factores_promedio, factores_acumulados = ejecutar(
+                tarea_factores,
+                triangulo.index.tolist(),
+                triangulo.columns.tolist(),
+                triangulo.values.astype(np.float64)
+            )
             
             # Preparar para JSON
             result = {
@@ -428,49 +349,39 @@ def register_data_callbacks(app, cache):
     
     
     # Versión cacheada para cálculo de siniestralidad última
-    @cache.memoize()
+    @memoizar_resultado(cache)
     def cached_ultima_data(triangle_data, factors_data, expuestos_data, metodo_calculo, periodicidad, tipo_triangulo):
         """Calcula la siniestralidad última de manera cacheada"""
         if not triangle_data or not factors_data or not expuestos_data:
             return None
+        triangulo = resultado_requerido(triangle_data)
+        expuestos = resultado_requerido(expuestos_data)
         
         start = time.time()
         
         try:
-            # Reconstruir el DataFrame del triángulo
-            index = triangle_data["index"]
-            columns = [int(col) for col in triangle_data["columns"]]
-            
-            # Crear DataFrame vacío
-            triangulo = pd.DataFrame(index=index, columns=columns)
-            
-            # Llenar con los datos
-            data_records = triangle_data["data"]
-            for record in data_records:
-                if "index" not in record:
-                    continue
-                
-                row_idx = record["index"]
-                for col in columns:
-                    col_str = str(col)
-                    if col_str in record and pd.notna(record[col_str]):
-                        triangulo.loc[row_idx, col] = record[col_str]
-            
             # Obtener factores
             factores_promedio = np.array(factors_data["factores_promedio"])
             factores_acumulados = np.array(factors_data["factores_acumulados"])
             
-            # Crear DataFrame de expuestos
-            expuestos = pd.DataFrame(expuestos_data)
-            if not expuestos.empty and "Periodo" in expuestos.columns:
-                expuestos["Periodo"] = pd.to_datetime(expuestos["Periodo"])
-            
-            # Calcular siniestralidad última
-            resultado = calcular_siniestralidad_ultima(
-                triangulo,
+            # Expuestos como arrays (período, total)
+            if "Periodo" in expuestos.columns and "Total_Expuestos" in expuestos.columns:
+                expuestos_periodos = pd.to_datetime(expuestos["Periodo"]).values
+                expuestos_valores = expuestos["Total_Expuestos"].values.astype(np.float64)
+            else:
+                expuestos_periodos = np.array([], dtype="datetime64[ns]")
+                expuestos_valores = np.array([], dtype=np.float64)
+            
+            # Calcular siniestralidad última en el backend de ejecución
+            resultado = ejecutar(
+                tarea_ultima,
+                triangulo.index.tolist(),
+                triangulo.columns.tolist(),
+                triangulo.values.astype(np.float64),
                 factores_promedio,
                 factores_acumulados,
-                expuestos,
+                expuestos_periodos,
+                expuestos_valores,
                 metodo_calculo,
                 periodicidad,
                 tipo_triangulo
@@ -513,30 +424,23 @@ def register_data_callbacks(app, cache):
         if not triangle_data:
             print("No hay datos de triángulo disponibles")
             return [], []
+        triangulo = resultado_requerido(triangle_data)
         
         try:
-            # Verificar la estructura de los datos
-            if "index" not in triangle_data or "columns" not in triangle_data or "data" not in triangle_data:
-                print("Estructura de datos de triángulo incorrecta:", triangle_data.keys())
-                return [], []
-            
-            # Extraer datos
-            data_records = triangle_data["data"]
-            
             # Verificar si hay registros
-            if not data_records:
+            if triangulo.empty:
                 print("No hay registros en los datos del triángulo")
                 return [], []
             
-            # Asegurarse de que cada registro tenga 'index'
-            for record in data_records:
-                if "index" not in record:
-                    record["index"] = ""
+            # Solo la tabla visible se serializa para el navegador
+            tabla = triangulo.copy()
+            tabla.columns = [str(col) for col in tabla.columns]
+            data_records = tabla.rename_axis("index").reset_index().to_dict('records')
             
             # Definir columnas
             columns = [{"name": "Período", "id": "index"}]
             
-            for col in triangle_data["columns"]:
+            for col in tabla.columns:
                 try:
                     col_name = f"Desarrollo {col}"
                     columns.append({
@@ -671,20 +575,12 @@ def register_data_callbacks(app, cache):
         """Prepara los datos para descarga."""
         if not n_clicks or not triangle_data:
             return None
+        triangulo = resultado_requerido(triangle_data)
         
         try:
-            # Reconstruir el triángulo
-            index = triangle_data["index"]
-            columns = [int(col) for col in triangle_data["columns"]]
-            
             # Crear DataFrame para la descarga
-            download_df = pd.DataFrame(index=index)
-            for i, idx in enumerate(index):
-                for col in columns:
-                    col_str = str(col)
-                    for record in triangle_data["data"]:
-                        if record.get("index") == idx and col_str in record:
-                            download_df.loc[idx, col_str] = record[col_str]
+            download_df = triangulo.copy()
+            download_df.columns = [str(col) for col in download_df.columns]
             
             # Preparar para descarga
             from datetime import datetime
@@ -698,4 +594,13 @@ def register_data_callbacks(app, cache):
             )
         except Exception as e:
             print(f"Error en descarga de datos: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    # Funciones memoizadas, para que la precarga use las mismas claves de caché
+    return {
+        "resumen": cached_resumen,
+        "expuestos": cached_expuestos_data,
+        "triangulo": cached_triangle_data,
+        "factores": cached_factors_data,
+        "ultima": cached_ultima_data
+    }
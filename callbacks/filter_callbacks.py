@@ -2,11 +2,13 @@ from dash import Input, Output, State, callback_context
 import pandas as pd
 import numpy as np
 import time
-import hashlib
-import json
 
-from data.data_loader import load_siniestros
+from data.data_loader import load_siniestros, get_combinaciones_dimensiones, get_indice_siniestros
 from data.data_processor import procesar_siniestros
+from data.dimensiones import opciones_dimension
+from data.indices import rango_fechas
+from data.resultados import (guardar_resultado, obtener_resultado, memoizar_resultado, clave_frecuencia,
+                             filtros_segmento)
 
 
 def register_filter_callbacks(app, cache):
@@ -16,18 +18,13 @@ def register_filter_callbacks(app, cache):
     Args:
         app: Aplicación Dash
         cache: Objeto de caché de Flask
-    """
     
-    # Función para generar una clave de caché única basada en los parámetros
-    def get_cache_key(prefix, *args):
-        # Convertir argumentos a string y concatenar
-        args_str = json.dumps(args, sort_keys=True, default=str)
-        # Generar hash único
-        key = hashlib.md5(args_str.encode()).hexdigest()
-        return f"{prefix}_{key}"
+    Returns:
+        Diccionario con las funciones de cálculo memoizadas
+    """
     
-    # Función cacheada para cargar datos
-    @cache.memoize()
+    # Carga de datos (load_siniestros ya se guarda por versión; memoizarla aquí
+    # obligaría a serializar el DataFrame completo en cada acceso a la caché)
     def cached_load_siniestros():
         """Versión cacheada de load_siniestros"""
         start = time.time()
@@ -36,7 +33,7 @@ def register_filter_callbacks(app, cache):
         return data
     
     # Función cacheada para procesamiento inicial
-    @cache.memoize()
+    @memoizar_resultado(cache, devuelve_handle=True)
     def cached_process_initial_data(periodicidad, tipo_triangulo, tipo_valor):
         """Versión cacheada del procesamiento inicial"""
         start = time.time()
@@ -54,16 +51,19 @@ def register_filter_callbacks(app, cache):
                 siniestros, 
                 periodicidad, 
                 tipo_triangulo,
-                tipo_valor
+                tipo_valor,
+                indice=get_indice_siniestros(),
+                clave_frecuencia=clave_frecuencia()
             )
             
             if processed_data.empty:
                 print(f"Procesamiento produjo un DataFrame vacío")
                 return None
             
-            result = processed_data.to_dict('records')
+            # Guardar en el servidor y devolver solo el identificador
+            handle = guardar_resultado(processed_data)
             print(f"Procesamiento inicial: {time.time() - start:.2f} segundos, {len(processed_data)} filas")
-            return result
+            return handle
             
         except Exception as e:
             print(f"Error en procesamiento inicial: {str(e)}")
@@ -87,29 +87,17 @@ def register_filter_callbacks(app, cache):
         return cached_process_initial_data(periodicidad, tipo_triangulo, tipo_valor)
     
     
-    # Función cacheada para obtener opciones únicas
-    @cache.memoize()
+    # Opciones de las listas desplegables a partir del diccionario de dimensiones
     def get_unique_options(data, column, filter_dict=None):
-        """Función para obtener opciones únicas de una columna con posibles filtros"""
+        """Obtiene las opciones de una dimensión con posibles filtros en cascada"""
         if not data:
             return [{"label": "Todos", "value": ""}]
         
         start = time.time()
         
-        # Convertir a DataFrame
-        df = pd.DataFrame(data)
-        
-        # Aplicar filtros si existen
-        if filter_dict:
-            for col, value in filter_dict.items():
-                if value and col in df.columns:
-                    df = df[df[col] == value]
-        
-        # Obtener opciones únicas
         try:
-            unique_values = sorted(df[column].unique())
-            options = [{"label": "Todos", "value": ""}]
-            options.extend([{"label": val, "value": val} for val in unique_values])
+            # Las combinaciones de códigos son pocas, filtrarlas es inmediato
+            options = opciones_dimension(get_combinaciones_dimensiones(), column, filter_dict)
             
             print(f"Opciones para {column}: {time.time() - start:.2f} segundos, {len(options)-1} opciones")
             return options
@@ -163,43 +151,62 @@ def register_filter_callbacks(app, cache):
     
     
     # Función cacheada para filtrado
-    @cache.memoize()
-    def cached_filter_data(data_json, ramo, canal, amparo, fecha_inicio, fecha_fin):
-        """Versión cacheada del filtrado de datos"""
-        if not data_json:
-            return None
-        
+    @memoizar_resultado(cache, devuelve_handle=True)
+    def cached_filter_data(periodicidad, tipo_triangulo, tipo_valor, ramo, canal, amparo, fecha_inicio, fecha_fin):
+        """
+        Versión cacheada del filtrado de datos.
+        
+        La Frecuencia (y con ella la Severidad) es el número de siniestros de
+        cada fecha de siniestro dentro del segmento filtrado, con la misma
+        clave de conteo que los triángulos (ver resultados.filtros_segmento),
+        así que la pestaña de datos y los triángulos coinciden. Antes la
+        Frecuencia de esta pestaña era siempre 1.
+        """
+        filtros = filtros_segmento(ramo, canal, amparo, fecha_inicio, fecha_fin)
         start = time.time()
         
-        # Generar clave de caché
-        cache_key = get_cache_key("filter", ramo, canal, amparo, fecha_inicio, fecha_fin)
-        
-        # Convertir a DataFrame
-        df = pd.DataFrame(data_json)
-        
-        # Crear máscara de filtro
-        mask = np.ones(len(df), dtype=bool)
-        
-        # Aplicar filtros
-        if ramo:
-            mask &= (df["Ramo_Desc"] == ramo)
-        if canal:
-            mask &= (df["Apertura_Canal_Desc"] == canal)
-        if amparo:
-            mask &= (df["Apertura_Amparo_Desc"] == amparo)
+        if filtros["ramo"] or filtros["canal"] or filtros["amparo"]:
+            # Un filtro de segmento cambia el conteo por fecha: procesar solo
+            # las filas del segmento (resueltas con los índices de dimensiones)
+            siniestros = cached_load_siniestros()
+            if siniestros.empty:
+                return None
+            filtered_df = procesar_siniestros(
+                siniestros,
+                periodicidad,
+                tipo_triangulo,
+                tipo_valor,
+                **filtros,
+                indice=get_indice_siniestros(),
+                clave_frecuencia=clave_frecuencia(**filtros)
+            )
+        else:
+            # El conteo de una fecha no depende de las demás fechas: un rango
+            # de fechas es un recorte de los datos procesados sin filtros
+            df = obtener_resultado(cached_process_initial_data(periodicidad, tipo_triangulo, tipo_valor))
+            if df is None:
+                return None
+            filtered_df = _recortar_fechas(df, filtros["fecha_inicio"], filtros["fecha_fin"])
         
-        # Filtrar por fecha
-        if fecha_inicio and fecha_fin:
-            if "Fecha_Siniestro" in df.columns:
-                df["Fecha_Siniestro"] = pd.to_datetime(df["Fecha_Siniestro"])
-                mask &= (df["Fecha_Siniestro"] >= fecha_inicio) & (df["Fecha_Siniestro"] <= fecha_fin)
+        handle = guardar_resultado(filtered_df)
+        print(f"Filtrado: {time.time() - start:.2f} segundos, {len(filtered_df)} filas")
+        return handle
+    
+    def _recortar_fechas(df, fecha_inicio, fecha_fin):
+        """Filtra los datos procesados por rango de fechas de siniestro."""
+        if not (fecha_inicio and fecha_fin):
+            return df
         
-        # Aplicar filtros
-        filtered_df = df[mask]
+        # El índice de los datos procesados son las filas de load_siniestros,
+        # ordenadas por fecha: el rango es un corte contiguo
+        if pd.api.types.is_integer_dtype(df.index) and df.index.is_monotonic_increasing:
+            rango = rango_fechas(get_indice_siniestros(), fecha_inicio, fecha_fin)
+            if rango is not None:
+                inicio, fin = np.searchsorted(df.index.values, rango)
+                return df.iloc[inicio:fin]
         
-        result = filtered_df.to_dict('records')
-        print(f"Filtrado: {time.time() - start:.2f} segundos, {len(filtered_df)} filas")
-        return result
+        fechas = df["Fecha_Siniestro"]
+        return df[((fechas >= fecha_inicio) & (fechas <= fecha_fin)).values]
     
     
     # Callback para filtrar datos según las selecciones
@@ -212,9 +219,25 @@ def register_filter_callbacks(app, cache):
             Input("amparo", "value"),
             Input("rango_fechas", "start_date"),
             Input("rango_fechas", "end_date")
+        ],
+        [
+            State("periodicidad", "value"),
+            State("tipo_triangulo", "value"),
+            State("tipo_valor", "value")
         ]
     )
-    def filter_data(processed_data, ramo, canal, amparo, fecha_inicio, fecha_fin):
+    def filter_data(processed_data, ramo, canal, amparo, fecha_inicio, fecha_fin,
+                    periodicidad, tipo_triangulo, tipo_valor):
         """Filtra los datos según las selecciones de usuario."""
-        # Usar la versión cacheada
-        return cached_filter_data(processed_data, ramo, canal, amparo, fecha_inicio, fecha_fin)
\ No newline at end of file
+        if not processed_data:
+            return None
+        
+        # La clave de caché son los parámetros, no los datos procesados
+        return cached_filter_data(periodicidad, tipo_triangulo, tipo_valor,
+                                  ramo, canal, amparo, fecha_inicio, fecha_fin)
+    
+    # Funciones memoizadas, para que la precarga use las mismas claves de caché
+    return {
+        "procesar": cached_process_initial_data,
+        "filtrar": cached_filter_data
+    }
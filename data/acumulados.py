@@ -0,0 +1,207 @@
+"""
+Tablas de sumas acumuladas (summed-area tables) del cubo de desarrollo.
+
+Para cada segmento (combinación de ramo, canal, amparo y agrupación) se guarda
+una matriz densa mes de ocurrencia x meses de desarrollo con los conteos y
+pagos acumulados en ambos ejes. La suma de cualquier rectángulo de meses de
+ocurrencia y de desarrollo se obtiene con cuatro lecturas, sin importar
+cuánta historia haya cargada.
+
+Una celda incremental de un triángulo (un período de ocurrencia por un
+período de desarrollo) es justamente uno de esos rectángulos, así que un
+triángulo de plata de cualquier periodicidad y rango de meses completos se
+arma con una consulta por celda. Como la suma es lineal, la tabla de una
+selección de segmentos es la suma de las tablas de cada segmento.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+from data.dimensiones import DIMENSIONES, get_codigos, get_codigo
+from data.cubo import rango_en_meses_completos
+from data.data_processor import acumular_triangulo
+from data.periodos import MESES_PERIODO, a_fecha
+
+
+# Medidas del cubo que se acumulan
+MEDIDAS_ACUMULADAS = ["N_Bruto_Pos", "Suma_Bruto_Pos", "N_Retenido_Pos", "Suma_Retenido_Pos"]
+
+# Columnas de crear_triangulo_siniestralidad de cada periodicidad
+COLUMNAS_PERIODICIDAD = {
+    "mes": ("Mes_Ocurrencia", "Desarrollo_Meses"),
+    "trimestre": ("Trimestre_Ocurrencia", "Desarrollo_Trimestres"),
+    "año": ("Año_Ocurrencia", "Desarrollo_Años")
+}
+
+
+def construir_tablas_acumuladas(cubo, fecha_min=None, fecha_max=None):
+    """
+    Construye las tablas de sumas acumuladas de cada segmento del cubo.
+
+    Args:
+        cubo: DataFrame del cubo de desarrollo (ver data.cubo)
+        fecha_min, fecha_max: Primera y última fecha de siniestro de los datos
+
+    Returns:
+        Diccionario con 'segmentos' (códigos de dimensión de cada segmento),
+        'mes_inicial' (datetime64[M] de la primera fila), 'fecha_min',
+        'fecha_max' y, por cada medida, un array (segmentos, meses + 1,
+        desarrollos + 1) con fila y columna iniciales de ceros; o None si el
+        cubo está vacío
+    """
+    if cubo.empty:
+        return None
+
+    start = time.time()
+
+    codigos = pd.DataFrame({col: get_codigos(cubo[col], col) for col in DIMENSIONES})
+    id_segmento = codigos.groupby(DIMENSIONES, sort=True).ngroup().values
+    segmentos = codigos.drop_duplicates().sort_values(DIMENSIONES).reset_index(drop=True)
+
+    meses = cubo["Mes_Ocurrencia"].values.astype("datetime64[M]")
+    mes_inicial = meses.min()
+    fila = (meses - mes_inicial).astype(np.int64)
+    columna = cubo["Desarrollo_Meses"].values.astype(np.int64)
+    forma = (len(segmentos), fila.max() + 2, columna.max() + 2)
+
+    tablas = {
+        "segmentos": segmentos,
+        "mes_inicial": mes_inicial,
+        "fecha_min": fecha_min,
+        "fecha_max": fecha_max
+    }
+    for medida in MEDIDAS_ACUMULADAS:
+        # Conteos en enteros para que las diferencias sean exactas
+        dtype = np.int64 if medida.startswith("N_") else np.float64
+        tabla = np.zeros(forma, dtype=dtype)
+        np.add.at(tabla, (id_segmento, fila + 1, columna + 1), cubo[medida].values.astype(dtype))
+        np.cumsum(tabla, axis=1, out=tabla)
+        np.cumsum(tabla, axis=2, out=tabla)
+        tablas[medida] = tabla
+
+    print(f"Tablas acumuladas construidas: {forma[0]} segmentos de {forma[1] - 1}x{forma[2] - 1} "
+          f"en {time.time() - start:.2f} segundos")
+    return tablas
+
+
+def tabla_seleccion(tablas, medida, agrupacion_reservas=None, ramo=None, canal=None, amparo=None):
+    """
+    Obtiene la tabla acumulada de los segmentos que cumplen los filtros.
+
+    Args:
+        tablas: Diccionario de construir_tablas_acumuladas
+        medida: Medida de MEDIDAS_ACUMULADAS
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+
+    Returns:
+        Array 2-D (meses + 1, desarrollos + 1) de sumas acumuladas
+    """
+    segmentos = tablas["segmentos"]
+    mask = np.ones(len(segmentos), dtype=bool)
+
+    filtros = {
+        "Agrupacion_Reservas": agrupacion_reservas,
+        "Ramo_Desc": ramo,
+        "Apertura_Canal_Desc": canal,
+        "Apertura_Amparo_Desc": amparo
+    }
+    for dimension, valor in filtros.items():
+        if valor:
+            mask &= segmentos[dimension].values == get_codigo(dimension, valor)
+
+    return tablas[medida][mask].sum(axis=0)
+
+
+def suma_rectangulo(tabla, fila_inicio, fila_fin, columna_inicio, columna_fin):
+    """
+    Suma los rectángulos [fila_inicio, fila_fin] x [columna_inicio, columna_fin]
+    (extremos incluidos) de una tabla acumulada.
+
+    Los índices pueden ser escalares o arrays: con arrays de filas (P) y de
+    columnas (D) devuelve la matriz P x D con las sumas de cada combinación.
+
+    Args:
+        tabla: Array 2-D de tabla_seleccion
+        fila_inicio, fila_fin: Índices de meses de ocurrencia
+        columna_inicio, columna_fin: Índices de meses de desarrollo
+
+    Returns:
+        Suma o array de sumas
+    """
+    fila_inicio = np.asarray(fila_inicio)
+    fila_fin = np.asarray(fila_fin) + 1
+    columna_inicio = np.asarray(columna_inicio)
+    columna_fin = np.asarray(columna_fin) + 1
+    if fila_inicio.ndim:
+        fila_inicio, fila_fin = fila_inicio[:, None], fila_fin[:, None]
+
+    return (tabla[fila_fin, columna_fin] - tabla[fila_inicio, columna_fin]
+            - tabla[fila_fin, columna_inicio] + tabla[fila_inicio, columna_inicio])
+
+
+def triangulo_plata(tablas, periodicidad="mes", tipo_valor="Bruto", agrupacion_reservas=None,
+                    ramo=None, canal=None, amparo=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Construye un triángulo de plata a partir de las tablas acumuladas.
+    El resultado es el mismo que crear_triangulo_siniestralidad sobre
+    preparar_datos_triangulo, con un coste que solo depende del tamaño del
+    triángulo.
+
+    Args:
+        tablas: Diccionario de construir_tablas_acumuladas (o None)
+        periodicidad: Periodicidad ('mes', 'trimestre', 'año')
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+
+    Returns:
+        DataFrame del triángulo (vacío si no hay datos), o None si la consulta
+        no se puede resolver con las tablas (rango que no es de meses completos)
+    """
+    if tablas is None or periodicidad not in COLUMNAS_PERIODICIDAD:
+        return None
+
+    meses_periodo = MESES_PERIODO[periodicidad]
+    periodo_col, desarrollo_col = COLUMNAS_PERIODICIDAD[periodicidad]
+    filtros = dict(agrupacion_reservas=agrupacion_reservas, ramo=ramo, canal=canal, amparo=amparo)
+
+    conteos = tabla_seleccion(tablas, f"N_{tipo_valor}_Pos", **filtros)
+    valores = tabla_seleccion(tablas, f"Suma_{tipo_valor}_Pos", **filtros)
+    n_meses, n_desarrollos = conteos.shape[0] - 1, conteos.shape[1] - 1
+
+    # Meses como número de meses desde 1970-01: los trimestres y años empiezan en múltiplos
+    mes_inicial = tablas["mes_inicial"].astype(np.int64)
+    mes_desde, mes_hasta = mes_inicial, mes_inicial + n_meses - 1
+    if fecha_inicio and fecha_fin:
+        if not rango_en_meses_completos(fecha_inicio, fecha_fin, tablas["fecha_min"], tablas["fecha_max"]):
+            return None
+        mes_desde = max(mes_desde, np.datetime64(pd.Timestamp(fecha_inicio), "M").astype(np.int64))
+        mes_hasta = min(mes_hasta, np.datetime64(pd.Timestamp(fecha_fin), "M").astype(np.int64))
+    if mes_desde > mes_hasta:
+        return pd.DataFrame()
+
+    # Rectángulos de cada celda: períodos de ocurrencia por períodos de desarrollo
+    periodos = np.arange(mes_desde // meses_periodo, mes_hasta // meses_periodo + 1) * meses_periodo
+    fila_inicio = np.maximum(periodos, mes_desde) - mes_inicial
+    fila_fin = np.minimum(periodos + meses_periodo - 1, mes_hasta) - mes_inicial
+    desarrollos = np.arange((n_desarrollos - 1) // meses_periodo + 1)
+    columna_inicio = desarrollos * meses_periodo
+    columna_fin = np.minimum(columna_inicio + meses_periodo - 1, n_desarrollos - 1)
+
+    conteo_celdas = suma_rectangulo(conteos, fila_inicio, fila_fin, columna_inicio, columna_fin)
+    valor_celdas = suma_rectangulo(valores, fila_inicio, fila_fin, columna_inicio, columna_fin)
+
+    # Solo los períodos y desarrollos con siniestros forman parte del triángulo
+    hay_periodo = conteo_celdas.sum(axis=1) > 0
+    hay_desarrollo = conteo_celdas.sum(axis=0) > 0
+    if not hay_periodo.any():
+        return pd.DataFrame()
+
+    desarrollos = desarrollos[hay_desarrollo]
+    matriz = valor_celdas[hay_periodo][:, hay_desarrollo]
+
+    return pd.DataFrame(
+        acumular_triangulo(matriz, desarrollos),
+        index=pd.Index(a_fecha(periodos[hay_periodo]), name=periodo_col),
+        columns=pd.Index(desarrollos.astype(np.int64), name=desarrollo_col)
+    )
@@ -0,0 +1,257 @@
+"""
+Almacén columnar de formato fijo para la tabla de siniestros.
+
+A diferencia del snapshot genérico (data.snapshot), cada columna tiene un
+tipo fijo y compacto y se abre con np.load(mmap_mode="r"): los datos no se
+leen al abrir el almacén, sino que el sistema operativo carga las páginas a
+medida que se usan. Esas páginas viven en la caché de páginas del sistema y
+se comparten entre workers, procesos de cálculo y reinicios, y las columnas
+que nadie lee nunca ocupan memoria.
+
+Formato (un archivo .npy por columna, con el nombre de la columna):
+
+    Fecha_Siniestro, Fecha_Registro   int32, días desde 1970-01-01
+    Pago_Bruto, Pago_Retenido         float32
+    dimensiones                       int8/int16, códigos + <columna>_cat.npy
+
+Los códigos de dimensión se guardan con el tipo entero que usa pandas para
+ese número de categorías (int8 hasta 126, int16 hasta 32766), de modo que las
+categóricas se construyen sobre el array mapeado sin copiarlo. Las fechas sí
+se convierten a datetime64[ns] al abrir, porque es el tipo que usa el resto
+de la aplicación.
+
+La validez respecto al archivo fuente se controla igual que los snapshots
+(tamaño, fecha de modificación y hash). Si los datos no caben en el formato
+(fechas con hora, pagos que no son float32, demasiadas categorías o columnas
+desconocidas) no se guarda el almacén y se usa el snapshot genérico.
+"""
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from data.snapshot import snapshot_vigente, leer_metadatos, directorio_temporal, publicar_directorio
+from data.dimensiones import DIMENSIONES
+
+
+# Versión del formato; si cambia, los almacenes existentes se descartan
+COLUMNAS_VERSION = 1
+
+# Tipo de cada columna del almacén
+ESQUEMA = {
+    "Fecha_Siniestro": "fecha",
+    "Fecha_Registro": "fecha",
+    "Pago_Bruto": "valor",
+    "Pago_Retenido": "valor",
+    **{dimension: "dimension" for dimension in DIMENSIONES}
+}
+
+# Día asignado a las fechas nulas
+DIA_NULO = np.iinfo(np.int32).min
+
+# Tipos de los códigos de dimensión según el número de categorías (igual que pandas)
+TIPOS_CODIGO = [(np.iinfo(np.int8).max, np.int8), (np.iinfo(np.int16).max, np.int16)]
+
+
+def get_columnas_dir(source_path):
+    """
+    Obtiene el directorio del almacén columnar de un archivo fuente.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+
+    Returns:
+        Ruta del directorio
+    """
+    return Path(source_path).parent / ".columnas"
+
+
+def tipo_codigo(n_categorias):
+    """
+    Obtiene el tipo entero de los códigos de una dimensión.
+
+    Args:
+        n_categorias: Número de categorías de la dimensión
+
+    Returns:
+        Tipo de NumPy, o None si hay demasiadas categorías para el formato
+    """
+    for maximo, tipo in TIPOS_CODIGO:
+        if n_categorias < maximo:
+            return tipo
+    return None
+
+
+def codificar_fechas(serie):
+    """
+    Convierte una columna de fechas a días desde 1970-01-01.
+
+    Args:
+        serie: Serie de fechas (datetime64[ns])
+
+    Returns:
+        Array int32 (DIA_NULO para las nulas), o None si alguna fecha tiene hora
+    """
+    fechas = np.asarray(serie.values, dtype="datetime64[ns]")
+    dias = fechas.astype("datetime64[D]")
+    nulas = np.isnat(fechas)
+    if not np.all((dias == fechas) | nulas):
+        return None
+
+    codigos = dias.astype(np.int64).astype(np.int32)
+    codigos[nulas] = DIA_NULO
+    return codigos
+
+
+def decodificar_fechas(dias):
+    """
+    Convierte días desde 1970-01-01 a fechas.
+
+    Args:
+        dias: Array int32 de codificar_fechas
+
+    Returns:
+        Array datetime64[ns]
+    """
+    fechas = dias.astype("datetime64[D]").astype("datetime64[ns]")
+    fechas[dias == DIA_NULO] = np.datetime64("NaT")
+    return fechas
+
+
+def _columnas_almacen(df):
+    """
+    Convierte las columnas de un DataFrame al formato del almacén.
+
+    Returns:
+        Diccionario {archivo: array}, o None si los datos no caben en el formato
+    """
+    if set(df.columns) != set(ESQUEMA):
+        return None
+
+    arrays = {}
+    for col, tipo in ESQUEMA.items():
+        serie = df[col]
+        if tipo == "fecha":
+            if not pd.api.types.is_datetime64_dtype(serie.dtype):
+                return None
+            dias = codificar_fechas(serie)
+            if dias is None:
+                return None
+            arrays[col] = dias
+        elif tipo == "valor":
+            if serie.dtype != np.float32:
+                return None
+            arrays[col] = serie.values
+        else:
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                return None
+            tipo_codigos = tipo_codigo(len(serie.cat.categories))
+            if tipo_codigos is None:
+                return None
+            arrays[col] = serie.cat.codes.values.astype(tipo_codigos)
+            arrays[f"{col}_cat"] = serie.cat.categories.values.astype(str)
+
+    return arrays
+
+
+def metadatos_columnas(source_path):
+    """
+    Lee los metadatos del último almacén columnar de un archivo fuente, sin
+    comprobar si sigue correspondiendo al archivo.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+
+    Returns:
+        Diccionario de metadatos, o None si no hay almacén
+    """
+    return leer_metadatos(source_path, get_columnas_dir(source_path), COLUMNAS_VERSION)
+
+
+def guardar_columnas(df, source_path):
+    """
+    Guarda la tabla de siniestros en el almacén columnar del archivo fuente.
+
+    Igual que guardar_snapshot, escribe en un directorio nuevo y reemplaza
+    los metadatos de forma atómica.
+
+    Args:
+        df: DataFrame de siniestros (dimensiones categóricas, ordenado por fecha)
+        source_path: Ruta del archivo de texto original
+
+    Returns:
+        True si se guardó, False si los datos no caben en el formato
+    """
+    arrays = _columnas_almacen(df)
+    if arrays is None:
+        return False
+
+    start = time.time()
+    source_path = Path(source_path)
+    tmp_dir, firma, hash_fuente, directorio = directorio_temporal(get_columnas_dir(source_path), source_path)
+
+    for archivo, valores in arrays.items():
+        np.save(tmp_dir / f"{archivo}.npy", np.ascontiguousarray(valores), allow_pickle=False)
+
+    publicar_directorio(tmp_dir, source_path, {
+        "version": COLUMNAS_VERSION,
+        "firma": firma,
+        "hash": hash_fuente,
+        "directorio": directorio,
+        "filas": len(df),
+        "columnas": list(ESQUEMA)
+    })
+
+    print(f"Almacén columnar de {source_path.name} guardado en {time.time() - start:.2f} segundos")
+    return True
+
+
+def abrir_columnas(source_path, meta=None):
+    """
+    Abre el almacén columnar de un archivo fuente si sigue vigente.
+
+    Los pagos y los códigos de dimensión quedan mapeados en memoria (solo
+    lectura); las fechas se convierten a datetime64[ns].
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        meta: Metadatos de un almacén concreto (de metadatos_columnas); si se
+            indican se abre ese almacén aunque el archivo haya cambiado
+
+    Returns:
+        DataFrame con los datos, o None si no hay un almacén válido
+    """
+    if not Path(source_path).exists():
+        return None
+
+    meta = meta or snapshot_vigente(source_path, get_columnas_dir(source_path), COLUMNAS_VERSION)
+    if meta is None:
+        return None
+
+    start = time.time()
+    directorio = get_columnas_dir(source_path) / meta["directorio"]
+
+    try:
+        data = {}
+        for col in meta["columnas"]:
+            valores = np.load(directorio / f"{col}.npy", mmap_mode="r", allow_pickle=False)
+            if len(valores) != meta["filas"]:
+                raise ValueError(f"la columna {col} no tiene {meta['filas']} filas")
+
+            tipo = ESQUEMA[col]
+            if tipo == "fecha":
+                data[col] = decodificar_fechas(valores)
+            elif tipo == "valor":
+                data[col] = valores
+            else:
+                categorias = np.load(directorio / f"{col}_cat.npy", allow_pickle=False)
+                data[col] = pd.Categorical.from_codes(valores, categories=categorias.astype(object))
+
+        # copy=False conserva cada columna como bloque propio sobre el array mapeado
+        df = pd.DataFrame(data, copy=False)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error al abrir el almacén columnar de {Path(source_path).name}: {str(e)}")
+        return None
+
+    print(f"Almacén columnar de {Path(source_path).name} abierto en {time.time() - start:.3f} segundos")
+    return df
@@ -0,0 +1,63 @@
+"""
+Archivos de datos comprimidos.
+
+siniestros.txt y expuestos.txt (y los archivos de un conjunto particionado)
+pueden guardarse comprimidos con gzip, bzip2, xz o zstandard, con la
+extensión correspondiente al final del nombre (siniestros.txt.gz). pandas
+descomprime el flujo a medida que lo parsea, también en la lectura por
+bloques, sin escribir archivos temporales.
+
+Los snapshots y el almacén columnar se validan con la firma y el hash del
+archivo comprimido, que es más rápido de leer que el texto. La ingesta
+incremental no se aplica a archivos comprimidos: un desplazamiento en bytes
+del archivo comprimido no corresponde a un inicio de línea del texto.
+"""
+from pathlib import Path
+
+
+# Extensiones reconocidas y nombre de la compresión para pd.read_csv
+# (zstandard requiere el paquete zstandard)
+EXTENSIONES_COMPRESION = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd"
+}
+
+
+def compresion_de(path):
+    """
+    Obtiene la compresión de un archivo según su extensión.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        Nombre de la compresión para pd.read_csv, o None si es texto plano
+    """
+    return EXTENSIONES_COMPRESION.get(Path(path).suffix.lower())
+
+
+def buscar_archivo(directorio, nombre):
+    """
+    Busca un archivo de datos en texto plano o comprimido. Si existen varias
+    variantes se prefiere el texto plano y, después, el orden de
+    EXTENSIONES_COMPRESION.
+
+    Args:
+        directorio: Directorio de los datos
+        nombre: Nombre del archivo de texto (por ejemplo "siniestros.txt")
+
+    Returns:
+        Ruta del archivo encontrado, o la del archivo de texto si no existe
+        ninguna variante
+    """
+    path = Path(directorio) / nombre
+    if path.exists():
+        return path
+
+    for extension in EXTENSIONES_COMPRESION:
+        comprimido = path.with_name(path.name + extension)
+        if comprimido.exists():
+            return comprimido
+    return path
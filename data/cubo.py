@@ -0,0 +1,212 @@
+"""
+Cubo de desarrollo pre-agregado.
+
+El cubo es una tabla dispersa con una fila por (ramo, canal, amparo,
+agrupación, mes de ocurrencia, meses de desarrollo) y los conteos y sumas de
+pagos Bruto y Retenido. Se construye una sola vez al cargar los datos a partir
+de la tabla de agregados de data.ingesta; cualquier triángulo de plata para
+cualquier combinación de filtros es un recorte del cubo seguido de una suma,
+sin volver a recorrer los siniestros fila a fila.
+
+Los triángulos de severidad y frecuencia dependen del número de siniestros
+por fecha exacta, que el cubo mensual no conserva; para ellos (y para rangos
+de fechas que no coinciden con meses completos) se usa la tabla de agregados
+diaria, que sigue siendo mucho más pequeña que los datos originales.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+from data.dimensiones import DIMENSIONES, mascara_dimension, alinear_dimensiones
+from data.ingesta import MEDIDAS_AGREGADOS, procesar_agregados
+from data.periodos import mes_entero, periodo_fecha
+
+
+# Claves del cubo
+CLAVES_CUBO = DIMENSIONES + ["Mes_Ocurrencia", "Desarrollo_Meses"]
+
+
+def construir_cubo(agregados):
+    """
+    Construye el cubo de desarrollo a partir de la tabla de agregados.
+
+    Args:
+        agregados: DataFrame de agregados por fecha de siniestro y mes de registro
+
+    Returns:
+        DataFrame con columnas CLAVES_CUBO y MEDIDAS_AGREGADOS
+    """
+    if agregados.empty:
+        return pd.DataFrame(columns=CLAVES_CUBO + MEDIDAS_AGREGADOS)
+
+    start = time.time()
+
+    mes_ocurrencia = agregados["Fecha_Siniestro"].values.astype("datetime64[M]")
+    meses_desarrollo = (agregados["Mes_Registro"].values.astype("datetime64[M]") - mes_ocurrencia).astype(np.int64)
+
+    base = agregados[DIMENSIONES + MEDIDAS_AGREGADOS].assign(
+        Mes_Ocurrencia=mes_ocurrencia.astype("datetime64[ns]"),
+        Desarrollo_Meses=np.clip(meses_desarrollo, 0, None).astype(np.int32)
+    )
+
+    cubo = base.groupby(CLAVES_CUBO, sort=True, observed=True)[MEDIDAS_AGREGADOS].sum().reset_index()
+
+    print(f"Cubo de desarrollo construido: {len(agregados)} agregados -> {len(cubo)} celdas "
+          f"en {time.time() - start:.2f} segundos")
+    return cubo
+
+
+def _celdas_desarrollo(cubo):
+    """Codifica el par (mes de ocurrencia, meses de desarrollo) de cada fila del cubo como un entero."""
+    return mes_entero(cubo["Mes_Ocurrencia"]).astype(np.int64) * 100_000 + cubo["Desarrollo_Meses"].values
+
+
+def actualizar_cubo(cubo, agregados_nuevos):
+    """
+    Suma al cubo las celdas de los agregados de filas nuevas (ingesta
+    incremental). Solo se recalculan las celdas de los pares (mes de
+    ocurrencia, desarrollo) que tocan las filas nuevas; con un mes de
+    registro nuevo son la diagonal de ese mes.
+
+    Args:
+        cubo: DataFrame del cubo de desarrollo
+        agregados_nuevos: Agregados de las filas nuevas
+
+    Returns:
+        DataFrame del cubo actualizado, ordenado por CLAVES_CUBO
+    """
+    delta = construir_cubo(agregados_nuevos)
+    if delta.empty:
+        return cubo
+    if cubo.empty:
+        return delta
+
+    afectadas = np.isin(_celdas_desarrollo(cubo), np.unique(_celdas_desarrollo(delta)))
+
+    # Igualar las categorías (las filas nuevas pueden traer valores nuevos)
+    sumadas = pd.concat([alinear_dimensiones(cubo[afectadas].copy()), alinear_dimensiones(delta)], ignore_index=True)
+    sumadas = sumadas.groupby(CLAVES_CUBO, sort=True, observed=True)[MEDIDAS_AGREGADOS].sum().reset_index()
+
+    cubo = pd.concat([alinear_dimensiones(cubo[~afectadas].copy()), sumadas], ignore_index=True)
+    return cubo.sort_values(CLAVES_CUBO, ignore_index=True)
+
+
+def rango_en_meses_completos(fecha_inicio, fecha_fin, fecha_min=None, fecha_max=None):
+    """
+    Indica si un rango de fechas equivale a un filtro por meses completos de
+    ocurrencia, de modo que se puede aplicar sobre el cubo.
+
+    Un extremo que queda fuera de los datos (antes de la primera fecha o
+    después de la última) no recorta nada y se considera alineado.
+
+    Args:
+        fecha_inicio: Fecha de inicio (string o fecha)
+        fecha_fin: Fecha de fin (string o fecha)
+        fecha_min: Primera fecha de siniestro de los datos (opcional)
+        fecha_max: Última fecha de siniestro de los datos (opcional)
+
+    Returns:
+        True si el rango se puede resolver con meses completos
+    """
+    inicio = pd.Timestamp(fecha_inicio)
+    fin = pd.Timestamp(fecha_fin)
+
+    inicio_alineado = inicio == inicio.normalize().replace(day=1) or \
+        (fecha_min is not None and inicio <= fecha_min)
+    fin_alineado = (fin == fin.normalize() and (fin + pd.Timedelta(days=1)).day == 1) or \
+        (fecha_max is not None and fin >= fecha_max)
+
+    return inicio_alineado and fin_alineado
+
+
+def recortar_cubo(cubo, tipo_valor="Bruto", agrupacion_reservas=None, ramo=None,
+                  canal=None, amparo=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Recorta el cubo según los filtros y suma sobre las dimensiones de segmento.
+
+    Args:
+        cubo: DataFrame del cubo de desarrollo
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas alineado a meses completos
+
+    Returns:
+        DataFrame con Mes_Ocurrencia, Desarrollo_Meses, Conteo y Valor
+    """
+    mask = np.ones(len(cubo), dtype=bool)
+
+    if agrupacion_reservas:
+        mask &= mascara_dimension(cubo["Agrupacion_Reservas"], agrupacion_reservas)
+    if ramo:
+        mask &= mascara_dimension(cubo["Ramo_Desc"], ramo)
+    if canal:
+        mask &= mascara_dimension(cubo["Apertura_Canal_Desc"], canal)
+    if amparo:
+        mask &= mascara_dimension(cubo["Apertura_Amparo_Desc"], amparo)
+    if fecha_inicio and fecha_fin:
+        # Comparar por mes: el rango ya fue validado como de meses completos
+        meses = cubo["Mes_Ocurrencia"].values
+        mes_inicio = np.datetime64(pd.Timestamp(fecha_inicio), "M")
+        mes_fin = np.datetime64(pd.Timestamp(fecha_fin), "M")
+        mask &= (meses >= mes_inicio) & (meses <= mes_fin)
+
+    recorte = cubo.loc[mask, ["Mes_Ocurrencia", "Desarrollo_Meses",
+                              f"N_{tipo_valor}_Pos", f"Suma_{tipo_valor}_Pos"]]
+    recorte = recorte[recorte[f"N_{tipo_valor}_Pos"] > 0]
+
+    return recorte.groupby(["Mes_Ocurrencia", "Desarrollo_Meses"], sort=True).sum().reset_index().rename(
+        columns={f"N_{tipo_valor}_Pos": "Conteo", f"Suma_{tipo_valor}_Pos": "Valor"}
+    )
+
+
+def preparar_datos_triangulo(cubo, agregados, periodicidad="mes", tipo_triangulo="plata",
+                             tipo_valor="Bruto", agrupacion_reservas=None, ramo=None,
+                             canal=None, amparo=None, fecha_inicio=None, fecha_fin=None,
+                             clave_frecuencia=None):
+    """
+    Prepara los datos para crear_triangulo_siniestralidad sin usar las filas
+    individuales de siniestros.
+
+    Los triángulos de plata se obtienen del cubo cuando el rango de fechas es de
+    meses completos; el resto se obtiene de la tabla de agregados diaria.
+
+    Args:
+        cubo: DataFrame del cubo de desarrollo
+        agregados: DataFrame de agregados por fecha de siniestro
+        periodicidad: Periodicidad ('mes', 'trimestre', 'año')
+        tipo_triangulo: Tipo de triángulo ('plata', 'severidad', 'frecuencia')
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+        clave_frecuencia: Clave de los filtros para reutilizar el conteo de
+            siniestros por fecha (severidad y frecuencia)
+
+    Returns:
+        DataFrame con columnas de período, desarrollo y valor
+    """
+    filtros = dict(agrupacion_reservas=agrupacion_reservas, ramo=ramo, canal=canal, amparo=amparo,
+                   fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+    if tipo_triangulo != "plata":
+        return procesar_agregados(agregados, periodicidad, tipo_triangulo, tipo_valor, **filtros,
+                                  clave_frecuencia=clave_frecuencia)
+
+    if fecha_inicio and fecha_fin:
+        fechas = agregados["Fecha_Siniestro"]
+        if not rango_en_meses_completos(fecha_inicio, fecha_fin, fechas.min(), fechas.max()):
+            return procesar_agregados(agregados, periodicidad, tipo_triangulo, tipo_valor, **filtros)
+
+    recorte = recortar_cubo(cubo, tipo_valor, **filtros)
+    if recorte.empty:
+        return pd.DataFrame()
+
+    meses = recorte["Desarrollo_Meses"].values
+    mes_ocurrencia = recorte["Mes_Ocurrencia"].values
+
+    recorte[f"Pago_{tipo_valor}"] = recorte["Valor"]
+    recorte["Trimestre_Ocurrencia"] = periodo_fecha(mes_ocurrencia, "trimestre")
+    recorte["Año_Ocurrencia"] = periodo_fecha(mes_ocurrencia, "año")
+    recorte["Desarrollo_Trimestres"] = meses // 3
+    recorte["Desarrollo_Años"] = meses // 12
+
+    return recorte
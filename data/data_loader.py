@@ -1,8 +1,51 @@
 import os
+import time
+import json
+import hashlib
 import pandas as pd
 from pathlib import Path
 import numpy as np
-from functools import lru_cache
+
+from data.snapshot import (cargar_snapshot, guardar_snapshot, firma_archivo, get_snapshot_dir, snapshot_vigente,
+                           leer_metadatos, guardar_derivado, cargar_derivado, SNAPSHOT_VERSION)
+from data.columnas import abrir_columnas, guardar_columnas, get_columnas_dir, COLUMNAS_VERSION
+from data.incremental import detectar_anexo, leer_anexo, anexar_filas
+from data.compresion import buscar_archivo
+from data.particiones import (listar_particiones, podar_particiones, leer_particiones, leer_archivo_particion,
+                              filtrar_filas, firma_particiones)
+from data.dimensiones import DIMENSIONES, codificar_dimensiones, alinear_dimensiones, get_combinaciones
+from data.ingesta import (ingerir_por_bloques, agregar_bloque, consolidar_agregados, codificar_agregados,
+                          actualizar_agregados)
+from data.cubo import construir_cubo, actualizar_cubo
+from data.indices import construir_indice
+from data.acumulados import construir_tablas_acumuladas
+from data.versiones import por_version, configurar_version, version_actual
+
+
+# Tamaño de bloque (filas) para la ingesta por bloques de siniestros
+CHUNK_SIZE = int(os.environ.get("SINIESTROS_CHUNK_SIZE", 500000))
+
+# Modo de ingesta: "completo" (todas las filas en memoria) o "bloques"
+MODO_INGESTA = os.environ.get("SINIESTROS_MODO_INGESTA", "completo")
+
+# Almacenamiento binario de siniestros: "columnas" (almacén de formato fijo
+# mapeado en memoria, ver data.columnas) o "snapshot" (snapshot genérico)
+ALMACEN_SINIESTROS = os.environ.get("SINIESTROS_ALMACEN", "columnas")
+
+# Ingesta incremental: si siniestros.txt es el archivo anterior con filas
+# agregadas al final solo se leen las nuevas (ver data.incremental); con
+# "0" cualquier cambio del archivo provoca la reconstrucción completa
+INCREMENTAL = os.environ.get("SINIESTROS_INCREMENTAL", "1") != "0"
+
+# Tablas derivadas que se guardan junto al almacén de siniestros
+DERIVADOS = ("agregados", "cubo")
+
+# Selección de siniestros que se carga de un conjunto particionado (ver
+# data.particiones): ramos separados por comas y rango de fechas de
+# siniestro. Las particiones fuera de la selección no se leen.
+RAMOS_SINIESTROS = tuple(r.strip() for r in os.environ.get("SINIESTROS_RAMOS", "").split(",") if r.strip()) or None
+FECHA_DESDE = os.environ.get("SINIESTROS_DESDE") or None
+FECHA_HASTA = os.environ.get("SINIESTROS_HASTA") or None
 
 
 def get_data_path():
@@ -15,68 +58,440 @@ def get_data_path():
     return base_path
 
 
-@lru_cache(maxsize=1)
+def get_archivo_datos(nombre):
+    """
+    Obtiene la ruta de un archivo de datos, que puede estar comprimido
+    (siniestros.txt.gz, .bz2, .xz o .zst; ver data.compresion).
+    
+    Args:
+        nombre: Nombre del archivo de texto (por ejemplo "siniestros.txt")
+    
+    Returns:
+        Ruta del archivo
+    """
+    return buscar_archivo(get_data_path(), nombre)
+
+
+def get_particiones_dir():
+    """
+    Obtiene el directorio del conjunto de siniestros particionado. Si existe,
+    se usa en lugar de siniestros.txt.
+    """
+    return get_data_path() / "siniestros"
+
+
+def get_opciones_lectura_siniestros():
+    """
+    Opciones de pd.read_csv para el archivo de siniestros, compartidas por la
+    carga completa y la ingesta por bloques.
+    """
+    # Usar dtype para acelerar la carga de datos. Las dimensiones se leen
+    # siempre como texto: un bloque o un anexo en que todos los códigos son
+    # numéricos ("096") no debe registrarlos como enteros en el diccionario
+    dtypes = {
+        'Pago_Bruto': np.float32,
+        'Pago_Retenido': np.float32,
+        **{dimension: str for dimension in DIMENSIONES}
+    }
+    # Establecer usecols para leer solo las columnas necesarias
+    usecols = [
+        'Fecha_Siniestro', 'Fecha_Registro', 
+        'Pago_Bruto', 'Pago_Retenido', 
+        'Ramo_Desc', 'Apertura_Canal_Desc', 
+        'Apertura_Amparo_Desc', 'Agrupacion_Reservas'
+    ]
+    
+    return dict(
+        delimiter="\t",
+        encoding="utf-8",
+        quoting=3,
+        parse_dates=['Fecha_Siniestro', 'Fecha_Registro'],
+        dtype=dtypes,
+        usecols=usecols
+    )
+
+
+def version_en_disco():
+    """
+    Calcula el identificador de la versión de los archivos de datos a partir
+    de su firma (tamaño y fecha de modificación) de siniestros y expuestos
+    (de cada archivo, si los siniestros están particionados).
+    """
+    firmas = {}
+    for nombre in ("siniestros.txt", "expuestos.txt"):
+        try:
+            firmas[nombre] = firma_archivo(get_archivo_datos(nombre))
+        except OSError:
+            firmas[nombre] = None
+    
+    if get_particiones_dir().is_dir():
+        firmas["siniestros"] = firma_particiones(get_particiones_dir())
+    
+    return hashlib.md5(json.dumps(firmas, sort_keys=True).encode()).hexdigest()[:12]
+
+
+configurar_version(version_en_disco)
+
+
+def get_version_datos():
+    """
+    Obtiene la versión de los datos con que trabaja la petición actual (la
+    activa si no hay una fijada, ver data.versiones). Todas las cargas de
+    este módulo se guardan por versión y la versión forma parte de las claves
+    de caché de los resultados.
+    """
+    return version_actual()
+
+
+def ordenar_por_fecha(df):
+    """
+    Ordena los siniestros por fecha de siniestro (orden estable) y renumera
+    las filas, de modo que un rango de fechas sea un intervalo contiguo de
+    filas (ver data.indices.rango_fechas). Si ya están ordenados no copia nada.
+    
+    Args:
+        df: DataFrame de siniestros
+    
+    Returns:
+        DataFrame ordenado con índice 0..n-1
+    """
+    if "Fecha_Siniestro" not in df.columns:
+        return df
+    if df["Fecha_Siniestro"].is_monotonic_increasing and isinstance(df.index, pd.RangeIndex) \
+            and df.index.start == 0 and df.index.step == 1:
+        return df
+    return df.sort_values("Fecha_Siniestro", kind="stable", na_position="last").reset_index(drop=True)
+
+
+def _almacenes_siniestros(path):
+    """
+    Almacenes binarios de siniestros en orden de preferencia.
+
+    Returns:
+        Lista de tuplas (directorio, versión de formato, función de lectura)
+    """
+    almacenes = [(get_snapshot_dir(path), SNAPSHOT_VERSION, cargar_snapshot)]
+    if ALMACEN_SINIESTROS == "columnas":
+        almacenes.insert(0, (get_columnas_dir(path), COLUMNAS_VERSION, abrir_columnas))
+    return almacenes
+
+
+def _cargar_derivado_siniestros(nombre):
+    """Carga una tabla derivada del almacén de siniestros vigente, o None."""
+    if get_particiones_dir().is_dir():
+        # Los almacenes de un conjunto particionado son por archivo
+        return None
+    path = get_archivo_datos("siniestros.txt")
+    for directorio, version, _ in _almacenes_siniestros(path):
+        meta = snapshot_vigente(path, directorio, version) if path.exists() else None
+        if meta is not None:
+            return cargar_derivado(path, nombre, directorio, version, meta)
+    return None
+
+
+def _guardar_derivado_siniestros(nombre, df):
+    """Guarda una tabla derivada en el almacén de siniestros vigente (no es crítico si falla)."""
+    if get_particiones_dir().is_dir():
+        return
+    path = get_archivo_datos("siniestros.txt")
+    try:
+        for directorio, version, _ in _almacenes_siniestros(path):
+            if guardar_derivado(path, nombre, df, directorio, version):
+                return
+    except OSError as e:
+        print(f"No se pudo guardar la tabla derivada {nombre}: {str(e)}")
+
+
+def _cargar_con_anexo(path):
+    """
+    Carga los siniestros cuando el archivo es el de un almacén anterior con
+    filas agregadas al final: abre ese almacén, lee solo las filas nuevas y
+    suma sus agregados a los agregados y al cubo guardados.
+
+    Args:
+        path: Ruta de siniestros.txt
+
+    Returns:
+        Tupla (DataFrame ordenado por fecha, {nombre: tabla derivada
+        actualizada}), o None si el archivo no es extensión de ningún almacén
+    """
+    for directorio, version, abrir in _almacenes_siniestros(path):
+        meta = leer_metadatos(path, directorio, version)
+        desplazamiento = detectar_anexo(path, meta)
+        if desplazamiento is None:
+            continue
+        anteriores = abrir(path, meta)
+        if anteriores is None:
+            continue
+
+        start = time.time()
+        derivados = {nombre: cargar_derivado(path, nombre, directorio, version, meta) for nombre in DERIVADOS}
+        nuevas = leer_anexo(path, desplazamiento, **get_opciones_lectura_siniestros())
+        df = ordenar_por_fecha(anexar_filas(codificar_dimensiones(anteriores), nuevas))
+
+        # Agregados y cubo: solo se suman los de las filas nuevas
+        actualizados = {}
+        if any(tabla is not None for tabla in derivados.values()):
+            agregados_nuevos = codificar_agregados(agregar_bloque(nuevas)) if not nuevas.empty else pd.DataFrame()
+            if derivados["agregados"] is not None:
+                actualizados["agregados"] = actualizar_agregados(codificar_dimensiones(derivados["agregados"]),
+                                                                 agregados_nuevos)
+            if derivados["cubo"] is not None:
+                actualizados["cubo"] = actualizar_cubo(codificar_dimensiones(derivados["cubo"]), agregados_nuevos)
+
+        print(f"Ingesta incremental de siniestros: {len(anteriores)} filas anteriores + {len(nuevas)} nuevas "
+              f"en {time.time() - start:.2f} segundos")
+        return df, actualizados
+
+    return None
+
+
+def _siniestros_vacios():
+    """DataFrame de siniestros sin filas, con las columnas y tipos de load_siniestros."""
+    return codificar_dimensiones(pd.DataFrame({
+        "Fecha_Siniestro": pd.Series(dtype="datetime64[ns]"),
+        "Fecha_Registro": pd.Series(dtype="datetime64[ns]"),
+        "Pago_Bruto": pd.Series(dtype="float32"),
+        "Pago_Retenido": pd.Series(dtype="float32"),
+        "Ramo_Desc": pd.Series(dtype="str"),
+        "Apertura_Canal_Desc": pd.Series(dtype="str"),
+        "Apertura_Amparo_Desc": pd.Series(dtype="str"),
+        "Agrupacion_Reservas": pd.Series(dtype="str")
+    }))
+
+
+def _leer_particion(particion):
+    """
+    Lee un archivo de un conjunto particionado, desde su almacén columnar (o
+    snapshot) si sigue vigente; si no, parsea el texto y guarda el almacén.
+    """
+    path = particion["path"]
+    usar_columnas = ALMACEN_SINIESTROS == "columnas"
+    
+    df = abrir_columnas(path) if usar_columnas else None
+    if df is None:
+        df = cargar_snapshot(path)
+    if df is not None:
+        return codificar_dimensiones(df)
+    
+    opciones = get_opciones_lectura_siniestros()
+    df = codificar_dimensiones(leer_archivo_particion(particion, **opciones))
+    try:
+        if not (usar_columnas and guardar_columnas(df, path)):
+            guardar_snapshot(df, path)
+    except OSError as e:
+        print(f"No se pudo guardar el almacén de {path.name}: {str(e)}")
+    return df
+
+
+@por_version
+def load_siniestros_particiones(ramos=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Carga los siniestros de un conjunto particionado (ver data.particiones).
+    Solo se leen, en paralelo, los archivos que pueden contener filas de la
+    selección, y el resultado contiene únicamente las filas seleccionadas.
+    
+    Args:
+        ramos: Ramo o tupla de ramos (None para todos)
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro (None para sin límite)
+    
+    Returns:
+        DataFrame de siniestros ordenado por fecha, con las dimensiones como
+        categóricas del diccionario global
+    """
+    start = time.time()
+    particiones = podar_particiones(listar_particiones(get_particiones_dir()), ramos, fecha_inicio, fecha_fin)
+    partes = [parte for parte in leer_particiones(particiones, _leer_particion) if len(parte) > 0]
+    if not partes:
+        return _siniestros_vacios()
+    
+    # Igualar categorías (cada hilo registró sus valores) antes de concatenar
+    df = pd.concat([alinear_dimensiones(parte) for parte in partes], ignore_index=True)
+    df = ordenar_por_fecha(filtrar_filas(df, ramos, fecha_inicio, fecha_fin))
+    
+    print(f"Datos de siniestros cargados desde {len(particiones)} particiones: {len(df)} filas, "
+          f"{len(df.columns)} columnas en {time.time() - start:.2f} segundos")
+    return df
+
+
+@por_version
 def load_siniestros():
     """
     Carga el archivo de siniestros.txt.
-    Los archivos originales están en formato TXT con delimitador de tabulación.
-    La función está decorada con lru_cache para evitar cargar el archivo repetidamente.
+    Los archivos originales están en formato TXT con delimitador de tabulación,
+    en texto plano o comprimidos (ver data.compresion).
+    El resultado se guarda por versión de los datos para no cargar el archivo repetidamente.
+    Si existe un almacén columnar vigente se abre mapeado en memoria y, si no,
+    se usa el snapshot columnar. Si el archivo solo creció con filas nuevas al
+    final se leen únicamente esas filas; si no, se parsea el texto completo.
+    Las columnas de dimensión se devuelven como categóricas del diccionario global.
+    Si los siniestros están particionados (directorio data/siniestros) se
+    cargan las particiones de la selección SINIESTROS_RAMOS, SINIESTROS_DESDE
+    y SINIESTROS_HASTA (ver load_siniestros_particiones).
     """
+    if get_particiones_dir().is_dir():
+        return load_siniestros_particiones(RAMOS_SINIESTROS, FECHA_DESDE, FECHA_HASTA)
+    
     try:
         # Intentar cargar desde la ruta especificada
-        path = get_data_path() / "siniestros.txt"
-        # Usar dtype para acelerar la carga de datos
-        dtypes = {
-            'Pago_Bruto': np.float32,
-            'Pago_Retenido': np.float32
-        }
-        # Establecer usecols para leer solo las columnas necesarias
-        usecols = [
-            'Fecha_Siniestro', 'Fecha_Registro', 
-            'Pago_Bruto', 'Pago_Retenido', 
-            'Ramo_Desc', 'Apertura_Canal_Desc', 
-            'Apertura_Amparo_Desc', 'Agrupacion_Reservas'
-        ]
+        path = get_archivo_datos("siniestros.txt")
+        usar_columnas = ALMACEN_SINIESTROS == "columnas"
         
-        print(f"Cargando datos de siniestros desde {path}")
-        df = pd.read_csv(
-            path, 
-            delimiter="\t",
-            encoding="utf-8",
-            quoting=3,
-            low_memory=False,
-            parse_dates=['Fecha_Siniestro', 'Fecha_Registro'],
-            dtype=dtypes,
-            usecols=usecols
-        )
+        # Usar el almacén columnar (o el snapshot) si el archivo no ha cambiado
+        df = abrir_columnas(path) if usar_columnas else None
+        if df is not None:
+            df = ordenar_por_fecha(codificar_dimensiones(df))
+            print(f"Datos de siniestros cargados desde almacén columnar: {len(df)} filas, {len(df.columns)} columnas")
+            return df
+        
+        df = cargar_snapshot(path)
+        desde_snapshot = df is not None
+        
+        # Si el archivo solo creció, leer únicamente las filas nuevas
+        derivados = {}
+        if not desde_snapshot and INCREMENTAL:
+            anexo = _cargar_con_anexo(path)
+            if anexo is not None:
+                df, derivados = anexo
+        
+        if desde_snapshot:
+            df = ordenar_por_fecha(codificar_dimensiones(df))
+            print(f"Datos de siniestros cargados desde snapshot: {len(df)} filas, {len(df.columns)} columnas")
+        elif df is None:
+            print(f"Cargando datos de siniestros desde {path}")
+            df = pd.read_csv(path, low_memory=False, **get_opciones_lectura_siniestros())
+            
+            # Codificar dimensiones con el diccionario global y ordenar por fecha
+            df = ordenar_por_fecha(codificar_dimensiones(df))
+            
+            print(f"Datos de siniestros cargados: {len(df)} filas, {len(df.columns)} columnas")
+        
+        # Guardar el almacén (o el snapshot) para las siguientes cargas (no es crítico si falla)
+        try:
+            if usar_columnas and guardar_columnas(df, path):
+                # Reabrir mapeado para compartir las páginas con los demás procesos
+                mapeado = abrir_columnas(path)
+                if mapeado is not None:
+                    df = ordenar_por_fecha(codificar_dimensiones(mapeado))
+            elif not desde_snapshot:
+                guardar_snapshot(df, path)
+        except OSError as e:
+            print(f"No se pudo guardar el almacén de siniestros: {str(e)}")
+        
+        # Agregados y cubo actualizados por la ingesta incremental
+        for nombre, tabla in derivados.items():
+            _guardar_derivado_siniestros(nombre, tabla)
         
-        print(f"Datos de siniestros cargados: {len(df)} filas, {len(df.columns)} columnas")
         return df
     except FileNotFoundError:
         print("Archivo de siniestros no encontrado. Creando DataFrame vacío.")
-        return pd.DataFrame({
-            "Fecha_Siniestro": pd.Series(dtype="datetime64[ns]"),
-            "Fecha_Registro": pd.Series(dtype="datetime64[ns]"),
-            "Pago_Bruto": pd.Series(dtype="float32"),
-            "Pago_Retenido": pd.Series(dtype="float32"),
-            "Ramo_Desc": pd.Series(dtype="str"),
-            "Apertura_Canal_Desc": pd.Series(dtype="str"),
-            "Apertura_Amparo_Desc": pd.Series(dtype="str"),
-            "Agrupacion_Reservas": pd.Series(dtype="str")
-        })
+        return _siniestros_vacios()
 
 
-@lru_cache(maxsize=1)
+@por_version
+def load_agregados_siniestros(chunksize=CHUNK_SIZE):
+    """
+    Carga los siniestros como tabla de agregados por segmento, fecha de
+    siniestro y mes de registro.
+    En modo de ingesta "bloques" el archivo se lee en bloques de `chunksize`
+    filas y cada bloque se reduce de inmediato, de modo que la memoria no
+    depende del tamaño del archivo. En modo "completo" los agregados se
+    calculan a partir de load_siniestros() y se guardan junto a su almacén.
+    Ver data.ingesta.procesar_agregados para obtener los mismos triángulos
+    que con las filas individuales.
+    """
+    if MODO_INGESTA != "bloques":
+        siniestros = load_siniestros()
+        if siniestros.empty:
+            return pd.DataFrame()
+        
+        agregados = _cargar_derivado_siniestros("agregados")
+        if agregados is not None:
+            return codificar_dimensiones(agregados)
+        
+        agregados = codificar_agregados(agregar_bloque(siniestros))
+        _guardar_derivado_siniestros("agregados", agregados)
+        return agregados
+    
+    if get_particiones_dir().is_dir():
+        return _agregar_particiones()
+    
+    try:
+        path = get_archivo_datos("siniestros.txt")
+        return ingerir_por_bloques(path, chunksize, **get_opciones_lectura_siniestros())
+    except FileNotFoundError:
+        print("Archivo de siniestros no encontrado. Creando agregados vacíos.")
+        return pd.DataFrame()
+
+
+def _agregar_particiones():
+    """
+    Ingesta por bloques de un conjunto particionado: cada archivo de la
+    selección es un bloque que se reduce a agregados en cuanto se lee.
+    """
+    start = time.time()
+    particiones = podar_particiones(listar_particiones(get_particiones_dir()),
+                                    RAMOS_SINIESTROS, FECHA_DESDE, FECHA_HASTA)
+    
+    def reducir(particion):
+        return agregar_bloque(filtrar_filas(_leer_particion(particion), RAMOS_SINIESTROS, FECHA_DESDE, FECHA_HASTA))
+    
+    parciales = leer_particiones(particiones, reducir)
+    if not parciales:
+        return pd.DataFrame()
+    
+    agregados = codificar_agregados(consolidar_agregados(parciales))
+    print(f"Ingesta por bloques de {len(particiones)} particiones: {len(agregados)} agregados "
+          f"en {time.time() - start:.2f} segundos")
+    return agregados
+
+
+@por_version
+def load_cubo():
+    """
+    Construye (una vez por versión de los datos) el cubo de desarrollo a partir de los agregados
+    de siniestros, o lo lee del almacén de siniestros si ya está guardado.
+    Ver data.cubo.
+    """
+    agregados = load_agregados_siniestros()
+    if agregados.empty:
+        return construir_cubo(agregados)
+    
+    cubo = _cargar_derivado_siniestros("cubo")
+    if cubo is not None:
+        return codificar_dimensiones(cubo)
+    
+    cubo = construir_cubo(agregados)
+    _guardar_derivado_siniestros("cubo", cubo)
+    return cubo
+
+
+@por_version
+def load_tablas_acumuladas():
+    """
+    Construye (una vez por versión de los datos) las tablas de sumas acumuladas por segmento a
+    partir del cubo de desarrollo. Ver data.acumulados.
+    """
+    agregados = load_agregados_siniestros()
+    if agregados.empty:
+        return None
+    fechas = agregados["Fecha_Siniestro"]
+    return construir_tablas_acumuladas(load_cubo(), fechas.min(), fechas.max())
+
+
+@por_version
 def load_expuestos():
     """
     Carga el archivo de expuestos.txt.
-    Los archivos originales están en formato TXT con delimitador de tabulación.
+    Los archivos originales están en formato TXT con delimitador de tabulación,
+    en texto plano o comprimidos (ver data.compresion).
+    Las columnas de dimensión comparten el diccionario global con siniestros.
     """
     try:
-        path = get_data_path() / "expuestos.txt"
-        # Usar dtype para acelerar la carga
+        path = get_archivo_datos("expuestos.txt")
+        # Usar dtype para acelerar la carga (los expuestos vienen con decimales)
         dtypes = {
-            'Expuestos': np.int32
+            'Expuestos': np.float64
         }
         
         print(f"Cargando datos de expuestos desde {path}")
@@ -90,17 +505,44 @@ def load_expuestos():
             dtype=dtypes
         )
         
+        # Codificar dimensiones con el diccionario global
+        df = codificar_dimensiones(df)
+        
         print(f"Datos de expuestos cargados: {len(df)} filas, {len(df.columns)} columnas")
         return df
     except FileNotFoundError:
         print("Archivo de expuestos no encontrado. Creando DataFrame vacío.")
-        return pd.DataFrame({
+        return codificar_dimensiones(pd.DataFrame({
             "Fecha_Registro": pd.Series(dtype="datetime64[ns]"),
-            "Expuestos": pd.Series(dtype="int32"),
+            "Expuestos": pd.Series(dtype="float64"),
             "Ramo_Desc": pd.Series(dtype="str"),
             "Apertura_Canal_Desc": pd.Series(dtype="str"),
             "Apertura_Amparo_Desc": pd.Series(dtype="str")
-        })
+        }))
+
+
+@por_version
+def get_indice_siniestros():
+    """
+    Construye (una vez por versión de los datos) los índices invertidos de las dimensiones de
+    segmento y de fechas de los siniestros cargados (ordenados por fecha).
+    Las filas del índice son posiciones de load_siniestros(). Ver data.indices.
+    """
+    siniestros = load_siniestros()
+    start = time.time()
+    indice = construir_indice(siniestros)
+    print(f"Índices de dimensiones construidos en {time.time() - start:.2f} segundos")
+    return indice
+
+
+@por_version
+def get_combinaciones_dimensiones():
+    """
+    Obtiene las combinaciones distintas de ramo, canal, amparo y agrupación
+    presentes en los siniestros, como códigos del diccionario de dimensiones.
+    Se usa para construir las listas desplegables en cascada.
+    """
+    return get_combinaciones(load_siniestros())
 
 
 def get_date_range():
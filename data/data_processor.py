@@ -1,12 +1,117 @@
+import os
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import math
 
+from data.dimensiones import mascara_dimension
+from data.indices import filas_segmento, rango_fechas, recortar_filas
+from data.periodos import mes_entero, clave_periodo, a_fecha, periodo_fecha, MES_NULO
+from data.versiones import al_descartar
+
+
+# Número máximo de conteos por fecha guardados (uno por clave de filtro)
+MAX_FRECUENCIAS = int(os.environ.get("FRECUENCIAS_MAX_ELEMENTOS", 32))
+
+_lock_frecuencias = threading.Lock()
+_frecuencias = OrderedDict()
+
+
+def conteo_por_fecha(fechas, pesos=None, clave=None):
+    """
+    Cuenta los siniestros de cada fecha de siniestro con factorize + bincount.
+    
+    Args:
+        fechas: Array de fechas de siniestro (datetime64)
+        pesos: Número de siniestros de cada fila (por defecto uno por fila)
+        clave: Clave del filtro que produjo las filas; si se indica, el
+            conteo se guarda y se reutiliza en las siguientes llamadas
+    
+    Returns:
+        Tupla (fechas únicas ordenadas, conteo de cada una)
+    """
+    if clave is not None:
+        with _lock_frecuencias:
+            if clave in _frecuencias:
+                _frecuencias.move_to_end(clave)
+                return _frecuencias[clave]
+    
+    codigos, fechas_unicas = pd.factorize(np.asarray(fechas, dtype="datetime64[ns]"), sort=True)
+    validos = codigos >= 0
+    if pesos is None:
+        conteos = np.bincount(codigos[validos], minlength=len(fechas_unicas))
+    else:
+        pesos = np.asarray(pesos)
+        conteos = np.bincount(codigos[validos], weights=pesos[validos], minlength=len(fechas_unicas))
+        if pesos.dtype.kind in "iu":
+            conteos = conteos.astype(np.int64)
+    
+    resultado = (np.asarray(fechas_unicas, dtype="datetime64[ns]"), conteos)
+    if clave is not None:
+        with _lock_frecuencias:
+            _frecuencias[clave] = resultado
+            while len(_frecuencias) > MAX_FRECUENCIAS:
+                _frecuencias.popitem(last=False)
+    return resultado
+
+
+@al_descartar
+def _invalidar_frecuencias(version):
+    """Borra los conteos calculados con una versión de los datos descartada."""
+    marca = f":{version}:"
+    with _lock_frecuencias:
+        for clave in [c for c in _frecuencias if marca in c]:
+            del _frecuencias[clave]
+
+
+def frecuencia_por_fila(fechas, pesos=None, clave=None):
+    """
+    Asigna a cada fila el número de siniestros de su fecha de siniestro.
+    
+    Args:
+        fechas: Array de fechas de siniestro (datetime64)
+        pesos: Número de siniestros de cada fila (por defecto uno por fila)
+        clave: Clave del filtro para reutilizar el conteo (ver conteo_por_fecha)
+    
+    Returns:
+        Array con la frecuencia de cada fila (1 para fechas nulas)
+    """
+    fechas = np.asarray(fechas, dtype="datetime64[ns]")
+    fechas_unicas, conteos = conteo_por_fecha(fechas, pesos, clave)
+    if len(fechas_unicas) == 0:
+        return np.ones(len(fechas), dtype=np.int64)
+    
+    posiciones = np.minimum(np.searchsorted(fechas_unicas, fechas), len(fechas_unicas) - 1)
+    encontrada = fechas_unicas[posiciones] == fechas
+    return np.where(encontrada, conteos[posiciones], 1)
+
+
+def asignar_frecuencia_severidad(df, clave=None):
+    """
+    Añade Frecuencia, Severidad_Bruta y Severidad_Retenida a un DataFrame de
+    siniestros en una sola pasada vectorizada.
+    
+    Args:
+        df: DataFrame de siniestros filtrados (se modifica)
+        clave: Clave del filtro para reutilizar el conteo por fecha
+    
+    Returns:
+        El mismo DataFrame con las columnas añadidas
+    """
+    frecuencia = frecuencia_por_fila(df["Fecha_Siniestro"].values, clave=clave)
+    df["Frecuencia"] = frecuencia
+    df["Severidad_Bruta"] = df["Pago_Bruto"].values / frecuencia
+    df["Severidad_Retenida"] = df["Pago_Retenido"].values / frecuencia
+    return df
+
+
 def procesar_siniestros(df, periodicidad="mes", tipo_triangulo="plata", 
                        tipo_valor="Bruto", agrupacion_reservas=None, ramo=None, 
-                       canal=None, amparo=None, fecha_inicio=None, fecha_fin=None):
+                       canal=None, amparo=None, fecha_inicio=None, fecha_fin=None, indice=None,
+                       clave_frecuencia=None):
     """
     Procesa los datos de siniestros aplicando filtros y transformaciones.
     Versión optimizada para mejor rendimiento.
@@ -22,6 +127,11 @@ def procesar_siniestros(df, periodicidad="mes", tipo_triangulo="plata",
         amparo: Filtro de amparo
         fecha_inicio: Fecha de inicio para filtrar
         fecha_fin: Fecha de fin para filtrar
+        indice: Índice de df (ver data.indices); si se indica, los filtros de
+            segmento y de fechas se resuelven con las listas de filas y la
+            búsqueda binaria de fechas en lugar de recorrer las columnas
+        clave_frecuencia: Clave de los filtros (sin periodicidad ni tipos) con
+            la que se guarda y reutiliza el conteo de siniestros por fecha
     
     Returns:
         DataFrame procesado
@@ -32,20 +142,41 @@ def procesar_siniestros(df, periodicidad="mes", tipo_triangulo="plata",
     # Aplicar filtros al inicio para reducir el tamaño del DataFrame
     print(f"Iniciando filtrado con {len(df_view)} filas")
     
+    # Con índice, los filtros solo tocan las filas que los cumplen
+    if indice is not None:
+        filas = filas_segmento(indice, {
+            "Agrupacion_Reservas": agrupacion_reservas,
+            "Ramo_Desc": ramo,
+            "Apertura_Canal_Desc": canal,
+            "Apertura_Amparo_Desc": amparo
+        })
+        rango = rango_fechas(indice, fecha_inicio, fecha_fin) if fecha_inicio and fecha_fin else None
+        if rango is not None:
+            if filas is None:
+                # Tabla ordenada por fecha: el rango es un corte contiguo
+                df_view = df_view.iloc[rango[0]:rango[1]]
+            else:
+                filas = recortar_filas(filas, *rango)
+            fecha_inicio = fecha_fin = None
+        if filas is not None:
+            df_view = df_view.iloc[filas]
+        agrupacion_reservas = ramo = canal = amparo = None
+    
     # Crear una máscara de filtro
     mask = np.ones(len(df_view), dtype=bool)
     
+    # Las dimensiones son categóricas: la comparación se hace sobre códigos enteros
     if agrupacion_reservas and agrupacion_reservas != "":
-        mask &= (df_view["Agrupacion_Reservas"] == agrupacion_reservas)
+        mask &= mascara_dimension(df_view["Agrupacion_Reservas"], agrupacion_reservas)
     
     if ramo and ramo != "":
-        mask &= (df_view["Ramo_Desc"] == ramo)
+        mask &= mascara_dimension(df_view["Ramo_Desc"], ramo)
     
     if canal and canal != "":
-        mask &= (df_view["Apertura_Canal_Desc"] == canal)
+        mask &= mascara_dimension(df_view["Apertura_Canal_Desc"], canal)
     
     if amparo and amparo != "":
-        mask &= (df_view["Apertura_Amparo_Desc"] == amparo)
+        mask &= mascara_dimension(df_view["Apertura_Amparo_Desc"], amparo)
     
     if fecha_inicio and fecha_fin:
         mask &= (df_view["Fecha_Siniestro"] >= fecha_inicio) & (df_view["Fecha_Siniestro"] <= fecha_fin)
@@ -58,22 +189,8 @@ def procesar_siniestros(df, periodicidad="mes", tipo_triangulo="plata",
     if df_filtered.empty:
         return pd.DataFrame()
     
-    # Calcular frecuencia (número de siniestros por fecha)
-    frecuencia = df_filtered.groupby("Fecha_Siniestro").size()
-    
-    # Función para asignar la frecuencia (más eficiente que merge)
-    def get_frecuencia(fecha):
-        return frecuencia.get(fecha, 1)
-    
-    # Vectorizar la función para mayor velocidad
-    vectorized_get_freq = np.vectorize(get_frecuencia)
-    
-    # Calcular frecuencia para cada fila
-    df_filtered["Frecuencia"] = vectorized_get_freq(df_filtered["Fecha_Siniestro"].values)
-    
-    # Calcular severidad
-    df_filtered["Severidad_Bruta"] = df_filtered["Pago_Bruto"] / df_filtered["Frecuencia"]
-    df_filtered["Severidad_Retenida"] = df_filtered["Pago_Retenido"] / df_filtered["Frecuencia"]
+    # Frecuencia (número de siniestros por fecha) y severidades en una pasada
+    asignar_frecuencia_severidad(df_filtered, clave_frecuencia)
     
     # Determinar la columna de valor según el tipo de triángulo y tipo de valor
     if tipo_triangulo == "plata":
@@ -96,32 +213,10 @@ def procesar_siniestros(df, periodicidad="mes", tipo_triangulo="plata",
     # Agregar una columna única de conteo de manera optimizada
     df_filtered["Conteo_Incurrido"] = np.arange(1, len(df_filtered) + 1)
     
-    # Definir períodos según periodicidad (usando métodos vectorizados)
-    if periodicidad == "mes":
-        df_filtered["Periodo_Ocurrencia"] = pd.to_datetime(
-            df_filtered["Fecha_Siniestro"].dt.year.astype(str) + "-" + 
-            df_filtered["Fecha_Siniestro"].dt.month.astype(str) + "-01"
-        )
-        df_filtered["Periodo_Desarrollo"] = pd.to_datetime(
-            df_filtered["Fecha_Registro"].dt.year.astype(str) + "-" + 
-            df_filtered["Fecha_Registro"].dt.month.astype(str) + "-01"
-        )
-    elif periodicidad == "trimestre":
-        df_filtered["Periodo_Ocurrencia"] = pd.to_datetime(
-            df_filtered["Fecha_Siniestro"].dt.year.astype(str) + "-" + 
-            ((df_filtered["Fecha_Siniestro"].dt.month - 1) // 3 * 3 + 1).astype(str) + "-01"
-        )
-        df_filtered["Periodo_Desarrollo"] = pd.to_datetime(
-            df_filtered["Fecha_Registro"].dt.year.astype(str) + "-" + 
-            ((df_filtered["Fecha_Registro"].dt.month - 1) // 3 * 3 + 1).astype(str) + "-01"
-        )
-    elif periodicidad == "año":
-        df_filtered["Periodo_Ocurrencia"] = pd.to_datetime(
-            df_filtered["Fecha_Siniestro"].dt.year.astype(str) + "-01-01"
-        )
-        df_filtered["Periodo_Desarrollo"] = pd.to_datetime(
-            df_filtered["Fecha_Registro"].dt.year.astype(str) + "-01-01"
-        )
+    # Definir períodos según periodicidad con aritmética entera de meses
+    if periodicidad in ("mes", "trimestre", "año"):
+        df_filtered["Periodo_Ocurrencia"] = periodo_fecha(df_filtered["Fecha_Siniestro"], periodicidad)
+        df_filtered["Periodo_Desarrollo"] = periodo_fecha(df_filtered["Fecha_Registro"], periodicidad)
     
     print(f"Procesamiento finalizado: {len(df_filtered)} filas")
     return df_filtered
@@ -144,24 +239,18 @@ def asignar_periodos(df):
     if "Periodo_Ocurrencia" in df_result.columns and df_result["Periodo_Ocurrencia"].dtype != "datetime64[ns]":
         df_result["Periodo_Ocurrencia"] = pd.to_datetime(df_result["Periodo_Ocurrencia"])
     
-    # Asignar períodos con métodos vectorizados
+    # Asignar períodos con aritmética entera de meses
     if "Periodo_Ocurrencia" in df_result.columns:
+        meses = mes_entero(df_result["Periodo_Ocurrencia"])
+        
         # Trimestre: primer día del trimestre correspondiente
-        df_result["Trimestre_Ocurrencia"] = pd.to_datetime(
-            df_result["Periodo_Ocurrencia"].dt.year.astype(str) + "-" + 
-            ((df_result["Periodo_Ocurrencia"].dt.month - 1) // 3 * 3 + 1).astype(str) + "-01"
-        )
+        df_result["Trimestre_Ocurrencia"] = a_fecha(clave_periodo(meses, "trimestre"))
         
         # Mes: primer día del mes
-        df_result["Mes_Ocurrencia"] = pd.to_datetime(
-            df_result["Periodo_Ocurrencia"].dt.year.astype(str) + "-" + 
-            df_result["Periodo_Ocurrencia"].dt.month.astype(str) + "-01"
-        )
+        df_result["Mes_Ocurrencia"] = a_fecha(meses)
         
         # Año: primer día del año
-        df_result["Año_Ocurrencia"] = pd.to_datetime(
-            df_result["Periodo_Ocurrencia"].dt.year.astype(str) + "-01-01"
-        )
+        df_result["Año_Ocurrencia"] = a_fecha(clave_periodo(meses, "año"))
     
     return df_result
 
@@ -188,8 +277,8 @@ def calcular_tiempo_desarrollo(df):
     # Calcular la diferencia en meses usando vectorización
     if "Fecha_Siniestro" in df_result.columns and "Fecha_Registro" in df_result.columns:
         # Meses de desarrollo (más eficiente que usar relativedelta)
-        df_result["Desarrollo_Meses"] = ((df_result["Fecha_Registro"].dt.year - df_result["Fecha_Siniestro"].dt.year) * 12 + 
-                                      (df_result["Fecha_Registro"].dt.month - df_result["Fecha_Siniestro"].dt.month))
+        df_result["Desarrollo_Meses"] = (mes_entero(df_result["Fecha_Registro"]).astype(np.int64) -
+                                         mes_entero(df_result["Fecha_Siniestro"]))
         
         # Trimestres: dividir meses por 3 y tomar la parte entera
         df_result["Desarrollo_Trimestres"] = df_result["Desarrollo_Meses"] // 3
@@ -205,6 +294,71 @@ def calcular_tiempo_desarrollo(df):
     return df_result
 
 
+def construir_triangulo_acumulado(periodos, desarrollos, valores):
+    """
+    Construye un triángulo acumulado a partir de arrays de filas.
+    Hace el pivote, la acumulación por desarrollo y el enmascarado bajo la
+    antidiagonal como operaciones sobre arrays completos (sin bucles por celda).
+    
+    La acumulación reproduce la del triángulo original: cada columna de
+    desarrollo suma la anterior solo si el desarrollo previo existe en los
+    datos, de modo que un hueco en los desarrollos reinicia la acumulación.
+    
+    Args:
+        periodos: Array con el período de ocurrencia de cada fila
+        desarrollos: Array de enteros con el desarrollo de cada fila
+        valores: Array con el valor de cada fila
+    
+    Returns:
+        Tuple con (periodos únicos, desarrollos únicos, matriz float64 con NaN
+        fuera del triángulo)
+    """
+    # Pivote: índices de fila/columna y suma con bincount sobre el índice plano
+    periodos_unicos, idx_periodo = np.unique(periodos, return_inverse=True)
+    desarrollos_unicos, idx_desarrollo = np.unique(desarrollos, return_inverse=True)
+    n_periodos = len(periodos_unicos)
+    n_desarrollos = len(desarrollos_unicos)
+    
+    matriz = np.bincount(
+        idx_periodo * n_desarrollos + idx_desarrollo,
+        weights=np.asarray(valores, dtype=np.float64),
+        minlength=n_periodos * n_desarrollos
+    ).reshape(n_periodos, n_desarrollos)
+    
+    return periodos_unicos, desarrollos_unicos, acumular_triangulo(matriz, desarrollos_unicos)
+
+
+def acumular_triangulo(matriz, desarrollos_unicos):
+    """
+    Acumula por desarrollo una matriz de valores incrementales y enmascara las
+    celdas fuera del triángulo (ver construir_triangulo_acumulado).
+    
+    Args:
+        matriz: Matriz float64 (períodos x desarrollos) de valores incrementales
+        desarrollos_unicos: Array ordenado con los desarrollos de las columnas
+    
+    Returns:
+        Matriz float64 acumulada con NaN fuera del triángulo
+    """
+    n_periodos, n_desarrollos = matriz.shape
+    
+    # Acumulación por tramos de desarrollos consecutivos
+    encadena = np.zeros(n_desarrollos, dtype=bool)
+    encadena[1:] = (np.diff(desarrollos_unicos) == 1) & (desarrollos_unicos[1:] <= n_desarrollos - 1)
+    inicio_tramo = np.maximum.accumulate(np.where(encadena, 0, np.arange(n_desarrollos)))
+    
+    acumulado = np.cumsum(matriz, axis=1)
+    previo = np.where(inicio_tramo > 0, acumulado[:, inicio_tramo - 1], 0.0)
+    acumulado = acumulado - previo
+    
+    # Enmascarar las celdas fuera del triángulo superior izquierdo
+    i = np.arange(n_periodos)[:, None]
+    j = np.arange(n_desarrollos)[None, :]
+    acumulado[j > n_periodos - i - 1] = np.nan
+    
+    return acumulado
+
+
 def crear_triangulo_siniestralidad(df, periodicidad="mes", tipo_valor="Bruto", tipo_triangulo="plata"):
     """
     Crea un triángulo de siniestralidad a partir de los datos procesados.
@@ -295,48 +449,21 @@ def crear_triangulo_siniestralidad(df, periodicidad="mes", tipo_valor="Bruto", t
         print("No hay datos después de eliminar valores nulos")
         return pd.DataFrame()
     
-    # Asegurar que las columnas son del tipo adecuado
-    df_clean[desarrollo_col] = df_clean[desarrollo_col].astype(int)
-    
     print(f"Preparando triángulo con {len(df_clean)} filas válidas")
     
-    # Agrupar datos para crear triángulo base
-    triangulo_base = df_clean.groupby([periodo_col, desarrollo_col])[valor_columna].sum().reset_index()
-    
-    # Verificar si hay datos en el resultado
-    if triangulo_base.empty:
-        print("No hay datos después de agrupar")
-        return pd.DataFrame()
-    
-    print(f"Triángulo base tiene {len(triangulo_base)} filas")
-    
-    # Crear una tabla pivote para formar el triángulo
+    # Construir el triángulo con operaciones sobre arrays completos
     try:
-        triangulo_pivot = pd.pivot_table(
-            triangulo_base,
-            values=valor_columna,
-            index=periodo_col,
-            columns=desarrollo_col,
-            fill_value=0
+        periodos, desarrollos, matriz = construir_triangulo_acumulado(
+            df_clean[periodo_col].values,
+            df_clean[desarrollo_col].values.astype(int),
+            df_clean[valor_columna].values
         )
         
-        print(f"Triángulo pivot creado con forma: {triangulo_pivot.shape}")
-        print(f"Períodos: {triangulo_pivot.index.tolist()}")
-        print(f"Desarrollos: {triangulo_pivot.columns.tolist()}")
-        
-        # Acumular valores por columna de desarrollo
-        triangulo_acumulado = triangulo_pivot.copy()
-        for col in range(1, len(triangulo_acumulado.columns)):
-            if col in triangulo_acumulado.columns and (col - 1) in triangulo_acumulado.columns:
-                triangulo_acumulado[col] = triangulo_acumulado[col] + triangulo_acumulado[col - 1]
-        
-        # Crear matriz final con NaN fuera de la diagonal principal
-        triangulo_final = pd.DataFrame(index=triangulo_acumulado.index, columns=triangulo_acumulado.columns)
-        
-        for i, periodo in enumerate(triangulo_acumulado.index):
-            for j, desarrollo in enumerate(triangulo_acumulado.columns):
-                if j <= len(triangulo_acumulado.index) - i - 1:
-                    triangulo_final.loc[periodo, desarrollo] = triangulo_acumulado.loc[periodo, desarrollo]
+        triangulo_final = pd.DataFrame(
+            matriz,
+            index=pd.Index(periodos, name=periodo_col),
+            columns=pd.Index(desarrollos, name=desarrollo_col)
+        )
         
         print(f"Triángulo final creado con forma: {triangulo_final.shape}")
         
@@ -347,6 +474,76 @@ def crear_triangulo_siniestralidad(df, periodicidad="mes", tipo_valor="Bruto", t
         return pd.DataFrame()
 
 
+def calcular_factores_arrays(triangulos):
+    """
+    Calcula factores de desarrollo para uno o varios triángulos a la vez.
+    Todos los cálculos son operaciones sobre arrays completos (con máscaras),
+    sin bucles por período ni por desarrollo.
+    
+    Args:
+        triangulos: Array 2-D (períodos x desarrollos) o 3-D
+            (segmentos x períodos x desarrollos) con NaN fuera del triángulo
+    
+    Returns:
+        Diccionario con arrays 'factores' (individuales), 'promedio'
+        (ponderados por volumen), 'acumulados', 'conteo', 'minimo', 'maximo'
+        y 'desviacion'. Si la entrada es 2-D, se devuelven sin la dimensión
+        de segmentos.
+    """
+    triangulos = np.asarray(triangulos, dtype=np.float64)
+    es_2d = triangulos.ndim == 2
+    if es_2d:
+        triangulos = triangulos[None, :, :]
+    
+    _, n_periodos, n_desarrollos = triangulos.shape
+    
+    actual = triangulos[:, :, :-1]
+    siguiente = triangulos[:, :, 1:]
+    
+    # Celdas dentro de la diagonal con valor actual y siguiente conocidos
+    i = np.arange(n_periodos)[:, None]
+    j = np.arange(n_desarrollos - 1)[None, :]
+    en_diagonal = (j <= n_periodos - i - 2)[None, :, :]
+    validos = en_diagonal & ~np.isnan(actual) & ~np.isnan(siguiente)
+    
+    # Factores individuales (solo con valor actual positivo)
+    con_factor = validos & (actual > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factores = np.where(con_factor, siguiente / actual, np.nan)
+    
+    # Factores promedio ponderados por volumen (método ChainLadder de R)
+    suma_numerador = np.where(validos, siguiente, 0.0).sum(axis=1)
+    suma_denominador = np.where(validos, actual, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        promedio = np.where(suma_denominador > 0, suma_numerador / suma_denominador, 1.0)
+    
+    # Factores acumulados: producto de derecha a izquierda
+    acumulados = np.cumprod(promedio[:, ::-1], axis=1)[:, ::-1]
+    
+    # Estadísticas por desarrollo sobre los factores individuales
+    factores_ma = np.ma.masked_invalid(factores)
+    conteo = factores_ma.count(axis=1)
+    minimo = factores_ma.min(axis=1).filled(np.nan)
+    maximo = factores_ma.max(axis=1).filled(np.nan)
+    desviacion = np.where(conteo > 1, factores_ma.std(axis=1).filled(0.0), 0.0)
+    desviacion = np.where(conteo > 0, desviacion, np.nan)
+    
+    resultado = {
+        "factores": factores,
+        "promedio": promedio,
+        "acumulados": acumulados,
+        "conteo": conteo,
+        "minimo": minimo,
+        "maximo": maximo,
+        "desviacion": desviacion
+    }
+    
+    if es_2d:
+        resultado = {clave: valor[0] for clave, valor in resultado.items()}
+    
+    return resultado
+
+
 def calcular_factores_desarrollo(triangulo):
     """
     Calcula factores de desarrollo a partir del triángulo de siniestralidad.
@@ -365,108 +562,163 @@ def calcular_factores_desarrollo(triangulo):
         empty_stats = pd.DataFrame(columns=["Estadistica"])
         return empty_df, empty_stats, np.array([]), np.array([])
     
-    # Convertir a numpy para operaciones más eficientes
-    triangulo_np = triangulo.values
-    
-    # Determinar el número máximo de desarrollos (algunos pueden ser NaN)
     n_desarrollos = triangulo.shape[1]
-    n_periodos = triangulo.shape[0]
-    
-    print(f"Períodos: {n_periodos}, Desarrollos: {n_desarrollos}")
-    
-    # Crear matriz para factores individuales - un factor menos que desarrollos
-    factores_matriz = np.full((n_periodos, n_desarrollos - 1), np.nan)
-    
-    # Calcular factores individuales (división celda a celda)
-    for i in range(n_periodos):
-        for j in range(n_desarrollos - 1):
-            # Solo calcular si estamos dentro de la diagonal
-            if j <= n_periodos - i - 2:  # -2 porque necesitamos el valor siguiente también
-                actual = triangulo_np[i, j]
-                siguiente = triangulo_np[i, j + 1]
-                
-                # Solo calcular si ambos valores son válidos y el actual es mayor que cero
-                if (not np.isnan(actual) and not np.isnan(siguiente) and actual > 0):
-                    factores_matriz[i, j] = siguiente / actual
-    
-    # Mostrar factores individuales para depuración
-    print("Muestra de factores individuales:", factores_matriz[0, :5])
-    
-    # Calcular factores promedio ponderados (siguiendo el método ChainLadder de R)
-    factores_promedio = np.ones(n_desarrollos - 1)
-    for j in range(n_desarrollos - 1):
-        # Suma de valores para cada columna (para numerador y denominador)
-        suma_numerador = 0
-        suma_denominador = 0
-        
-        for i in range(n_periodos):
-            # Solo usar celdas dentro de la diagonal principal
-            if j <= n_periodos - i - 2:
-                # Obtener valores actuales y siguientes de la diagonal
-                actual = triangulo_np[i, j]
-                siguiente = triangulo_np[i, j + 1]
-                
-                # Verificar que ambos valores existan
-                if not np.isnan(actual) and not np.isnan(siguiente):
-                    suma_numerador += siguiente
-                    suma_denominador += actual
-        
-        # Calcular factor como cociente de sumas (evitar división por cero)
-        if suma_denominador > 0:
-            factores_promedio[j] = suma_numerador / suma_denominador
-        else:
-            factores_promedio[j] = 1.0
-    
-    print("Factores promedio:", factores_promedio)
     
-    # Calcular factores acumulados (empezando desde el final)
-    factores_acumulados = np.ones(n_desarrollos - 1)
-    
-    # El último factor acumulado es igual al último factor promedio
-    if len(factores_promedio) > 0:
-        factores_acumulados[-1] = factores_promedio[-1]
-    
-    # Calcular los demás factores acumulados de derecha a izquierda
-    for i in range(len(factores_promedio) - 2, -1, -1):
-        factores_acumulados[i] = factores_promedio[i] * factores_acumulados[i + 1]
+    # Calcular todos los factores y estadísticas con operaciones vectorizadas
+    resultado = calcular_factores_arrays(triangulo.values.astype(np.float64))
+    factores_promedio = resultado["promedio"]
+    factores_acumulados = resultado["acumulados"]
     
+    print("Factores promedio:", factores_promedio)
     print("Factores acumulados:", factores_acumulados)
     
     # Crear DataFrame de factores individuales
     factores_df = pd.DataFrame(
-        factores_matriz, 
+        resultado["factores"], 
         index=triangulo.index,
         columns=[f"Factor_{i}" for i in range(n_desarrollos - 1)]
     )
     
-    # Crear DataFrame de estadísticas
-    estadisticas_dict = {
-        "Estadistica": ["Factor Promedio", "Factor Acumulado", "Número de Datos", 
-                      "Valor Mínimo", "Valor Máximo", "Desviación Estándar"]
+    # Crear DataFrame de estadísticas (desarrollos sin factores: 1.0, 1.0, 0, NaN...)
+    conteo = resultado["conteo"]
+    con_datos = conteo > 0
+    estadisticas = np.vstack([
+        np.where(con_datos, factores_promedio, 1.0),
+        np.where(con_datos, factores_acumulados, 1.0),
+        conteo,
+        resultado["minimo"],
+        resultado["maximo"],
+        resultado["desviacion"]
+    ])
+    
+    estadisticas_df = pd.DataFrame(
+        estadisticas,
+        columns=[f"Desarrollo_{j}" for j in range(n_desarrollos - 1)]
+    )
+    estadisticas_df.insert(0, "Estadistica", ["Factor Promedio", "Factor Acumulado", "Número de Datos", 
+                                              "Valor Mínimo", "Valor Máximo", "Desviación Estándar"])
+    
+    return factores_df, estadisticas_df, factores_promedio, factores_acumulados
+
+def proyectar_siniestralidad_ultima(triangulos, factores_acumulados, expuestos, es_periodo_reciente,
+                                    metodo_calculo="auto"):
+    """
+    Proyecta la siniestralidad última de uno o varios triángulos con
+    operaciones sobre arrays (Chain Ladder y Bornhuetter-Ferguson).
+    
+    Args:
+        triangulos: Array 2-D (períodos x desarrollos) o 3-D
+            (segmentos x períodos x desarrollos) con NaN fuera del triángulo
+        factores_acumulados: Array (desarrollos - 1) o (segmentos x desarrollos - 1)
+        expuestos: Array (períodos) o (segmentos x períodos) ya alineado con los períodos
+        es_periodo_reciente: Array booleano (períodos)
+        metodo_calculo: Método de cálculo ('auto', 'chain_ladder', 'bornhuetter_ferguson')
+    
+    Returns:
+        Diccionario con arrays 'valores_iniciales', 'valores_actuales',
+        'posiciones', 'siniestralidad_ultima', 'usa_bf' y 'ratio_historico'.
+        Si la entrada es 2-D, se devuelven sin la dimensión de segmentos.
+    """
+    triangulos = np.asarray(triangulos, dtype=np.float64)
+    es_2d = triangulos.ndim == 2
+    if es_2d:
+        triangulos = triangulos[None, :, :]
+    
+    n_segmentos, n_periodos, n_desarrollos = triangulos.shape
+    factores_acumulados = np.asarray(factores_acumulados, dtype=np.float64)
+    if factores_acumulados.ndim == 1:
+        factores_acumulados = np.broadcast_to(factores_acumulados, (n_segmentos, len(factores_acumulados)))
+    expuestos = np.broadcast_to(np.asarray(expuestos, dtype=np.float64), (n_segmentos, n_periodos))
+    es_periodo_reciente = np.asarray(es_periodo_reciente, dtype=bool)
+    
+    # Última diagonal conocida: última columna no-NaN de cada fila
+    conocido = ~np.isnan(triangulos)
+    tiene_valor = conocido.any(axis=2)
+    ultima_col = n_desarrollos - 1 - np.argmax(conocido[:, :, ::-1], axis=2)
+    posiciones = np.where(tiene_valor, ultima_col, -1)
+    valores_actuales = np.take_along_axis(triangulos, np.clip(posiciones, 0, None)[:, :, None], axis=2)[:, :, 0]
+    valores_actuales = np.where(tiene_valor, valores_actuales, np.nan)
+    
+    # Valores iniciales (primera columna, NaN como cero)
+    valores_iniciales = np.nan_to_num(triangulos[:, :, 0], nan=0.0)
+    
+    # Ratio histórico con los períodos no recientes (para Bornhuetter-Ferguson)
+    historicos = ~es_periodo_reciente
+    suma_expuestos = expuestos[:, historicos].sum(axis=1)
+    suma_iniciales = valores_iniciales[:, historicos].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio_historico = np.where(suma_expuestos > 0, suma_iniciales / suma_expuestos, 0.01)
+    
+    # Factor acumulado en la posición de la última diagonal
+    n_factores = factores_acumulados.shape[1]
+    con_factor = (posiciones >= 0) & (posiciones < n_factores)
+    if n_factores > 0:
+        factor_pos = np.take_along_axis(factores_acumulados, np.clip(posiciones, 0, n_factores - 1), axis=1)
+        factor_pos = np.where(con_factor, factor_pos, 1.0)
+    else:
+        factor_pos = np.ones_like(valores_actuales)
+    
+    # Método por período
+    if metodo_calculo == "auto":
+        usa_bf = np.broadcast_to(es_periodo_reciente, (n_segmentos, n_periodos))
+    else:
+        usa_bf = np.full((n_segmentos, n_periodos), metodo_calculo == "bornhuetter_ferguson")
+    
+    # Chain Ladder y Bornhuetter-Ferguson para todos los períodos a la vez
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chain_ladder = valores_actuales * factor_pos
+        parte_no_reportada = np.where(
+            factor_pos > 1.0,
+            expuestos * ratio_historico[:, None] * (1 - 1 / factor_pos),
+            0.0
+        )
+    bornhuetter_ferguson = valores_actuales + parte_no_reportada
+    
+    siniestralidad_ultima = np.where(usa_bf & con_factor, bornhuetter_ferguson, chain_ladder)
+    siniestralidad_ultima = np.where(tiene_valor, siniestralidad_ultima, 0.0)
+    
+    resultado = {
+        "valores_iniciales": valores_iniciales,
+        "valores_actuales": valores_actuales,
+        "posiciones": posiciones,
+        "siniestralidad_ultima": siniestralidad_ultima,
+        "usa_bf": usa_bf,
+        "ratio_historico": ratio_historico
     }
     
-    # Calcular estadísticas para cada desarrollo
-    for j in range(n_desarrollos - 1):
-        col_data = factores_matriz[:, j]
-        col_data = col_data[~np.isnan(col_data)]
-        
-        if len(col_data) > 0:
-            stats = [
-                factores_promedio[j],
-                factores_acumulados[j],
-                len(col_data),
-                np.min(col_data),
-                np.max(col_data),
-                np.std(col_data) if len(col_data) > 1 else 0
-            ]
-        else:
-            stats = [1.0, 1.0, 0, np.nan, np.nan, np.nan]
-        
-        estadisticas_dict[f"Desarrollo_{j}"] = stats
+    if es_2d:
+        resultado = {clave: valor[0] for clave, valor in resultado.items()}
+    
+    return resultado
+
+
+def alinear_expuestos(expuestos, periodos, valor_defecto=1000):
+    """
+    Alinea los expuestos con los períodos del triángulo.
     
-    estadisticas_df = pd.DataFrame(estadisticas_dict)
+    Args:
+        expuestos: DataFrame con columnas 'Periodo' y 'Total_Expuestos'
+        periodos: Lista de períodos del triángulo (fechas o strings)
+        valor_defecto: Valor usado cuando un período no tiene expuestos positivos
     
-    return factores_df, estadisticas_df, factores_promedio, factores_acumulados
+    Returns:
+        Array de expuestos, uno por período
+    """
+    # Cruce por la clave entera de mes del inicio de cada período
+    claves_periodos = mes_entero(pd.Index(periodos))
+    
+    if expuestos.empty or "Periodo" not in expuestos.columns or "Total_Expuestos" not in expuestos.columns:
+        return np.full(len(claves_periodos), float(valor_defecto))
+    
+    serie = pd.Series(
+        expuestos["Total_Expuestos"].values.astype(np.float64),
+        index=mes_entero(expuestos["Periodo"])
+    )
+    serie = serie[~serie.index.duplicated(keep="last")]
+    
+    valores = serie.reindex(claves_periodos).fillna(0).values
+    return np.where(valores > 0, valores, float(valor_defecto))
+
 
 def calcular_siniestralidad_ultima(triangulo, factores_promedio, factores_acumulados, expuestos, 
                                   metodo_calculo="auto", periodicidad="mes", tipo_triangulo="plata"):
@@ -493,169 +745,79 @@ def calcular_siniestralidad_ultima(triangulo, factores_promedio, factores_acumul
                                      "Valor_Actual", "Siniestralidad_Ultima", "IBNR", 
                                      "Factor_Desarrollo", "Loss_Ratio"])
     
-    # Convertir triángulo a numpy para operaciones eficientes
-    triangulo_np = triangulo.values
     periodos = triangulo.index.tolist()
     
-    # Identificar períodos recientes según periodicidad
+    # Períodos recientes: último año respecto al último período (igual para toda periodicidad)
     fechas_periodos = pd.to_datetime(periodos)
-    ultimo_periodo = max(fechas_periodos)
-    
-    # Definir período reciente según periodicidad
-    if periodicidad == "mes":
-        periodo_reciente = ultimo_periodo - pd.DateOffset(years=1)
-    elif periodicidad == "trimestre":
-        periodo_reciente = ultimo_periodo - pd.DateOffset(years=1)
-    else:  # año
-        periodo_reciente = ultimo_periodo - pd.DateOffset(years=1)
-    
-    es_periodo_reciente = fechas_periodos >= periodo_reciente
-    
-    # Encontrar últimos valores conocidos y sus posiciones
-    valores_actuales = []
-    posiciones_actuales = []
-    
-    for i in range(triangulo_np.shape[0]):
-        # Encontrar la última columna no-NaN para esta fila
-        ultima_col = -1
-        for j in range(triangulo_np.shape[1]):
-            if not np.isnan(triangulo_np[i, j]):
-                ultima_col = j
-        
-        if ultima_col >= 0:
-            valores_actuales.append(triangulo_np[i, ultima_col])
-            posiciones_actuales.append(ultima_col)
-        else:
-            valores_actuales.append(np.nan)
-            posiciones_actuales.append(-1)
-    
-    # Convertir a arrays de numpy
-    valores_actuales = np.array(valores_actuales)
-    posiciones_actuales = np.array(posiciones_actuales)
-    
-    # Obtener valores iniciales del triángulo (primera columna)
-    valores_iniciales = triangulo_np[:, 0].copy()
-    for i in range(len(valores_iniciales)):
-        if np.isnan(valores_iniciales[i]):
-            valores_iniciales[i] = 0
-    
-    # Preparar expuestos
-    expuestos_dict = {}
-    if not expuestos.empty and "Periodo" in expuestos.columns and "Total_Expuestos" in expuestos.columns:
-        # Convertir a datetime si es string
-        if expuestos["Periodo"].dtype == object:
-            expuestos["Periodo"] = pd.to_datetime(expuestos["Periodo"])
-        
-        # Crear diccionario para mapear expuestos a períodos
-        expuestos_dict = dict(zip(expuestos["Periodo"].astype(str), expuestos["Total_Expuestos"]))
-    
-    # Obtener expuestos para cada período
-    expuestos_valores = []
-    for periodo in periodos:
-        # Intentar encontrar expuestos para este período
-        exp_val = expuestos_dict.get(str(periodo), 0)
-        expuestos_valores.append(exp_val if exp_val > 0 else 1000)  # Valor por defecto si no hay datos
-    
-    # Calcular ratio histórico usando períodos no recientes para Bornhuetter-Ferguson
-    periodos_historicos = ~es_periodo_reciente
-    if np.any(periodos_historicos):
-        valores_iniciales_historicos = valores_iniciales[periodos_historicos]
-        expuestos_historicos = np.array([expuestos_valores[i] for i in range(len(periodos_historicos)) 
-                                         if periodos_historicos[i]])
-        
-        # Calcular ratio (evitar división por cero)
-        if np.sum(expuestos_historicos) > 0:
-            ratio_historico = np.sum(valores_iniciales_historicos) / np.sum(expuestos_historicos)
-        else:
-            ratio_historico = 0.01  # Valor por defecto
-    else:
-        ratio_historico = 0.01
+    periodo_reciente = max(fechas_periodos) - pd.DateOffset(years=1)
+    es_periodo_reciente = np.asarray(fechas_periodos >= periodo_reciente)
+    
+    # Expuestos alineados por fecha de período
+    expuestos_valores = alinear_expuestos(expuestos, periodos)
+    
+    # Proyección vectorizada de todos los períodos
+    proyeccion = proyectar_siniestralidad_ultima(
+        triangulo.values.astype(np.float64),
+        factores_acumulados,
+        expuestos_valores,
+        es_periodo_reciente,
+        metodo_calculo
+    )
     
-    print(f"Ratio histórico calculado: {ratio_historico:.4f}")
+    print(f"Ratio histórico calculado: {proyeccion['ratio_historico']:.4f}")
     
-    # Calcular siniestralidad última
-    siniestralidad_ultima = np.zeros(len(valores_actuales))
-    metodos_usados = []
+    valores_iniciales = proyeccion["valores_iniciales"]
+    valores_actuales = proyeccion["valores_actuales"]
+    siniestralidad_ultima = proyeccion["siniestralidad_ultima"]
     
-    for i in range(len(valores_actuales)):
-        # Determinar método a usar
-        if metodo_calculo == "auto":
-            # Automático: Bornhuetter-Ferguson para períodos recientes, Chain Ladder para el resto
-            metodo = "bornhuetter_ferguson" if es_periodo_reciente[i] else "chain_ladder"
-        else:
-            # Usar el método seleccionado
-            metodo = metodo_calculo
-        
-        metodos_usados.append(metodo)
-        
-        # Calcular según el método
-        pos = posiciones_actuales[i]
-        valor_actual = valores_actuales[i]
-        expuesto = expuestos_valores[i]
-        
-        if np.isnan(valor_actual) or pos < 0:
-            siniestralidad_ultima[i] = 0
-            continue
-        
-        if metodo == "bornhuetter_ferguson" and pos < len(factores_acumulados):
-            # Método Bornhuetter-Ferguson
-            factor_acum = factores_acumulados[pos]
-            
-            # Fórmula de Bornhuetter-Ferguson
-            parte_reportada = valor_actual
-            parte_no_reportada = expuesto * ratio_historico * (1 - 1/factor_acum) if factor_acum > 1.0 else 0
-            siniestralidad_ultima[i] = parte_reportada + parte_no_reportada
-        else:
-            # Método Chain Ladder
-            if pos < len(factores_acumulados):
-                siniestralidad_ultima[i] = valor_actual * factores_acumulados[pos]
-            else:
-                siniestralidad_ultima[i] = valor_actual  # Si ya está en el último desarrollo
+    if metodo_calculo == "auto":
+        metodos_usados = np.where(proyeccion["usa_bf"], "bornhuetter_ferguson", "chain_ladder")
+    else:
+        metodos_usados = np.full(len(periodos), metodo_calculo, dtype=object)
     
     # Crear DataFrame con resultados
-    resultados = pd.DataFrame({
-        "Periodo": periodos,
-        "Metodo": metodos_usados,
-        "Expuestos": expuestos_valores,
-        "Valor_Inicial": valores_iniciales,
-        "Valor_Actual": valores_actuales,
-        "Siniestralidad_Ultima": siniestralidad_ultima,
-        "IBNR": siniestralidad_ultima - valores_actuales,
-        "Factor_Desarrollo": np.where(valores_actuales > 0, 
-                                      siniestralidad_ultima / valores_actuales,
-                                      np.nan)
-    })
-    
-    # Calcular Loss Ratio
-    resultados["Loss_Ratio"] = np.where(np.array(expuestos_valores) > 0,
-                                       resultados["Siniestralidad_Ultima"] / np.array(expuestos_valores),
-                                       np.nan)
-    
-    # Añadir indicador para triángulo de frecuencia
-    if tipo_triangulo == "frecuencia":
-        resultados["Indicador"] = np.where(np.array(expuestos_valores) > 0,
-                                          (resultados["Siniestralidad_Ultima"] / np.array(expuestos_valores)) * 100,
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultados = pd.DataFrame({
+            "Periodo": periodos,
+            "Metodo": metodos_usados,
+            "Expuestos": expuestos_valores,
+            "Valor_Inicial": valores_iniciales,
+            "Valor_Actual": valores_actuales,
+            "Siniestralidad_Ultima": siniestralidad_ultima,
+            "IBNR": siniestralidad_ultima - valores_actuales,
+            "Factor_Desarrollo": np.where(valores_actuales > 0, 
+                                          siniestralidad_ultima / valores_actuales,
                                           np.nan)
+        })
+        
+        # Calcular Loss Ratio
+        resultados["Loss_Ratio"] = np.where(expuestos_valores > 0,
+                                           siniestralidad_ultima / expuestos_valores,
+                                           np.nan)
+        
+        # Añadir indicador para triángulo de frecuencia
+        if tipo_triangulo == "frecuencia":
+            resultados["Indicador"] = resultados["Loss_Ratio"] * 100
     
     # Calcular totales
+    total_expuestos = np.sum(expuestos_valores)
+    total_actual = np.sum(valores_actuales)
+    total_ultima = np.sum(siniestralidad_ultima)
     total_row = pd.DataFrame({
         "Periodo": ["TOTAL"],
         "Metodo": ["Combinado"],
-        "Expuestos": [np.sum(expuestos_valores)],
+        "Expuestos": [total_expuestos],
         "Valor_Inicial": [np.sum(valores_iniciales)],
-        "Valor_Actual": [np.sum(valores_actuales)],
-        "Siniestralidad_Ultima": [np.sum(siniestralidad_ultima)],
+        "Valor_Actual": [total_actual],
+        "Siniestralidad_Ultima": [total_ultima],
         "IBNR": [np.sum(siniestralidad_ultima - valores_actuales)],
-        "Factor_Desarrollo": [np.sum(siniestralidad_ultima) / np.sum(valores_actuales) 
-                             if np.sum(valores_actuales) > 0 else np.nan],
-        "Loss_Ratio": [np.sum(siniestralidad_ultima) / np.sum(expuestos_valores) 
-                      if np.sum(expuestos_valores) > 0 else np.nan]
+        "Factor_Desarrollo": [total_ultima / total_actual if total_actual > 0 else np.nan],
+        "Loss_Ratio": [total_ultima / total_expuestos if total_expuestos > 0 else np.nan]
     })
     
     # Añadir indicador total para triángulo de frecuencia
     if tipo_triangulo == "frecuencia":
-        total_row["Indicador"] = [(total_row["Siniestralidad_Ultima"].values[0] / total_row["Expuestos"].values[0]) * 100 
-                                 if total_row["Expuestos"].values[0] > 0 else np.nan]
+        total_row["Indicador"] = [(total_ultima / total_expuestos) * 100 if total_expuestos > 0 else np.nan]
     
     # Combinar resultados y ordenar
     resultados = pd.concat([resultados, total_row])
@@ -685,14 +847,14 @@ def procesar_expuestos(df, periodicidad="mes", ramo=None, canal=None, amparo=Non
     # Aplicar filtros
     if ramo and ramo != "":
         if "Ramo_Desc" in df.columns:
-            df = df[df["Ramo_Desc"] == ramo]
+            df = df[mascara_dimension(df["Ramo_Desc"], ramo)]
             print(f"Filtrado por ramo: {ramo}, quedan {len(df)} filas")
     
     if canal and canal != "":
         canal_cols = ["Apertura_Canal_Desc", "Canal_Desc"]
         for col in canal_cols:
             if col in df.columns:
-                df = df[df[col] == canal]
+                df = df[mascara_dimension(df[col], canal)]
                 print(f"Filtrado por canal ({col}): {canal}, quedan {len(df)} filas")
                 break
     
@@ -700,7 +862,7 @@ def procesar_expuestos(df, periodicidad="mes", ramo=None, canal=None, amparo=Non
         amparo_cols = ["Apertura_Amparo_Desc", "Amparo_Desc"]
         for col in amparo_cols:
             if col in df.columns:
-                df = df[df[col] == amparo]
+                df = df[mascara_dimension(df[col], amparo)]
                 print(f"Filtrado por amparo ({col}): {amparo}, quedan {len(df)} filas")
                 break
     
@@ -720,13 +882,9 @@ def procesar_expuestos(df, periodicidad="mes", ramo=None, canal=None, amparo=Non
     if df[fecha_col].dtype != "datetime64[ns]":
         df[fecha_col] = pd.to_datetime(df[fecha_col], errors='coerce')
     
-    # Agrupar por período
-    if periodicidad == "mes":
-        df["Periodo"] = df[fecha_col].dt.to_period("M").dt.to_timestamp()
-    elif periodicidad == "trimestre":
-        df["Periodo"] = df[fecha_col].dt.to_period("Q").dt.to_timestamp()
-    elif periodicidad == "año":
-        df["Periodo"] = df[fecha_col].dt.to_period("Y").dt.to_timestamp()
+    # Agrupar por la clave entera del período (la fecha se materializa al final)
+    if periodicidad in ("mes", "trimestre", "año"):
+        df["Periodo"] = clave_periodo(mes_entero(df[fecha_col]), periodicidad)
     
     # Verificar si existe columna Expuestos
     if "Expuestos" not in df.columns:
@@ -735,9 +893,10 @@ def procesar_expuestos(df, periodicidad="mes", ramo=None, canal=None, amparo=Non
     
     # Resumir por período
     try:
-        resultado = df.groupby("Periodo").agg(
+        resultado = df[df["Periodo"] != MES_NULO].groupby("Periodo").agg(
             Total_Expuestos=("Expuestos", "sum")
         ).reset_index().sort_values("Periodo", ascending=False)
+        resultado["Periodo"] = a_fecha(resultado["Periodo"].values)
         
         print(f"Expuestos procesados: {len(resultado)} períodos")
         
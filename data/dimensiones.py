@@ -0,0 +1,236 @@
+"""
+Diccionario global de dimensiones categóricas.
+
+Las columnas de segmento (ramo, canal, amparo y agrupación de reservas) se
+convierten a categóricas de pandas con una única lista de categorías por
+dimensión, compartida por siniestros y expuestos. Así los filtros y las
+agrupaciones trabajan con códigos enteros pequeños en lugar de comparar
+cadenas de texto, y los mismos códigos sirven para cruzar ambos archivos.
+
+La lista de categorías solo crece (nunca se reordena), de modo que un código
+asignado a un valor no cambia mientras el proceso esté vivo.
+"""
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Dimensiones que se codifican con el diccionario
+DIMENSIONES = [
+    "Ramo_Desc",
+    "Apertura_Canal_Desc",
+    "Apertura_Amparo_Desc",
+    "Agrupacion_Reservas"
+]
+
+# Nombres alternativos usados en algunos archivos de expuestos
+ALIAS_DIMENSIONES = {
+    "Canal_Desc": "Apertura_Canal_Desc",
+    "Amparo_Desc": "Apertura_Amparo_Desc"
+}
+
+_lock = threading.Lock()
+_categorias = {dimension: pd.Index([], dtype=object) for dimension in DIMENSIONES}
+
+
+def _dimension_de(columna):
+    """Devuelve la dimensión del diccionario a la que pertenece una columna."""
+    return ALIAS_DIMENSIONES.get(columna, columna)
+
+
+def registrar_valores(dimension, valores):
+    """
+    Añade al diccionario los valores que aún no tienen código.
+
+    Args:
+        dimension: Nombre de la dimensión
+        valores: Valores (iterable) a registrar
+
+    Returns:
+        Índice con todas las categorías de la dimensión
+    """
+    dimension = _dimension_de(dimension)
+    nuevos = pd.Index(pd.unique(np.asarray(valores, dtype=object))).dropna()
+
+    with _lock:
+        actuales = _categorias[dimension]
+        faltantes = nuevos.difference(actuales, sort=False)
+        if len(faltantes) > 0:
+            # Los nuevos se agregan al final para no alterar códigos existentes
+            _categorias[dimension] = actuales.append(pd.Index(sorted(faltantes), dtype=object))
+        return _categorias[dimension]
+
+
+def get_categorias(dimension):
+    """
+    Obtiene la lista de categorías actual de una dimensión.
+
+    Args:
+        dimension: Nombre de la dimensión (o alias)
+
+    Returns:
+        Índice de categorías
+    """
+    return _categorias[_dimension_de(dimension)]
+
+
+def codificar_dimensiones(df):
+    """
+    Convierte las columnas de dimensión de un DataFrame a categóricas globales.
+
+    Args:
+        df: DataFrame con columnas de dimensión como texto o categóricas
+
+    Returns:
+        El mismo DataFrame con las columnas de dimensión codificadas
+    """
+    for col in df.columns:
+        if _dimension_de(col) not in _categorias:
+            continue
+
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Solo hace falta registrar las categorías, no cada fila
+            categorias = registrar_valores(col, serie.cat.categories)
+            if serie.cat.categories.equals(categorias):
+                # Ya usa el diccionario global: conservar los códigos sin copiarlos
+                continue
+        else:
+            categorias = registrar_valores(col, serie.unique())
+
+        df[col] = pd.Categorical(serie, categories=categorias)
+
+    return df
+
+
+def alinear_dimensiones(df):
+    """
+    Actualiza las categorías de las columnas de dimensión a la lista global
+    vigente, necesario antes de cruzar DataFrames codificados en momentos
+    distintos. Como la lista solo crece, los códigos existentes no cambian.
+
+    Args:
+        df: DataFrame con columnas de dimensión categóricas
+
+    Returns:
+        El mismo DataFrame con las categorías alineadas
+    """
+    for col in df.columns:
+        if _dimension_de(col) in _categorias and isinstance(df[col].dtype, pd.CategoricalDtype):
+            categorias = get_categorias(col)
+            if len(df[col].cat.categories) != len(categorias):
+                df[col] = df[col].cat.set_categories(categorias)
+    return df
+
+
+def get_codigos(serie, dimension=None):
+    """
+    Obtiene los códigos globales de una serie de dimensión sin modificarla.
+
+    Args:
+        serie: Serie de la dimensión (texto o categórica)
+        dimension: Nombre de la dimensión; por defecto el nombre de la serie
+
+    Returns:
+        Array de códigos enteros (-1 para valores nulos)
+    """
+    dimension = dimension or serie.name
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        propias = serie.cat.categories
+        categorias = registrar_valores(dimension, propias)
+        # Si las categorías ya son un prefijo de las globales, los códigos sirven tal cual
+        if categorias[:len(propias)].equals(propias):
+            return serie.cat.codes.values
+    else:
+        categorias = registrar_valores(dimension, serie.unique())
+
+    return pd.Categorical(serie, categories=categorias).codes
+
+
+def get_codigo(dimension, valor):
+    """
+    Obtiene el código entero de un valor de dimensión.
+
+    Args:
+        dimension: Nombre de la dimensión (o alias)
+        valor: Etiqueta a buscar
+
+    Returns:
+        Código entero, o -1 si el valor no existe en el diccionario
+    """
+    categorias = get_categorias(dimension)
+    try:
+        return int(categorias.get_loc(valor))
+    except KeyError:
+        return -1
+
+
+def mascara_dimension(serie, valor):
+    """
+    Crea una máscara booleana para las filas cuya dimensión es igual a un valor.
+
+    Con columnas categóricas la comparación se hace sobre los códigos enteros;
+    con columnas de texto se cae a la comparación de cadenas.
+
+    Args:
+        serie: Serie de la dimensión
+        valor: Etiqueta a comparar
+
+    Returns:
+        Array booleano
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        try:
+            codigo = serie.cat.categories.get_loc(valor)
+        except KeyError:
+            return np.zeros(len(serie), dtype=bool)
+        return serie.cat.codes.values == codigo
+
+    return (serie == valor).values
+
+
+def get_combinaciones(df):
+    """
+    Obtiene las combinaciones distintas de códigos de dimensión presentes en
+    un DataFrame. El resultado es muy pequeño comparado con los datos y sirve
+    para construir las listas desplegables en cascada.
+
+    Args:
+        df: DataFrame con columnas de dimensión categóricas
+
+    Returns:
+        DataFrame con una columna de códigos por dimensión
+    """
+    columnas = [col for col in DIMENSIONES if col in df.columns]
+    codigos = pd.DataFrame({col: get_codigos(df[col]) for col in columnas})
+    return codigos.drop_duplicates().reset_index(drop=True)
+
+
+def opciones_dimension(combinaciones, dimension, filter_dict=None):
+    """
+    Construye las opciones de una lista desplegable a partir del diccionario.
+
+    Args:
+        combinaciones: DataFrame de combinaciones de códigos (ver get_combinaciones)
+        dimension: Dimensión de la que se quieren las opciones
+        filter_dict: Diccionario {dimensión: etiqueta} con filtros previos
+
+    Returns:
+        Lista de opciones con formato {"label", "value"}
+    """
+    options = [{"label": "Todos", "value": ""}]
+    if combinaciones is None or combinaciones.empty or dimension not in combinaciones.columns:
+        return options
+
+    mask = np.ones(len(combinaciones), dtype=bool)
+    if filter_dict:
+        for col, valor in filter_dict.items():
+            if valor and col in combinaciones.columns:
+                mask &= combinaciones[col].values == get_codigo(col, valor)
+
+    codigos = np.unique(combinaciones[dimension].values[mask])
+    codigos = codigos[codigos >= 0]
+
+    etiquetas = sorted(get_categorias(dimension)[codigos])
+    options.extend([{"label": val, "value": val} for val in etiquetas])
+    return options
@@ -0,0 +1,237 @@
+"""
+Backend de ejecución de los cálculos pesados (triángulo, factores y
+siniestralidad última).
+
+Con EJECUCION_BACKEND="procesos" los cálculos se envían a un
+ProcessPoolExecutor, de modo que no retienen el GIL de los hilos que atienden
+al resto de callbacks y varios cálculos pesados pueden usar varios núcleos.
+Con "local" (por defecto) se ejecutan en el hilo que los pide.
+
+Las tareas reciben y devuelven datos compactos: parámetros de filtro o arrays
+de NumPy, nunca listas de registros. Cada proceso del pool carga sus propios
+datos (de la versión que fija la tarea, ver data.versiones) la primera vez
+que los necesita.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+
+from data.data_loader import load_agregados_siniestros, load_cubo, load_tablas_acumuladas, get_version_datos
+from data.versiones import fijar_version, liberar_version
+from data.cubo import preparar_datos_triangulo
+from data.acumulados import triangulo_plata
+from data.resultados import clave_frecuencia, filtros_segmento
+from data.data_processor import (crear_triangulo_siniestralidad, calcular_factores_desarrollo,
+                                 calcular_siniestralidad_ultima)
+
+
+# "local" (en el hilo que llama) o "procesos" (ProcessPoolExecutor)
+EJECUCION_BACKEND = os.environ.get("EJECUCION_BACKEND", "local")
+
+# Número de procesos del pool y tiempo máximo de espera por tarea (segundos)
+EJECUCION_PROCESOS = int(os.environ.get("EJECUCION_PROCESOS", max(1, min(4, os.cpu_count() or 1))))
+EJECUCION_TIMEOUT = float(os.environ.get("EJECUCION_TIMEOUT", 120))
+
+# Método de arranque de los procesos; "spawn" evita heredar locks de los hilos del servidor
+EJECUCION_CONTEXTO = os.environ.get("EJECUCION_CONTEXTO", "spawn")
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """
+    Obtiene (creándolo la primera vez) el pool de procesos.
+
+    Returns:
+        ProcessPoolExecutor compartido
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            contexto = multiprocessing.get_context(EJECUCION_CONTEXTO)
+            _executor = ProcessPoolExecutor(max_workers=EJECUCION_PROCESOS, mp_context=contexto)
+            print(f"Pool de cálculo iniciado: {EJECUCION_PROCESOS} procesos ({EJECUCION_CONTEXTO})")
+        return _executor
+
+
+def _reiniciar_executor():
+    """Descarta un pool roto para que la siguiente tarea cree uno nuevo."""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def cerrar_executor():
+    """
+    Cierra el pool de procesos esperando a que terminen sus tareas. Se usa
+    antes de crear los workers de gunicorn (ver gunicorn.conf.py); la
+    siguiente tarea crea un pool nuevo en el proceso que la pida.
+    """
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _despues_de_fork():
+    """En el proceso hijo el pool del padre no es utilizable: se crea uno nuevo al necesitarlo."""
+    global _executor, _lock
+    _lock = threading.Lock()
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
+
+
+def ejecutar(funcion, *args, timeout=None):
+    """
+    Ejecuta una tarea en el backend configurado.
+
+    Args:
+        funcion: Función de nivel de módulo (debe poder enviarse a otro proceso)
+        *args: Argumentos compactos de la tarea
+        timeout: Tiempo máximo de espera en segundos (por defecto EJECUCION_TIMEOUT)
+
+    Returns:
+        Resultado de la tarea
+
+    Raises:
+        TimeoutError: Si la tarea no termina dentro del tiempo máximo
+    """
+    if EJECUCION_BACKEND != "procesos":
+        return funcion(*args)
+
+    timeout = EJECUCION_TIMEOUT if timeout is None else timeout
+    version = get_version_datos()
+    try:
+        futuro = get_executor().submit(_con_version, version, funcion, *args)
+    except BrokenProcessPool:
+        _reiniciar_executor()
+        futuro = get_executor().submit(_con_version, version, funcion, *args)
+
+    try:
+        return futuro.result(timeout=timeout)
+    except FuturesTimeoutError:
+        # El proceso sigue con la tarea, pero el callback deja de esperarla
+        futuro.cancel()
+        raise TimeoutError(f"{funcion.__name__} superó el tiempo máximo de {timeout:g} segundos")
+    except BrokenProcessPool:
+        print(f"Pool de cálculo roto durante {funcion.__name__}, se ejecuta en el proceso actual")
+        _reiniciar_executor()
+        return funcion(*args)
+
+
+def _con_version(version, funcion, *args):
+    """Ejecuta una tarea en el proceso del pool con la versión de datos de la petición que la envió."""
+    token = fijar_version(version)
+    try:
+        return funcion(*args)
+    finally:
+        liberar_version(token)
+
+
+def tarea_triangulo(periodicidad, tipo_valor, tipo_triangulo, ramo=None, canal=None, amparo=None,
+                    fecha_inicio=None, fecha_fin=None):
+    """
+    Calcula un triángulo de siniestralidad a partir del cubo de desarrollo.
+
+    Args:
+        periodicidad, tipo_valor, tipo_triangulo: Parámetros del triángulo
+        ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+
+    Returns:
+        Tupla (períodos como texto, desarrollos, array de valores) o None si
+        no hay datos
+    """
+    filtros = filtros_segmento(ramo, canal, amparo, fecha_inicio, fecha_fin)
+
+    # Los triángulos de plata de meses completos salen de las tablas acumuladas
+    triangulo = None
+    if tipo_triangulo == "plata":
+        triangulo = triangulo_plata(load_tablas_acumuladas(), periodicidad, tipo_valor, **filtros)
+
+    if triangulo is None:
+        triangulo = _triangulo_desde_cubo(periodicidad, tipo_valor, tipo_triangulo, filtros)
+        if triangulo is None:
+            return None
+
+    if triangulo.empty:
+        print("Triángulo resultante está vacío")
+        return None
+
+    periodos = triangulo.index
+    if pd.api.types.is_datetime64_any_dtype(periodos):
+        periodos = periodos.strftime("%Y-%m-%d")
+
+    return list(periodos), list(triangulo.columns), triangulo.values.astype(np.float64)
+
+
+def _triangulo_desde_cubo(periodicidad, tipo_valor, tipo_triangulo, filtros):
+    """Calcula el triángulo con el cubo o los agregados diarios (None si no hay datos)."""
+    df = preparar_datos_triangulo(
+        load_cubo(),
+        load_agregados_siniestros(),
+        periodicidad,
+        tipo_triangulo,
+        tipo_valor,
+        **filtros,
+        clave_frecuencia=clave_frecuencia(**filtros)
+    )
+    if len(df) == 0:
+        print("Sin datos para los filtros al crear triángulo")
+        return None
+
+    return crear_triangulo_siniestralidad(df, periodicidad, tipo_valor, tipo_triangulo)
+
+
+def tarea_factores(periodos, desarrollos, valores):
+    """
+    Calcula los factores de desarrollo de un triángulo dado como arrays.
+
+    Args:
+        periodos: Lista de períodos (índice del triángulo)
+        desarrollos: Lista de desarrollos (columnas del triángulo)
+        valores: Array 2-D de valores acumulados
+
+    Returns:
+        Tupla de calcular_factores_desarrollo
+    """
+    triangulo = pd.DataFrame(valores, index=periodos, columns=desarrollos)
+    return calcular_factores_desarrollo(triangulo)
+
+
+def tarea_ultima(periodos, desarrollos, valores, factores_promedio, factores_acumulados,
+                 expuestos_periodos, expuestos_valores, metodo_calculo, periodicidad, tipo_triangulo):
+    """
+    Calcula la siniestralidad última de un triángulo dado como arrays.
+
+    Args:
+        periodos, desarrollos, valores: Triángulo (ver tarea_factores)
+        factores_promedio, factores_acumulados: Arrays de factores
+        expuestos_periodos: Array datetime64 con los períodos de expuestos
+        expuestos_valores: Array con el total de expuestos por período
+        metodo_calculo, periodicidad, tipo_triangulo: Parámetros del cálculo
+
+    Returns:
+        DataFrame de calcular_siniestralidad_ultima
+    """
+    triangulo = pd.DataFrame(valores, index=periodos, columns=desarrollos)
+    expuestos = pd.DataFrame({"Periodo": expuestos_periodos, "Total_Expuestos": expuestos_valores})
+    return calcular_siniestralidad_ultima(
+        triangulo,
+        np.asarray(factores_promedio),
+        np.asarray(factores_acumulados),
+        expuestos,
+        metodo_calculo,
+        periodicidad,
+        tipo_triangulo
+    )
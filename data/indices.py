@@ -0,0 +1,201 @@
+"""
+Índices invertidos de las dimensiones de segmento.
+
+Para cada dimensión se guarda, una sola vez al cargar los datos, la lista
+ordenada de filas (posting list) de cada código del diccionario de
+dimensiones. Las listas se almacenan en formato compacto: un único array con
+los números de fila ordenados por código y un array de desplazamientos, de
+modo que la lista de un código es un corte sin copia.
+
+Una consulta con varios filtros intersecta las listas empezando por la más
+corta, así el trabajo es proporcional a las filas que cumplen los filtros y
+no al tamaño de la tabla.
+
+Si la tabla está ordenada por Fecha_Siniestro, el índice incluye además el
+número de día de cada fila (int64, creciente): un rango de fechas se resuelve
+con dos búsquedas binarias y equivale a un corte contiguo de filas, que se
+combina con las listas de segmento recortándolas al mismo intervalo.
+"""
+import numpy as np
+import pandas as pd
+
+from data.dimensiones import DIMENSIONES, get_codigos, get_codigo
+
+
+# Columna de fecha por la que se ordena la tabla de siniestros
+COLUMNA_FECHA = "Fecha_Siniestro"
+
+# Número de día asignado a las fechas nulas (quedan al final y fuera de cualquier rango)
+_DIA_NULO = np.iinfo(np.int64).max
+
+
+def construir_indice(df, dimensiones=None):
+    """
+    Construye las listas de filas por código de cada dimensión y, si la tabla
+    está ordenada por fecha de siniestro, el índice de días.
+
+    Args:
+        df: DataFrame con columnas de dimensión (categóricas o texto)
+        dimensiones: Dimensiones a indexar (por defecto todas las presentes)
+
+    Returns:
+        Diccionario {dimensión: (filas, desplazamientos)}. Las filas del código
+        c son filas[desplazamientos[c + 1]:desplazamientos[c + 2]] (el código
+        -1 de los nulos ocupa la primera posición), ordenadas de menor a mayor.
+        Con la tabla ordenada incluye también {COLUMNA_FECHA: días}
+    """
+    dimensiones = dimensiones or [col for col in DIMENSIONES if col in df.columns]
+    indice = {}
+
+    for dimension in dimensiones:
+        codigos = np.asarray(get_codigos(df[dimension], dimension), dtype=np.int64) + 1
+
+        # El orden estable conserva las filas de cada código en orden creciente
+        filas = np.argsort(codigos, kind="stable").astype(np.int32)
+        conteos = np.bincount(codigos, minlength=1)
+        desplazamientos = np.zeros(len(conteos) + 1, dtype=np.int64)
+        np.cumsum(conteos, out=desplazamientos[1:])
+
+        indice[dimension] = (filas, desplazamientos)
+
+    if COLUMNA_FECHA in df.columns:
+        fechas = np.asarray(df[COLUMNA_FECHA].values, dtype="datetime64[ns]")
+        dias = numero_dia(fechas)
+        # Solo sirve para búsqueda binaria si está ordenado y las fechas no tienen hora
+        ordenado = np.all(dias[1:] >= dias[:-1])
+        sin_hora = np.all((fechas.astype("datetime64[D]") == fechas) | np.isnat(fechas))
+        if ordenado and sin_hora:
+            indice[COLUMNA_FECHA] = dias
+
+    return indice
+
+
+def numero_dia(fechas):
+    """
+    Convierte fechas a número de día (días desde 1970-01-01).
+
+    Args:
+        fechas: Array de fechas (datetime64)
+
+    Returns:
+        Array int64; las fechas nulas reciben el mayor entero posible
+    """
+    fechas = np.asarray(fechas, dtype="datetime64[ns]")
+    dias = fechas.astype("datetime64[D]").astype(np.int64)
+    dias[np.isnat(fechas)] = _DIA_NULO
+    return dias
+
+
+def rango_fechas(indice, fecha_inicio, fecha_fin):
+    """
+    Obtiene el intervalo de filas con fecha de siniestro entre dos fechas
+    (ambas incluidas) mediante búsqueda binaria en el índice de días.
+
+    Args:
+        indice: Índice de construir_indice
+        fecha_inicio: Fecha inicial (texto o fecha)
+        fecha_fin: Fecha final (texto o fecha)
+
+    Returns:
+        Tupla (inicio, fin) de filas [inicio, fin), o None si la tabla no
+        tiene índice de fechas
+    """
+    dias = indice.get(COLUMNA_FECHA)
+    if dias is None:
+        return None
+
+    inicio = pd.Timestamp(fecha_inicio)
+    fin = pd.Timestamp(fecha_fin)
+
+    # El índice solo existe con fechas sin hora: un inicio con hora excluye su propio día
+    dia_inicio = inicio.normalize().value // 86_400_000_000_000 + (inicio != inicio.normalize())
+    dia_fin = fin.normalize().value // 86_400_000_000_000
+
+    return (int(np.searchsorted(dias, dia_inicio, side="left")),
+            int(np.searchsorted(dias, dia_fin, side="right")))
+
+
+def recortar_filas(filas, inicio, fin):
+    """
+    Restringe una lista ordenada de filas al intervalo [inicio, fin).
+
+    Args:
+        filas: Array ordenado de números de fila
+        inicio, fin: Límites del intervalo (ver rango_fechas)
+
+    Returns:
+        Corte de filas (sin copia)
+    """
+    return filas[np.searchsorted(filas, inicio):np.searchsorted(filas, fin)]
+
+
+def filas_codigo(indice, dimension, codigo):
+    """
+    Obtiene la lista de filas de un código de dimensión.
+
+    Args:
+        indice: Índice de construir_indice
+        dimension: Nombre de la dimensión
+        codigo: Código entero del diccionario (-1 para nulos)
+
+    Returns:
+        Array ordenado con los números de fila (vacío si el código no aparece)
+    """
+    filas, desplazamientos = indice[dimension]
+    posicion = codigo + 1
+    if posicion < 0 or posicion + 1 >= len(desplazamientos):
+        return filas[:0]
+    return filas[desplazamientos[posicion]:desplazamientos[posicion + 1]]
+
+
+def filas_segmento(indice, filtros):
+    """
+    Obtiene las filas que cumplen todos los filtros de segmento.
+
+    Args:
+        indice: Índice de construir_indice
+        filtros: Diccionario {dimensión: etiqueta}; los valores vacíos se ignoran
+
+    Returns:
+        Array ordenado con los números de fila, o None si no hay ningún filtro
+        (todas las filas)
+    """
+    listas = []
+    for dimension, valor in filtros.items():
+        if not valor:
+            continue
+        codigo = get_codigo(dimension, valor)
+        if codigo < 0:
+            return np.zeros(0, dtype=np.int32)
+        listas.append(filas_codigo(indice, dimension, codigo))
+
+    if not listas:
+        return None
+
+    # Intersectar empezando por la lista más corta
+    listas.sort(key=len)
+    filas = listas[0]
+    for lista in listas[1:]:
+        if len(filas) == 0:
+            break
+        filas = intersectar_filas(filas, lista)
+    return filas
+
+
+def intersectar_filas(cortas, largas):
+    """
+    Intersecta dos listas ordenadas de filas buscando los elementos de la
+    corta en la larga (coste proporcional a la lista corta).
+
+    Args:
+        cortas: Array ordenado (el más corto)
+        largas: Array ordenado
+
+    Returns:
+        Array ordenado con las filas comunes
+    """
+    if len(largas) == 0:
+        return largas
+    posiciones = np.searchsorted(largas, cortas)
+    posiciones[posiciones == len(largas)] = 0
+    return cortas[largas[posiciones] == cortas]
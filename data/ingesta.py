@@ -0,0 +1,264 @@
+"""
+Ingesta por bloques del archivo de siniestros.
+
+En lugar de cargar todas las filas en un único DataFrame, el archivo se lee
+en bloques de tamaño fijo y cada bloque se reduce de inmediato a una tabla de
+agregados. La memoria máxima queda acotada por el tamaño del bloque y por el
+número de combinaciones distintas, no por el tamaño del archivo.
+
+La tabla de agregados tiene una fila por (segmento, fecha de siniestro, mes de
+registro) con los conteos y sumas necesarios para reconstruir exactamente los
+valores de plata, severidad y frecuencia que calcula procesar_siniestros.
+"""
+import time
+import numpy as np
+import pandas as pd
+
+from data.dimensiones import DIMENSIONES, get_categorias, get_codigos, mascara_dimension, alinear_dimensiones
+from data.periodos import mes_entero, clave_periodo, a_fecha, periodo_fecha
+from data.data_processor import frecuencia_por_fila
+
+
+# Claves de agrupación de la tabla de agregados
+CLAVES_AGREGADOS = DIMENSIONES + ["Fecha_Siniestro", "Mes_Registro"]
+
+# Medidas acumuladas por cada clave
+MEDIDAS_AGREGADOS = [
+    "N",                    # Número de siniestros
+    "N_Bruto_Pos",          # Siniestros con Pago_Bruto > 0
+    "Suma_Bruto_Pos",       # Suma de Pago_Bruto de los anteriores
+    "Suma_Bruto",           # Suma de Pago_Bruto de todos los siniestros
+    "N_Retenido_Pos",       # Siniestros con Pago_Retenido > 0
+    "Suma_Retenido_Pos",    # Suma de Pago_Retenido de los anteriores
+    "Suma_Retenido"         # Suma de Pago_Retenido de todos los siniestros
+]
+
+# Número de filas parciales acumuladas antes de consolidarlas
+UMBRAL_CONSOLIDACION = 2_000_000
+
+
+def agregar_bloque(bloque):
+    """
+    Reduce un bloque de siniestros a la tabla de agregados.
+
+    Args:
+        bloque: DataFrame con filas de siniestros (formato de load_siniestros);
+            no se modifica
+
+    Returns:
+        DataFrame con columnas CLAVES_AGREGADOS (dimensiones como códigos
+        enteros) y MEDIDAS_AGREGADOS
+    """
+    pago_bruto = bloque["Pago_Bruto"].values.astype(np.float64)
+    pago_retenido = bloque["Pago_Retenido"].values.astype(np.float64)
+    pos_bruto = pago_bruto > 0
+    pos_retenido = pago_retenido > 0
+
+    parcial = pd.DataFrame({
+        **{col: get_codigos(bloque[col]) for col in DIMENSIONES},
+        "Fecha_Siniestro": bloque["Fecha_Siniestro"].values,
+        # Truncar al mes con aritmética de datetime64, sin construir cadenas
+        "Mes_Registro": bloque["Fecha_Registro"].values.astype("datetime64[M]").astype("datetime64[ns]"),
+        "N": np.ones(len(bloque), dtype=np.int64),
+        "N_Bruto_Pos": pos_bruto.astype(np.int64),
+        "Suma_Bruto_Pos": np.where(pos_bruto, pago_bruto, 0.0),
+        "Suma_Bruto": np.nan_to_num(pago_bruto),
+        "N_Retenido_Pos": pos_retenido.astype(np.int64),
+        "Suma_Retenido_Pos": np.where(pos_retenido, pago_retenido, 0.0),
+        "Suma_Retenido": np.nan_to_num(pago_retenido)
+    })
+
+    return consolidar_agregados([parcial])
+
+
+def consolidar_agregados(parciales):
+    """
+    Combina varias tablas de agregados parciales sumando sus medidas.
+
+    Args:
+        parciales: Lista de DataFrames de agregados
+
+    Returns:
+        DataFrame de agregados consolidado
+    """
+    df = parciales[0] if len(parciales) == 1 else pd.concat(parciales, ignore_index=True)
+    return df.groupby(CLAVES_AGREGADOS, sort=False, dropna=False)[MEDIDAS_AGREGADOS].sum().reset_index()
+
+
+def codificar_agregados(agregados):
+    """
+    Convierte los códigos de dimensión de una tabla de agregados en categóricas
+    del diccionario global (los códigos son estables, no hay recodificación).
+
+    Args:
+        agregados: DataFrame de agregados con dimensiones como códigos enteros
+
+    Returns:
+        El mismo DataFrame con las dimensiones como categóricas
+    """
+    for col in DIMENSIONES:
+        agregados[col] = pd.Categorical.from_codes(
+            agregados[col].values.astype(np.int32), categories=get_categorias(col)
+        )
+    return agregados
+
+
+def actualizar_agregados(agregados, agregados_nuevos):
+    """
+    Suma a una tabla de agregados los agregados de filas nuevas (ingesta
+    incremental). La clave incluye el mes de registro, así que solo las filas
+    de los meses de registro de las nuevas pueden coincidir con ellas: el
+    resto se conserva sin recalcular.
+
+    Args:
+        agregados: DataFrame de agregados con dimensiones categóricas
+        agregados_nuevos: Agregados de las filas nuevas, en el mismo formato
+
+    Returns:
+        DataFrame de agregados con las dimensiones como categóricas globales
+    """
+    if agregados_nuevos.empty:
+        return agregados
+    if agregados.empty:
+        return agregados_nuevos
+
+    afectados = agregados["Mes_Registro"].isin(agregados_nuevos["Mes_Registro"].unique()).values
+
+    # Consolidar sobre códigos globales, igual que en la ingesta por bloques
+    parciales = [
+        tabla.assign(**{col: get_codigos(tabla[col], col) for col in DIMENSIONES})
+        for tabla in (agregados[afectados], agregados_nuevos)
+    ]
+    consolidados = codificar_agregados(consolidar_agregados(parciales))
+
+    return pd.concat([alinear_dimensiones(agregados[~afectados].copy()), consolidados], ignore_index=True)
+
+
+def ingerir_por_bloques(path, chunksize, **read_kwargs):
+    """
+    Lee el archivo de siniestros por bloques y lo reduce a agregados.
+
+    Args:
+        path: Ruta del archivo de siniestros
+        chunksize: Número de filas por bloque
+        **read_kwargs: Opciones de lectura para pd.read_csv
+
+    Returns:
+        DataFrame de agregados con las dimensiones como categóricas globales
+    """
+    start = time.time()
+    print(f"Ingesta por bloques de {path} (bloques de {chunksize} filas)")
+
+    parciales = []
+    filas_parciales = 0
+    filas_leidas = 0
+
+    with pd.read_csv(path, chunksize=chunksize, **read_kwargs) as lector:
+        for bloque in lector:
+            filas_leidas += len(bloque)
+            parcial = agregar_bloque(bloque)
+            parciales.append(parcial)
+            filas_parciales += len(parcial)
+
+            # Consolidar periódicamente para mantener la memoria acotada
+            if filas_parciales > UMBRAL_CONSOLIDACION and len(parciales) > 1:
+                parciales = [consolidar_agregados(parciales)]
+                filas_parciales = len(parciales[0])
+
+    if parciales:
+        agregados = consolidar_agregados(parciales)
+    else:
+        agregados = pd.DataFrame(columns=CLAVES_AGREGADOS + MEDIDAS_AGREGADOS)
+
+    agregados = codificar_agregados(agregados)
+
+    print(f"Ingesta por bloques: {filas_leidas} filas reducidas a {len(agregados)} agregados "
+          f"en {time.time() - start:.2f} segundos")
+    return agregados
+
+
+def procesar_agregados(agregados, periodicidad="mes", tipo_triangulo="plata",
+                       tipo_valor="Bruto", agrupacion_reservas=None, ramo=None,
+                       canal=None, amparo=None, fecha_inicio=None, fecha_fin=None,
+                       clave_frecuencia=None):
+    """
+    Equivalente de procesar_siniestros + asignar_periodos + calcular_tiempo_desarrollo
+    sobre la tabla de agregados. El resultado se puede pasar directamente a
+    crear_triangulo_siniestralidad y produce el mismo triángulo que las filas
+    individuales.
+
+    Args:
+        agregados: DataFrame de agregados (ver ingerir_por_bloques)
+        periodicidad: Periodicidad para Periodo_Ocurrencia y Periodo_Desarrollo
+        tipo_triangulo: Tipo de triángulo ('plata', 'severidad', 'frecuencia')
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+        clave_frecuencia: Clave de los filtros para reutilizar el conteo de
+            siniestros por fecha (ver data_processor.conteo_por_fecha)
+
+    Returns:
+        DataFrame con una fila por agregado con valor, períodos y desarrollos
+    """
+    mask = np.ones(len(agregados), dtype=bool)
+
+    if agrupacion_reservas:
+        mask &= mascara_dimension(agregados["Agrupacion_Reservas"], agrupacion_reservas)
+    if ramo:
+        mask &= mascara_dimension(agregados["Ramo_Desc"], ramo)
+    if canal:
+        mask &= mascara_dimension(agregados["Apertura_Canal_Desc"], canal)
+    if amparo:
+        mask &= mascara_dimension(agregados["Apertura_Amparo_Desc"], amparo)
+    if fecha_inicio and fecha_fin:
+        fechas = agregados["Fecha_Siniestro"]
+        mask &= ((fechas >= fecha_inicio) & (fechas <= fecha_fin)).values
+
+    df = agregados[mask]
+    if df.empty:
+        return pd.DataFrame()
+
+    # Frecuencia: número de siniestros por fecha dentro del conjunto filtrado
+    frecuencia = frecuencia_por_fila(df["Fecha_Siniestro"].values, df["N"].values, clave_frecuencia)
+
+    if tipo_triangulo == "frecuencia":
+        conteo = df["N"].values
+        valor = conteo * frecuencia
+    else:
+        conteo = df[f"N_{tipo_valor}_Pos"].values
+        valor = df[f"Suma_{tipo_valor}_Pos"].values
+        if tipo_triangulo == "severidad":
+            valor = valor / frecuencia
+
+    resultado = df.assign(Valor=valor, Conteo=conteo)
+    resultado = resultado[resultado["Conteo"] > 0].copy()
+    if resultado.empty:
+        return pd.DataFrame()
+
+    # Nombre de la columna de valor que espera crear_triangulo_siniestralidad
+    if tipo_triangulo == "plata":
+        resultado[f"Pago_{tipo_valor}"] = resultado["Valor"]
+    elif tipo_triangulo == "severidad":
+        resultado["Severidad_Bruta" if tipo_valor == "Bruto" else "Severidad_Retenida"] = resultado["Valor"]
+    else:
+        resultado["Frecuencia"] = resultado["Valor"]
+
+    # Períodos de ocurrencia y desarrollos con aritmética de meses
+    mes_siniestro = resultado["Fecha_Siniestro"].values.astype("datetime64[M]")
+    meses_desarrollo = (resultado["Mes_Registro"].values.astype("datetime64[M]") - mes_siniestro).astype(np.int64)
+    meses_desarrollo = np.clip(meses_desarrollo, 0, None).astype(np.int32)
+
+    meses = mes_entero(mes_siniestro)
+    resultado["Mes_Ocurrencia"] = a_fecha(meses)
+    resultado["Trimestre_Ocurrencia"] = a_fecha(clave_periodo(meses, "trimestre"))
+    resultado["Año_Ocurrencia"] = a_fecha(clave_periodo(meses, "año"))
+    periodo_col = {"mes": "Mes_Ocurrencia", "trimestre": "Trimestre_Ocurrencia", "año": "Año_Ocurrencia"}.get(periodicidad)
+    if periodo_col:
+        resultado["Periodo_Ocurrencia"] = resultado[periodo_col]
+        resultado["Periodo_Desarrollo"] = periodo_fecha(resultado["Mes_Registro"], periodicidad)
+    
+    resultado["Desarrollo_Meses"] = meses_desarrollo
+    resultado["Desarrollo_Trimestres"] = meses_desarrollo // 3
+    resultado["Desarrollo_Años"] = meses_desarrollo // 12
+
+    return resultado
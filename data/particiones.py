@@ -0,0 +1,248 @@
+"""
+Conjuntos de siniestros particionados en varios archivos.
+
+En lugar de un único siniestros.txt, los siniestros pueden venir en un
+directorio con subdirectorios clave=valor (estilo Hive), por ejemplo:
+
+    data/siniestros/ramo=AUTOS/year=2023/part-0000.txt
+
+Las claves reconocidas están en CLAVES_PARTICION: una dimensión (ramo,
+canal, amparo, agrupacion o el nombre de la columna) o el año de la fecha
+de siniestro (year, anio o año). Las columnas de dimensión que son clave de
+partición pueden omitirse en los archivos; se completan con el valor del
+directorio. Las claves desconocidas se ignoran.
+
+Antes de abrir ningún archivo, podar_particiones descarta los que no pueden
+contener filas de la selección (ramos y rango de fechas de siniestro), de
+modo que un análisis de un solo ramo solo lee los archivos de ese ramo. Los
+archivos restantes se leen en paralelo con leer_particiones.
+"""
+import os
+import time
+from pathlib import Path
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from data.snapshot import firma_archivo
+from data.dimensiones import DIMENSIONES
+
+
+# Número máximo de hilos para leer particiones
+PARTICIONES_HILOS = int(os.environ.get("SINIESTROS_PARTICIONES_HILOS", min(8, os.cpu_count() or 1)))
+
+# Marca de la clave de año (no es una columna: es el año de Fecha_Siniestro)
+ANIO = "anio"
+
+# Claves de partición reconocidas y columna (o año) a la que corresponden
+CLAVES_PARTICION = {
+    "ramo": "Ramo_Desc",
+    "canal": "Apertura_Canal_Desc",
+    "amparo": "Apertura_Amparo_Desc",
+    "agrupacion": "Agrupacion_Reservas",
+    **{dimension: dimension for dimension in DIMENSIONES},
+    "year": ANIO,
+    "anio": ANIO,
+    "año": ANIO
+}
+
+# Valor con el que se escriben las particiones de valores nulos
+VALOR_NULO = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _oculto(nombre):
+    """Indica si un archivo o directorio no forma parte de los datos (almacenes, marcas como _SUCCESS)."""
+    return nombre.startswith((".", "_"))
+
+
+def _valor_particion(columna, valor):
+    """Convierte el valor de un directorio clave=valor al valor de la columna."""
+    valor = unquote(valor)
+    if valor == VALOR_NULO:
+        return None
+    if columna == ANIO:
+        try:
+            return int(valor)
+        except ValueError:
+            return None
+    return valor
+
+
+def listar_particiones(directorio):
+    """
+    Lista los archivos de un conjunto particionado sin abrirlos.
+
+    Args:
+        directorio: Directorio raíz del conjunto
+
+    Returns:
+        Lista ordenada de diccionarios {"path": ruta del archivo,
+        "valores": {columna o ANIO: valor}}
+    """
+    directorio = Path(directorio)
+    particiones = []
+
+    for raiz, subdirectorios, archivos in os.walk(directorio):
+        subdirectorios[:] = sorted(d for d in subdirectorios if not _oculto(d))
+
+        valores = {}
+        for parte in Path(raiz).relative_to(directorio).parts:
+            clave, separador, valor = parte.partition("=")
+            columna = CLAVES_PARTICION.get(clave)
+            if separador and columna is not None:
+                valores[columna] = _valor_particion(columna, valor)
+
+        for archivo in sorted(archivos):
+            if not _oculto(archivo):
+                particiones.append({"path": Path(raiz) / archivo, "valores": valores})
+
+    return particiones
+
+
+def _normalizar_ramos(ramos):
+    """Acepta un ramo o una lista de ramos; vacío equivale a todos."""
+    if not ramos:
+        return None
+    if isinstance(ramos, str):
+        return [ramos]
+    return list(ramos)
+
+
+def podar_particiones(particiones, ramos=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Descarta las particiones que no pueden contener filas de la selección,
+    usando solo los valores de sus directorios. Las particiones sin la clave
+    correspondiente se conservan (pueden tener filas de cualquier valor).
+
+    Args:
+        particiones: Lista de listar_particiones
+        ramos: Ramo o lista de ramos (None para todos)
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro (None para sin límite)
+
+    Returns:
+        Lista de particiones que hay que leer
+    """
+    ramos = _normalizar_ramos(ramos)
+    anio_inicio = pd.Timestamp(fecha_inicio).year if fecha_inicio else None
+    anio_fin = pd.Timestamp(fecha_fin).year if fecha_fin else None
+
+    seleccionadas = []
+    for particion in particiones:
+        valores = particion["valores"]
+        if ramos is not None and "Ramo_Desc" in valores and valores["Ramo_Desc"] not in ramos:
+            continue
+        anio = valores.get(ANIO)
+        if anio is not None and ((anio_inicio is not None and anio < anio_inicio) or
+                                 (anio_fin is not None and anio > anio_fin)):
+            continue
+        seleccionadas.append(particion)
+
+    if len(seleccionadas) < len(particiones):
+        print(f"Particiones de siniestros: {len(seleccionadas)} de {len(particiones)} archivos seleccionados")
+    return seleccionadas
+
+
+def leer_archivo_particion(particion, usecols=None, **read_kwargs):
+    """
+    Lee un archivo de una partición y completa las columnas de dimensión
+    que solo están en el nombre de sus directorios.
+
+    Args:
+        particion: Partición de listar_particiones
+        usecols: Columnas a devolver (en ese orden); pueden faltar en el
+            archivo si son claves de partición
+        **read_kwargs: Opciones de lectura para pd.read_csv
+
+    Returns:
+        DataFrame con las filas del archivo
+    """
+    if usecols is not None:
+        leer = set(usecols)
+        read_kwargs["usecols"] = lambda col: col in leer
+
+    # En un archivo pequeño una dimensión puede tener solo códigos numéricos
+    # ("069"): leerlas siempre como texto, igual que en el archivo completo
+    read_kwargs["dtype"] = {**{dimension: str for dimension in DIMENSIONES}, **read_kwargs.get("dtype", {})}
+
+    df = pd.read_csv(particion["path"], low_memory=False, **read_kwargs)
+
+    for columna, valor in particion["valores"].items():
+        if columna != ANIO and columna not in df.columns:
+            df[columna] = pd.Series(valor, index=df.index, dtype=object)
+
+    if usecols is not None:
+        df = df[[col for col in usecols if col in df.columns]]
+    return df
+
+
+def leer_particiones(particiones, leer, max_workers=PARTICIONES_HILOS):
+    """
+    Lee varias particiones en paralelo con un pool de hilos (el parser de
+    pandas libera el GIL mientras lee).
+
+    Args:
+        particiones: Lista de particiones
+        leer: Función que recibe una partición y devuelve su resultado
+        max_workers: Número máximo de hilos
+
+    Returns:
+        Lista con el resultado de cada partición, en el mismo orden
+    """
+    if not particiones:
+        return []
+
+    start = time.time()
+    max_workers = max(1, min(max_workers, len(particiones)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="particiones") as executor:
+        resultados = list(executor.map(leer, particiones))
+
+    print(f"{len(particiones)} particiones de siniestros leídas con {max_workers} hilos "
+          f"en {time.time() - start:.2f} segundos")
+    return resultados
+
+
+def filtrar_filas(df, ramos=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Filtra las filas de la selección. La poda trabaja a nivel de archivo, así
+    que los archivos leídos pueden contener filas fuera de ella (por ejemplo,
+    fechas fuera del rango dentro de un año límite).
+
+    Args:
+        df: DataFrame de siniestros
+        ramos: Ramo o lista de ramos (None para todos)
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+
+    Returns:
+        DataFrame con las filas seleccionadas (el mismo si no sobra ninguna)
+    """
+    ramos = _normalizar_ramos(ramos)
+    mask = np.ones(len(df), dtype=bool)
+    if ramos is not None:
+        mask &= df["Ramo_Desc"].isin(ramos).values
+    if fecha_inicio:
+        mask &= (df["Fecha_Siniestro"] >= pd.Timestamp(fecha_inicio)).values
+    if fecha_fin:
+        mask &= (df["Fecha_Siniestro"] <= pd.Timestamp(fecha_fin)).values
+
+    if mask.all():
+        return df
+    return df[mask]
+
+
+def firma_particiones(directorio):
+    """
+    Obtiene la firma (tamaño y fecha de modificación) de todos los archivos
+    de un conjunto particionado, para detectar cambios sin leerlos.
+
+    Args:
+        directorio: Directorio raíz del conjunto
+
+    Returns:
+        Diccionario {ruta relativa: firma}
+    """
+    directorio = Path(directorio)
+    return {
+        particion["path"].relative_to(directorio).as_posix(): firma_archivo(particion["path"])
+        for particion in listar_particiones(directorio)
+    }
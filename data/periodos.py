@@ -0,0 +1,94 @@
+"""
+Codificación entera de períodos.
+
+Un mes se representa como int32 "meses desde 1970-01" (enero de 1970 = 0).
+Los trimestres y años se obtienen con división entera: la clave de un
+período es el mes en que empieza (por ejemplo, el trimestre de 2021-05 es
+2021-04), de modo que claves de distinta periodicidad siguen siendo meses y
+se pueden comparar y cruzar entre siniestros y expuestos sin construir fechas.
+
+Las fechas (primer día del período) solo se materializan al final, para
+mostrar los resultados, con una conversión de arrays sin pasar por texto.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Meses por período de cada periodicidad (nombres en español y en inglés)
+MESES_PERIODO = {
+    "mes": 1, "trimestre": 3, "año": 12,
+    "month": 1, "quarter": 3, "year": 12
+}
+
+# Clave asignada a las fechas nulas
+MES_NULO = np.iinfo(np.int32).min
+
+
+def mes_entero(fechas):
+    """
+    Convierte fechas a meses desde 1970-01.
+
+    Args:
+        fechas: Array, Serie o índice de fechas (datetime64 o convertible)
+
+    Returns:
+        Array int32; las fechas nulas reciben MES_NULO
+    """
+    if isinstance(fechas, (pd.Series, pd.Index)):
+        fechas = fechas.values
+    fechas = np.asarray(fechas)
+    if fechas.dtype.kind != "M":
+        fechas = pd.to_datetime(fechas).values
+    meses = fechas.astype("datetime64[M]")
+
+    claves = meses.astype(np.int64).astype(np.int32)
+    claves[np.isnat(meses)] = MES_NULO
+    return claves
+
+
+def clave_periodo(meses, periodicidad="mes"):
+    """
+    Obtiene la clave del período (mes en que empieza) de cada mes.
+
+    Args:
+        meses: Array int32 de meses desde 1970-01 (ver mes_entero)
+        periodicidad: 'mes', 'trimestre' o 'año' (o 'month', 'quarter', 'year')
+
+    Returns:
+        Array int32 con la clave del período; los nulos se conservan
+    """
+    meses = np.asarray(meses, dtype=np.int32)
+    meses_periodo = MESES_PERIODO[periodicidad]
+    if meses_periodo == 1:
+        return meses
+    return np.where(meses == MES_NULO, MES_NULO, meses // meses_periodo * meses_periodo).astype(np.int32)
+
+
+def a_fecha(claves):
+    """
+    Materializa claves de mes como fechas (primer día del mes).
+
+    Args:
+        claves: Array de meses desde 1970-01
+
+    Returns:
+        Array datetime64[ns]; MES_NULO se convierte en NaT
+    """
+    claves = np.asarray(claves, dtype=np.int64)
+    fechas = claves.astype("datetime64[M]").astype("datetime64[ns]")
+    fechas[claves == MES_NULO] = np.datetime64("NaT")
+    return fechas
+
+
+def periodo_fecha(fechas, periodicidad="mes"):
+    """
+    Obtiene el primer día del período de cada fecha con aritmética entera.
+
+    Args:
+        fechas: Array, Serie o índice de fechas
+        periodicidad: 'mes', 'trimestre' o 'año' (o 'month', 'quarter', 'year')
+
+    Returns:
+        Array datetime64[ns]
+    """
+    return a_fecha(clave_periodo(mes_entero(fechas), periodicidad))
@@ -0,0 +1,568 @@
+"""
+Almacén de resultados del lado del servidor.
+
+Los callbacks no intercambian DataFrames completos a través de dcc.Store
+(lo que obliga a serializarlos a JSON, enviarlos al navegador y reconstruirlos
+en cada petición). En su lugar guardan el DataFrame en este almacén y ponen en
+el Store solo un identificador corto (hash del contenido). El callback que lo
+recibe recupera el DataFrame con obtener_resultado.
+
+El almacén tiene dos niveles: un LRU en memoria acotado por número de
+elementos y, opcionalmente, un nivel compartido entre procesos (directorio
+en disco o Redis) para que todos los workers de gunicorn vean los mismos
+resultados. El backend se elige con RESULTADOS_BACKEND ("memoria",
+"archivos" o "redis"). En el nivel compartido los DataFrames se guardan como
+archivos .npz (un array por columna, sin pickle).
+
+Si un identificador ya no está disponible (fue desalojado), obtener_resultado
+devuelve None. recuperar_resultado lo recalcula entonces con la función
+memoizada que lo produjo y los mismos parámetros (registrados por
+memoizar_resultado en este proceso); si no se puede, el callback que lo
+recibe no actualiza la interfaz en lugar de mostrarla vacía.
+
+memoizar_resultado reemplaza a cache.memoize en los callbacks: la clave se
+forma con los parámetros de filtro normalizados y la versión de los datos, en
+lugar de con la representación completa de los argumentos. Si varias
+peticiones piden la misma clave a la vez, solo una calcula y las demás
+esperan su resultado (ver calcular_una_vez). Cuando una versión de los datos
+se descarta (ver data.versiones) se borran de la caché las claves que se
+guardaron con ella.
+"""
+import io
+import os
+import re
+import json
+import inspect
+import hashlib
+import functools
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+from data.data_loader import get_version_datos
+from data.snapshot import codificar_columna, decodificar_columna
+from data.versiones import al_descartar
+
+
+# Número máximo de resultados guardados en memoria
+MAX_RESULTADOS = int(os.environ.get("RESULTADOS_MAX_ELEMENTOS", 64))
+
+# Nivel compartido: "memoria" (ninguno), "archivos" o "redis"
+RESULTADOS_BACKEND = os.environ.get("RESULTADOS_BACKEND", "memoria")
+
+# Directorio del backend "archivos" y tamaño máximo que puede ocupar
+RESULTADOS_DIR = Path(os.environ.get(
+    "RESULTADOS_DIR", Path(__file__).parent.parent / "cache-directory" / "resultados"
+))
+RESULTADOS_MAX_BYTES = int(os.environ.get("RESULTADOS_MAX_BYTES", 2 * 1024 ** 3))
+
+# URL del backend "redis" y tiempo de vida de cada resultado (segundos)
+RESULTADOS_REDIS_URL = os.environ.get("RESULTADOS_REDIS_URL", "redis://localhost:6379/0")
+RESULTADOS_TTL = int(os.environ.get("RESULTADOS_TTL", 24 * 3600))
+
+# Formato de los identificadores (también protege las rutas del backend de archivos)
+_PATRON_HANDLE = re.compile(r"^[0-9a-f]{24}$")
+
+_lock = threading.Lock()
+_resultados = OrderedDict()
+_redis = None
+
+# Cálculos en curso por clave (para no repetir el mismo cálculo en paralelo)
+_lock_en_curso = threading.Lock()
+_en_curso = {}
+
+# Número máximo de identificadores con el cálculo que los produjo registrado
+MAX_PRODUCTORES = int(os.environ.get("RESULTADOS_MAX_PRODUCTORES", 1024))
+
+# Cálculo que produjo cada identificador: {handle: (función memoizada, args, kwargs)}
+_lock_productores = threading.Lock()
+_productores = OrderedDict()
+
+# Claves guardadas por memoizar_resultado por versión de los datos: {versión: {(backend, clave)}}
+# (un conjunto: una clave recalculada tras expirar o desalojarse no se repite)
+_lock_claves = threading.Lock()
+_claves_version = {}
+
+
+def calcular_handle(df):
+    """
+    Calcula el identificador de un DataFrame a partir de su contenido.
+
+    Args:
+        df: DataFrame
+
+    Returns:
+        Cadena hexadecimal que identifica el contenido
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    sha1.update(str(df.index.name).encode())
+    if len(df) > 0:
+        sha1.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return sha1.hexdigest()[:24]
+
+
+def serializar_resultado(df):
+    """
+    Serializa un DataFrame en formato .npz (un array por columna, sin pickle).
+
+    Args:
+        df: DataFrame
+
+    Returns:
+        Bytes del archivo .npz
+    """
+    arrays = {}
+    columnas = []
+    series = [("index", pd.Series(df.index))] + [(col, df.iloc[:, i]) for i, col in enumerate(df.columns)]
+
+    for i, (nombre, serie) in enumerate(series):
+        tipo, valores, categorias = codificar_columna(serie)
+        arrays[f"c{i}"] = valores
+        if categorias is not None:
+            arrays[f"c{i}_cat"] = categorias
+        columnas.append({"nombre": nombre, "tipo": tipo})
+
+    meta = {
+        "columnas": columnas[1:],
+        "indice": columnas[0],
+        "nombre_indice": df.index.name,
+        "nombre_columnas": df.columns.name
+    }
+    arrays["meta"] = np.frombuffer(json.dumps(meta, default=str).encode(), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def deserializar_resultado(datos):
+    """
+    Reconstruye un DataFrame serializado con serializar_resultado.
+
+    Args:
+        datos: Bytes del archivo .npz
+
+    Returns:
+        DataFrame
+    """
+    with np.load(io.BytesIO(datos), allow_pickle=False) as npz:
+        meta = json.loads(npz["meta"].tobytes().decode())
+
+        def columna(i, info):
+            categorias = npz[f"c{i}_cat"] if info["tipo"] != "array" else None
+            return decodificar_columna(info["tipo"], npz[f"c{i}"], categorias)
+
+        indice = pd.Index(columna(0, meta["indice"]), name=meta["nombre_indice"])
+        data = {info["nombre"]: columna(i + 1, info) for i, info in enumerate(meta["columnas"])}
+
+    df = pd.DataFrame(data, index=indice)
+    df.columns.name = meta["nombre_columnas"]
+    return df
+
+
+def _get_redis():
+    """Obtiene (una sola vez) el cliente de Redis del backend compartido."""
+    global _redis
+    if _redis is None:
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("El backend de resultados 'redis' requiere el paquete redis (pip install redis)")
+        _redis = redis.Redis.from_url(RESULTADOS_REDIS_URL)
+    return _redis
+
+
+def _escribir_compartido(handle, datos):
+    """Guarda los bytes de un resultado en el nivel compartido."""
+    if RESULTADOS_BACKEND == "redis":
+        _get_redis().set(f"resultado:{handle}", datos, ex=RESULTADOS_TTL)
+        return
+
+    RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+    destino = RESULTADOS_DIR / f"{handle}.npz"
+    tmp_path = RESULTADOS_DIR / f"{handle}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(datos)
+    os.replace(tmp_path, destino)
+    _desalojar_archivos()
+
+
+def _leer_compartido(handle):
+    """Lee los bytes de un resultado del nivel compartido, o None si no existe."""
+    if RESULTADOS_BACKEND == "redis":
+        return _get_redis().get(f"resultado:{handle}")
+
+    path = RESULTADOS_DIR / f"{handle}.npz"
+    try:
+        with open(path, "rb") as f:
+            datos = f.read()
+        # La fecha de modificación hace de marca de último uso para el LRU
+        os.utime(path)
+        return datos
+    except FileNotFoundError:
+        return None
+
+
+def _existe_compartido(handle):
+    """Indica si un resultado existe en el nivel compartido."""
+    if RESULTADOS_BACKEND == "redis":
+        return bool(_get_redis().exists(f"resultado:{handle}"))
+    return (RESULTADOS_DIR / f"{handle}.npz").exists()
+
+
+def _desalojar_archivos():
+    """Elimina los resultados menos usados si el directorio supera el tamaño máximo."""
+    archivos = []
+    total = 0
+    for entrada in os.scandir(RESULTADOS_DIR):
+        if entrada.name.endswith(".npz"):
+            try:
+                stat = entrada.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((stat.st_mtime_ns, stat.st_size, entrada.path))
+            total += stat.st_size
+
+    if total <= RESULTADOS_MAX_BYTES:
+        return
+
+    # Borrar los más antiguos hasta bajar al 90% del máximo
+    for _, size, path in sorted(archivos):
+        if total <= RESULTADOS_MAX_BYTES * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _guardar_en_memoria(handle, df):
+    """Guarda un DataFrame en el LRU en memoria."""
+    with _lock:
+        _resultados[handle] = df
+        _resultados.move_to_end(handle)
+        while len(_resultados) > MAX_RESULTADOS:
+            _resultados.popitem(last=False)
+
+
+def guardar_resultado(df):
+    """
+    Guarda un DataFrame en el almacén.
+
+    Args:
+        df: DataFrame a guardar; no debe modificarse después
+
+    Returns:
+        Identificador para recuperarlo, o None si df es None
+    """
+    if df is None:
+        return None
+
+    handle = calcular_handle(df)
+    _guardar_en_memoria(handle, df)
+
+    if RESULTADOS_BACKEND != "memoria":
+        try:
+            if not _existe_compartido(handle):
+                _escribir_compartido(handle, serializar_resultado(df))
+        except Exception as e:
+            # El resultado sigue disponible en este proceso
+            print(f"No se pudo guardar el resultado {handle} en el backend compartido: {str(e)}")
+
+    return handle
+
+
+def obtener_resultado(handle):
+    """
+    Recupera un DataFrame del almacén.
+
+    Args:
+        handle: Identificador devuelto por guardar_resultado
+
+    Returns:
+        DataFrame, o None si el identificador no existe o fue desalojado
+    """
+    if not handle or not isinstance(handle, str) or not _PATRON_HANDLE.match(handle):
+        return None
+
+    with _lock:
+        df = _resultados.get(handle)
+        if df is not None:
+            _resultados.move_to_end(handle)
+            return df
+
+    if RESULTADOS_BACKEND == "memoria":
+        return None
+
+    try:
+        datos = _leer_compartido(handle)
+        if datos is None:
+            return None
+        df = deserializar_resultado(datos)
+    except Exception as e:
+        print(f"Error al leer el resultado {handle} del backend compartido: {str(e)}")
+        return None
+
+    _guardar_en_memoria(handle, df)
+    return df
+
+
+def _registrar_productor(handle, funcion, args, kwargs):
+    """Registra la función memoizada y los parámetros que produjeron un identificador."""
+    with _lock_productores:
+        _productores[handle] = (funcion, args, kwargs)
+        _productores.move_to_end(handle)
+        while len(_productores) > MAX_PRODUCTORES:
+            _productores.popitem(last=False)
+
+
+def recuperar_resultado(handle):
+    """
+    Recupera un DataFrame del almacén y, si fue desalojado, lo recalcula con
+    la función memoizada que produjo el identificador.
+
+    Args:
+        handle: Identificador devuelto por una función memoizada con
+            devuelve_handle
+
+    Returns:
+        DataFrame, o None si no está disponible y no se pudo recalcular
+    """
+    df = obtener_resultado(handle)
+    if df is not None or not handle:
+        return df
+
+    with _lock_productores:
+        productor = _productores.get(handle)
+    if productor is None:
+        print(f"Resultado {handle} no disponible y sin cálculo registrado en este proceso")
+        return None
+
+    funcion, args, kwargs = productor
+    print(f"Resultado {handle} no disponible: recalculando con {funcion.__name__}")
+    nuevo = funcion(*args, **kwargs)
+    if nuevo != handle:
+        print(f"El recálculo de {handle} produjo el resultado {nuevo}")
+    return obtener_resultado(nuevo)
+
+
+def existe_resultado(handle):
+    """
+    Indica si un identificador sigue disponible en el almacén.
+
+    Args:
+        handle: Identificador
+
+    Returns:
+        True si el resultado está disponible
+    """
+    if not isinstance(handle, str) or not _PATRON_HANDLE.match(handle):
+        return False
+
+    with _lock:
+        if handle in _resultados:
+            return True
+
+    if RESULTADOS_BACKEND == "memoria":
+        return False
+
+    try:
+        return _existe_compartido(handle)
+    except Exception:
+        return False
+
+
+def normalizar_parametro(nombre, valor):
+    """
+    Normaliza un parámetro para la clave de caché. Los valores vacíos ("" y
+    None) son equivalentes, y las fechas (parámetros cuyo nombre empieza por
+    "fecha") se llevan a un formato único sin importar cómo llegaron.
+
+    Args:
+        nombre: Nombre del parámetro
+        valor: Valor recibido
+
+    Returns:
+        Valor normalizado, serializable a JSON
+    """
+    if valor is None or (isinstance(valor, str) and valor.strip() == ""):
+        return None
+
+    if nombre.startswith("fecha"):
+        try:
+            fecha = pd.Timestamp(valor)
+        except (TypeError, ValueError):
+            return str(valor)
+        # Las fechas sin hora se representan solo con el día
+        if fecha == fecha.normalize():
+            return fecha.strftime("%Y-%m-%d")
+        return fecha.isoformat()
+
+    return valor
+
+
+def clave_resultado(nombre, parametros):
+    """
+    Construye la clave de caché de un resultado.
+
+    Args:
+        nombre: Nombre del cálculo (prefijo de la clave)
+        parametros: Diccionario {parámetro: valor}
+
+    Returns:
+        Cadena con nombre, versión de los datos y hash de los parámetros
+    """
+    canonicos = {k: normalizar_parametro(k, v) for k, v in parametros.items()}
+    texto = json.dumps(canonicos, sort_keys=True, default=str)
+    return f"{nombre}:{get_version_datos()}:{hashlib.md5(texto.encode()).hexdigest()}"
+
+
+def filtros_segmento(ramo=None, canal=None, amparo=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Normaliza los filtros de la interfaz (la opción "Todos" llega como "").
+    La pestaña de datos y los triángulos construyen con ellos la misma clave
+    de frecuencia, de modo que ambos cuentan los siniestros por fecha sobre
+    el mismo conjunto de filas.
+
+    Args:
+        ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+
+    Returns:
+        Diccionario de filtros con None en los que no se aplican
+    """
+    return dict(ramo=ramo or None, canal=canal or None, amparo=amparo or None,
+                fecha_inicio=fecha_inicio or None, fecha_fin=fecha_fin or None)
+
+
+def clave_frecuencia(agrupacion_reservas=None, ramo=None, canal=None, amparo=None,
+                     fecha_inicio=None, fecha_fin=None):
+    """
+    Construye la clave del conteo de siniestros por fecha de un filtro. El
+    conteo no depende de la periodicidad ni del tipo de triángulo, así que
+    todos los cálculos con los mismos filtros comparten la misma clave (ver
+    data_processor.conteo_por_fecha).
+
+    Args:
+        agrupacion_reservas, ramo, canal, amparo: Filtros de segmento
+        fecha_inicio, fecha_fin: Rango de fechas de siniestro
+
+    Returns:
+        Clave de caché
+    """
+    return clave_resultado("frecuencia", {
+        "agrupacion_reservas": agrupacion_reservas,
+        "ramo": ramo,
+        "canal": canal,
+        "amparo": amparo,
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin
+    })
+
+
+def calcular_una_vez(clave, calcular):
+    """
+    Ejecuta un cálculo una sola vez aunque varios hilos lo pidan al mismo
+    tiempo con la misma clave. El primero lo ejecuta y los demás esperan y
+    reciben el mismo resultado (o la misma excepción).
+
+    Args:
+        clave: Clave del cálculo
+        calcular: Función sin argumentos que realiza el cálculo
+
+    Returns:
+        Resultado del cálculo
+    """
+    with _lock_en_curso:
+        futuro = _en_curso.get(clave)
+        propietario = futuro is None
+        if propietario:
+            futuro = Future()
+            _en_curso[clave] = futuro
+
+    if not propietario:
+        return futuro.result()
+
+    try:
+        valor = calcular()
+        futuro.set_result(valor)
+        return valor
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    finally:
+        with _lock_en_curso:
+            _en_curso.pop(clave, None)
+
+
+def memoizar_resultado(cache, devuelve_handle=False):
+    """
+    Decorador de memoización con claves formadas por los parámetros
+    normalizados (ver clave_resultado). Los resultados None no se guardan.
+    Las llamadas simultáneas con la misma clave comparten un único cálculo.
+
+    Args:
+        cache: Objeto de caché de Flask
+        devuelve_handle: Si la función devuelve un identificador del almacén;
+            en ese caso un identificador desalojado se recalcula y se
+            registra cómo rehacer cada uno (ver recuperar_resultado)
+
+    Returns:
+        Decorador
+    """
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            parametros = firma.bind(*args, **kwargs)
+            parametros.apply_defaults()
+            version = get_version_datos()
+            clave = clave_resultado(funcion.__name__, parametros.arguments)
+
+            def vigente(valor):
+                return valor is not None and (not devuelve_handle or existe_resultado(valor))
+
+            valor = cache.get(clave)
+            if vigente(valor):
+                if devuelve_handle:
+                    _registrar_productor(valor, envoltura, args, kwargs)
+                return valor
+
+            def calcular():
+                # Otro hilo pudo terminar el cálculo mientras se consultaba la caché
+                valor = cache.get(clave)
+                if vigente(valor):
+                    return valor
+
+                valor = funcion(*args, **kwargs)
+                if valor is not None:
+                    cache.set(clave, valor)
+                    # Se guarda el backend (cache.cache) y no el objeto de Flask para
+                    # poder borrar la clave fuera del contexto de la aplicación
+                    with _lock_claves:
+                        _claves_version.setdefault(version, set()).add((cache.cache, clave))
+                return valor
+
+            valor = calcular_una_vez(clave, calcular)
+            if devuelve_handle and valor is not None:
+                _registrar_productor(valor, envoltura, args, kwargs)
+            return valor
+
+        return envoltura
+
+    return decorador
+
+
+@al_descartar
+def _invalidar_version(version):
+    """Borra de la caché los resultados memoizados con una versión descartada."""
+    with _lock_claves:
+        claves = _claves_version.pop(version, set())
+    for cache, clave in claves:
+        cache.delete(clave)
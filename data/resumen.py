@@ -0,0 +1,124 @@
+"""
+Resumen de los datos filtrados para la pestaña de datos.
+
+Las métricas, el gráfico de barras por período de ocurrencia, el gráfico de
+líneas por período de desarrollo y la tabla de ocurrencia salen del mismo
+conjunto filtrado. calcular_resumen extrae una sola vez las columnas que
+necesitan y calcula las etapas independientes (agrupación por ocurrencia,
+agrupación por desarrollo y totales) en paralelo en un pool de hilos.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+# Número de hilos del pool de resumen
+RESUMEN_HILOS = int(os.environ.get("RESUMEN_HILOS", 3))
+
+_executor = ThreadPoolExecutor(max_workers=RESUMEN_HILOS, thread_name_prefix="resumen")
+
+
+def _reiniciar_executor():
+    """Crea un pool nuevo en el proceso hijo: los hilos del padre no sobreviven a fork."""
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=RESUMEN_HILOS, thread_name_prefix="resumen")
+
+
+os.register_at_fork(after_in_child=_reiniciar_executor)
+
+
+def extraer_columnas_resumen(df, tipo_valor="Bruto"):
+    """
+    Extrae las columnas que usa el resumen en un DataFrame compacto.
+
+    Args:
+        df: DataFrame filtrado (salida de procesar_siniestros)
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+
+    Returns:
+        DataFrame con períodos, Conteo_Incurrido, Pago, Con_Pago y Valor
+    """
+    pago_columna = f"Pago_{tipo_valor}"
+    n = len(df)
+
+    pagos = df[pago_columna].values.astype(np.float64) if pago_columna in df.columns else np.zeros(n)
+    valores = df["Valor"].values.astype(np.float64) if "Valor" in df.columns else pagos
+
+    return pd.DataFrame({
+        "Periodo_Ocurrencia": pd.to_datetime(df["Periodo_Ocurrencia"].values),
+        "Periodo_Desarrollo": pd.to_datetime(df["Periodo_Desarrollo"].values),
+        "Conteo_Incurrido": df["Conteo_Incurrido"].values,
+        "Pago": pagos,
+        "Con_Pago": (pagos > 0).astype(np.int64),
+        "Valor": valores
+    })
+
+
+def resumir_por_periodo(columnas, periodo_col):
+    """
+    Agrupa el resumen por una columna de período.
+
+    Args:
+        columnas: DataFrame de extraer_columnas_resumen
+        periodo_col: 'Periodo_Ocurrencia' o 'Periodo_Desarrollo'
+
+    Returns:
+        DataFrame ordenado por período con Total_Siniestros,
+        Siniestros_Con_Pago y Total_Pagos
+    """
+    return columnas.groupby(periodo_col, sort=True).agg(
+        Total_Siniestros=("Conteo_Incurrido", "nunique"),
+        Siniestros_Con_Pago=("Con_Pago", "sum"),
+        Total_Pagos=("Pago", "sum")
+    ).reset_index()
+
+
+def calcular_metricas(columnas):
+    """
+    Calcula las métricas totales del conjunto filtrado.
+
+    Args:
+        columnas: DataFrame de extraer_columnas_resumen
+
+    Returns:
+        Diccionario con total_siniestros, siniestros_pagados, total_pagos y
+        total_incurrido
+    """
+    return {
+        "total_siniestros": len(columnas),
+        "siniestros_pagados": int(columnas["Con_Pago"].values.sum()),
+        "total_pagos": float(np.nansum(columnas["Pago"].values)),
+        "total_incurrido": float(np.nansum(columnas["Valor"].values))
+    }
+
+
+def calcular_resumen(df, tipo_valor="Bruto"):
+    """
+    Calcula todo el resumen de la pestaña de datos en una pasada.
+
+    Args:
+        df: DataFrame filtrado (salida de procesar_siniestros)
+        tipo_valor: Tipo de valor ('Bruto', 'Retenido')
+
+    Returns:
+        Diccionario con 'metricas' (ver calcular_metricas), 'ocurrencia' y
+        'desarrollo' (DataFrames de resumir_por_periodo)
+    """
+    start = time.time()
+    columnas = extraer_columnas_resumen(df, tipo_valor)
+
+    # Las tres etapas son independientes entre sí
+    futuro_ocurrencia = _executor.submit(resumir_por_periodo, columnas, "Periodo_Ocurrencia")
+    futuro_desarrollo = _executor.submit(resumir_por_periodo, columnas, "Periodo_Desarrollo")
+    metricas = calcular_metricas(columnas)
+
+    resumen = {
+        "metricas": metricas,
+        "ocurrencia": futuro_ocurrencia.result(),
+        "desarrollo": futuro_desarrollo.result()
+    }
+
+    print(f"Cálculo de resumen: {time.time() - start:.2f} segundos, {len(df)} filas")
+    return resumen
@@ -0,0 +1,441 @@
+"""
+Módulo para la gestión de snapshots columnares de los archivos de datos.
+
+La primera vez que se lee un archivo de texto se guarda una copia binaria
+con un archivo .npy por columna. Las cargas siguientes leen esa copia y solo
+la reconstruyen cuando el archivo fuente cambia (tamaño, fecha de
+modificación o hash del contenido).
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+# Versión del formato; si cambia, los snapshots existentes se descartan
+SNAPSHOT_VERSION = 1
+
+# Tamaño de bloque para calcular el hash del archivo fuente (8 MB)
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def get_snapshot_dir(source_path):
+    """
+    Obtiene el directorio donde se guardan los snapshots de un archivo fuente.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+
+    Returns:
+        Ruta del directorio de snapshots
+    """
+    return Path(source_path).parent / ".snapshot"
+
+
+def firma_archivo(source_path):
+    """
+    Obtiene la firma rápida (tamaño y fecha de modificación) de un archivo.
+
+    Args:
+        source_path: Ruta del archivo
+
+    Returns:
+        Diccionario con 'size' y 'mtime_ns'
+    """
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def hash_archivo(source_path, limite=None):
+    """
+    Calcula el hash MD5 del contenido de un archivo leyendo por bloques.
+
+    Args:
+        source_path: Ruta del archivo
+        limite: Número de bytes iniciales a considerar (por defecto todo el archivo)
+
+    Returns:
+        Cadena hexadecimal con el hash
+    """
+    md5 = hashlib.md5()
+    restante = limite
+    with open(source_path, "rb") as f:
+        while restante is None or restante > 0:
+            bloque = f.read(HASH_CHUNK_SIZE if restante is None else min(HASH_CHUNK_SIZE, restante))
+            if not bloque:
+                break
+            md5.update(bloque)
+            if restante is not None:
+                restante -= len(bloque)
+    return md5.hexdigest()
+
+
+def _leer_metadatos(meta_path, version=SNAPSHOT_VERSION):
+    """Lee el archivo de metadatos de un snapshot, o None si no es válido."""
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if meta.get("version") != version:
+        return None
+
+    return meta
+
+
+def _escribir_metadatos(meta_path, meta):
+    """Escribe los metadatos de forma atómica (archivo temporal + rename)."""
+    tmp_path = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+
+
+def leer_metadatos(source_path, snapshot_dir=None, version=SNAPSHOT_VERSION):
+    """
+    Lee los metadatos del último snapshot de un archivo fuente, sin comprobar
+    si sigue correspondiendo al archivo (ver snapshot_vigente).
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        snapshot_dir: Directorio de snapshots (por defecto get_snapshot_dir)
+        version: Versión de formato que deben tener los metadatos
+
+    Returns:
+        Diccionario de metadatos, o None si no hay snapshot
+    """
+    source_path = Path(source_path)
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else get_snapshot_dir(source_path)
+
+    meta = _leer_metadatos(snapshot_dir / f"{source_path.stem}.json", version)
+    if meta is None or not (snapshot_dir / meta["directorio"]).is_dir():
+        return None
+    return meta
+
+
+def snapshot_vigente(source_path, snapshot_dir=None, version=SNAPSHOT_VERSION):
+    """
+    Verifica si existe un snapshot válido para el archivo fuente.
+
+    La comparación de tamaño y fecha de modificación es inmediata. Solo si
+    alguna de las dos cambió se calcula el hash del contenido; si el hash
+    coincide (archivo copiado o tocado sin cambios) se actualiza la firma y
+    el snapshot se sigue usando.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        snapshot_dir: Directorio de snapshots (por defecto get_snapshot_dir)
+        version: Versión de formato que deben tener los metadatos
+
+    Returns:
+        Diccionario de metadatos si el snapshot es válido, None en caso contrario
+    """
+    source_path = Path(source_path)
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else get_snapshot_dir(source_path)
+    meta_path = snapshot_dir / f"{source_path.stem}.json"
+
+    meta = leer_metadatos(source_path, snapshot_dir, version)
+    if meta is None:
+        return None
+
+    firma = firma_archivo(source_path)
+    if firma == meta["firma"]:
+        return meta
+
+    # La firma rápida cambió: comparar por contenido antes de descartar
+    if firma["size"] != meta["firma"]["size"] or hash_archivo(source_path) != meta["hash"]:
+        return None
+
+    meta["firma"] = firma
+    try:
+        _escribir_metadatos(meta_path, meta)
+    except OSError as e:
+        print(f"No se pudo actualizar la firma del snapshot: {str(e)}")
+
+    return meta
+
+
+def codificar_columna(serie):
+    """
+    Convierte una columna en arrays de NumPy que se pueden guardar sin pickle.
+
+    Las columnas numéricas y de fecha se guardan tal cual; las de texto y las
+    categóricas se guardan como códigos enteros más la lista de valores.
+
+    Args:
+        serie: Serie de pandas
+
+    Returns:
+        Tupla (tipo, valores, categorias); categorias es None para tipo "array"
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return "category", serie.cat.codes.values.astype(np.int32), serie.cat.categories.values.astype(str)
+
+    if serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+        codigos, categorias = pd.factorize(serie, sort=True)
+        return "str", codigos.astype(np.int32), np.asarray(categorias, dtype=str)
+
+    return "array", serie.values, None
+
+
+def decodificar_columna(tipo, valores, categorias=None):
+    """
+    Reconstruye una columna guardada con codificar_columna.
+
+    Args:
+        tipo: Tipo devuelto por codificar_columna
+        valores: Array de valores o de códigos
+        categorias: Array de categorías (tipos "str" y "category")
+
+    Returns:
+        Array o Categorical con los datos de la columna
+    """
+    if tipo == "array":
+        return valores
+
+    categorical = pd.Categorical.from_codes(valores, categories=categorias.astype(object))
+    if tipo == "category":
+        return categorical
+    return np.asarray(categorical, dtype=object)
+
+
+def escribir_tabla(df, directorio):
+    """
+    Escribe las columnas de un DataFrame como archivos .npy (ver codificar_columna).
+
+    Args:
+        df: DataFrame a guardar
+        directorio: Directorio (existente) donde se escriben los archivos
+
+    Returns:
+        Lista con el nombre, tipo y archivo de cada columna
+    """
+    columnas = []
+    for i, col in enumerate(df.columns):
+        archivo = f"col_{i:03d}"
+        tipo, valores, categorias = codificar_columna(df[col])
+
+        np.save(directorio / f"{archivo}.npy", valores, allow_pickle=False)
+        if categorias is not None:
+            np.save(directorio / f"{archivo}_cat.npy", categorias, allow_pickle=False)
+        columnas.append({"nombre": col, "tipo": tipo, "archivo": archivo})
+    return columnas
+
+
+def leer_tabla(directorio, columnas):
+    """
+    Lee un DataFrame escrito con escribir_tabla.
+
+    Args:
+        directorio: Directorio con los archivos .npy
+        columnas: Lista devuelta por escribir_tabla
+
+    Returns:
+        DataFrame con los datos
+    """
+    data = {}
+    for col in columnas:
+        valores = np.load(directorio / f"{col['archivo']}.npy", allow_pickle=False)
+        categorias = None
+        if col["tipo"] != "array":
+            categorias = np.load(directorio / f"{col['archivo']}_cat.npy", allow_pickle=False)
+        data[col["nombre"]] = decodificar_columna(col["tipo"], valores, categorias)
+    return pd.DataFrame(data)
+
+
+def directorio_temporal(snapshot_dir, source_path):
+    """
+    Crea el directorio temporal (propio del proceso) donde se escribe un
+    snapshot antes de publicarlo con publicar_directorio.
+
+    Args:
+        snapshot_dir: Directorio de snapshots
+        source_path: Ruta del archivo de texto original
+
+    Returns:
+        Tupla (ruta del directorio temporal, firma, hash del archivo fuente,
+        nombre definitivo del directorio)
+    """
+    source_path = Path(source_path)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    firma = firma_archivo(source_path)
+    hash_fuente = hash_archivo(source_path)
+    directorio = f"{source_path.stem}-{hash_fuente[:16]}"
+
+    tmp_dir = snapshot_dir / f"{directorio}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    return tmp_dir, firma, hash_fuente, directorio
+
+
+def publicar_directorio(tmp_dir, source_path, meta):
+    """
+    Publica un snapshot escrito en un directorio temporal: lo renombra a su
+    nombre definitivo, reemplaza los metadatos de forma atómica y elimina
+    los snapshots anteriores del mismo archivo.
+
+    Args:
+        tmp_dir: Directorio temporal de directorio_temporal
+        source_path: Ruta del archivo de texto original
+        meta: Metadatos del snapshot (con 'directorio')
+    """
+    source_path = Path(source_path)
+    snapshot_dir = tmp_dir.parent
+    directorio = meta["directorio"]
+
+    # Publicar el directorio; si otro proceso ya lo creó, usar el suyo
+    try:
+        os.rename(tmp_dir, snapshot_dir / directorio)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _escribir_metadatos(snapshot_dir / f"{source_path.stem}.json", meta)
+
+    # Eliminar snapshots anteriores del mismo archivo
+    for anterior in snapshot_dir.glob(f"{source_path.stem}-*"):
+        if anterior.is_dir() and anterior.name != directorio and not anterior.name.endswith(".tmp"):
+            shutil.rmtree(anterior, ignore_errors=True)
+
+
+def guardar_snapshot(df, source_path):
+    """
+    Guarda un DataFrame como snapshot columnar del archivo fuente.
+
+    Cada columna se guarda en un archivo .npy con su tipo original. Las
+    columnas de texto se guardan como códigos enteros más la lista de valores
+    distintos, para no depender de pickle.
+
+    Los archivos se escriben en un directorio nuevo y los metadatos se
+    reemplazan de forma atómica, de modo que varios procesos pueden intentar
+    crear el snapshot al mismo tiempo sin dejar uno corrupto.
+
+    Args:
+        df: DataFrame a guardar
+        source_path: Ruta del archivo de texto original
+    """
+    start = time.time()
+    source_path = Path(source_path)
+
+    # Escribir en un directorio temporal propio del proceso
+    tmp_dir, firma, hash_fuente, directorio = directorio_temporal(get_snapshot_dir(source_path), source_path)
+
+    columnas = escribir_tabla(df, tmp_dir)
+
+    publicar_directorio(tmp_dir, source_path, {
+        "version": SNAPSHOT_VERSION,
+        "firma": firma,
+        "hash": hash_fuente,
+        "directorio": directorio,
+        "filas": len(df),
+        "columnas": columnas
+    })
+
+    print(f"Snapshot de {source_path.name} guardado en {time.time() - start:.2f} segundos")
+
+
+def cargar_snapshot(source_path, meta=None):
+    """
+    Carga el snapshot columnar de un archivo fuente si sigue vigente.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        meta: Metadatos de un snapshot concreto (de leer_metadatos); si se
+            indican se carga ese snapshot aunque el archivo haya cambiado
+
+    Returns:
+        DataFrame con los datos, o None si no hay un snapshot válido
+    """
+    if not Path(source_path).exists():
+        return None
+
+    meta = meta or snapshot_vigente(source_path)
+    if meta is None:
+        return None
+
+    start = time.time()
+    directorio = get_snapshot_dir(source_path) / meta["directorio"]
+
+    try:
+        df = leer_tabla(directorio, meta["columnas"])
+    except (OSError, ValueError) as e:
+        print(f"Error al leer el snapshot de {Path(source_path).name}: {str(e)}")
+        return None
+
+    print(f"Snapshot de {Path(source_path).name} cargado en {time.time() - start:.2f} segundos")
+    return df
+
+
+def guardar_derivado(source_path, nombre, df, snapshot_dir=None, version=SNAPSHOT_VERSION):
+    """
+    Guarda una tabla derivada de los datos (agregados, cubo) dentro del
+    snapshot vigente del archivo fuente, para no recalcularla en cada carga.
+    La tabla queda ligada a esa versión del archivo: cuando el snapshot se
+    reemplaza, sus derivadas se eliminan con él.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        nombre: Nombre de la tabla derivada
+        df: DataFrame a guardar
+        snapshot_dir: Directorio de snapshots (por defecto get_snapshot_dir)
+        version: Versión de formato del snapshot
+
+    Returns:
+        True si se guardó, False si no hay un snapshot vigente
+    """
+    meta = snapshot_vigente(source_path, snapshot_dir, version)
+    if meta is None:
+        return False
+
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else get_snapshot_dir(source_path)
+    base = snapshot_dir / meta["directorio"]
+    tmp_dir = base / f"{nombre}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    # La descripción de las columnas va dentro del directorio: no hay que tocar los metadatos
+    with open(tmp_dir / "columnas.json", "w", encoding="utf-8") as f:
+        json.dump(escribir_tabla(df, tmp_dir), f, ensure_ascii=False)
+
+    try:
+        os.rename(tmp_dir, base / nombre)
+    except OSError:
+        # Otro proceso ya la guardó
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return True
+
+
+def cargar_derivado(source_path, nombre, snapshot_dir=None, version=SNAPSHOT_VERSION, meta=None):
+    """
+    Carga una tabla derivada guardada con guardar_derivado.
+
+    Args:
+        source_path: Ruta del archivo de texto original
+        nombre: Nombre de la tabla derivada
+        snapshot_dir: Directorio de snapshots (por defecto get_snapshot_dir)
+        version: Versión de formato del snapshot
+        meta: Metadatos de un snapshot concreto (de leer_metadatos); por
+            defecto el snapshot vigente
+
+    Returns:
+        DataFrame, o None si la tabla no existe
+    """
+    meta = meta or snapshot_vigente(source_path, snapshot_dir, version)
+    if meta is None:
+        return None
+
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir else get_snapshot_dir(source_path)
+    directorio = snapshot_dir / meta["directorio"] / nombre
+    try:
+        with open(directorio / "columnas.json", "r", encoding="utf-8") as f:
+            columnas = json.load(f)
+        return leer_tabla(directorio, columnas)
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error al leer la tabla derivada {nombre}: {str(e)}")
+        return None
@@ -0,0 +1,290 @@
+"""
+Versiones del conjunto de datos y recarga en caliente.
+
+Cada versión se identifica por la firma de los archivos de datos (ver
+data_loader.version_en_disco). Las funciones de carga decoradas con
+por_version guardan su resultado por versión, de modo que en memoria pueden
+convivir la versión activa y la anterior.
+
+Cada petición fija al empezar la versión activa (fijar_version) y todas las
+cargas y claves de caché que hace usan esa versión hasta que termina, aunque
+mientras tanto se active otra. Un hilo de vigilancia revisa periódicamente la
+firma de los archivos; cuando cambia, carga la nueva versión en segundo plano
+(con la nueva versión fijada en ese hilo) y solo al terminar la activa. La
+versión anterior se descarta cuando ya no la usa ninguna petición: se borran
+sus datos y, mediante las funciones registradas con al_descartar, las
+entradas de caché marcadas con ella.
+"""
+import os
+import time
+import threading
+import functools
+import contextvars
+from collections import Counter, OrderedDict
+
+
+# Segundos entre revisiones de los archivos de datos (0 desactiva la recarga automática)
+INTERVALO_RECARGA = float(os.environ.get("DATOS_INTERVALO_RECARGA", 30))
+
+# Número máximo de versiones con datos cargados en memoria
+VERSIONES_EN_MEMORIA = int(os.environ.get("DATOS_VERSIONES_EN_MEMORIA", 2))
+
+_lock = threading.RLock()
+_version = contextvars.ContextVar("version_datos", default=None)
+_en_uso = Counter()
+_cargas = OrderedDict()       # {versión: {(función, argumentos): resultado}}
+_al_descartar = []
+_calcular = None
+_hilo = None
+_estado = {
+    "activa": None,
+    "cargando": None,
+    "ultima_recarga": None,
+    "error": None
+}
+
+
+def configurar_version(calcular):
+    """
+    Registra la función que calcula la versión de los archivos en disco.
+
+    Args:
+        calcular: Función sin argumentos que devuelve el identificador de versión
+    """
+    global _calcular
+    _calcular = calcular
+
+
+def get_version_activa():
+    """
+    Obtiene la versión activa. La primera vez es la de los archivos en disco.
+
+    Returns:
+        Identificador de la versión activa
+    """
+    with _lock:
+        if _estado["activa"] is None and _calcular is not None:
+            _estado["activa"] = _calcular()
+        return _estado["activa"]
+
+
+def version_actual():
+    """
+    Obtiene la versión de datos del contexto actual: la fijada por la
+    petición o el hilo en curso o, si no hay ninguna, la activa.
+
+    Returns:
+        Identificador de versión
+    """
+    return _version.get() or get_version_activa()
+
+
+def fijar_version(version=None):
+    """
+    Fija la versión de datos del contexto actual (la activa por defecto).
+
+    Args:
+        version: Versión a fijar
+
+    Returns:
+        Token para liberar_version
+    """
+    version = version or get_version_activa()
+    with _lock:
+        _en_uso[version] += 1
+    return version, _version.set(version)
+
+
+def liberar_version(token):
+    """
+    Libera la versión fijada con fijar_version. Si la versión ya no está
+    activa y ninguna otra petición la usa, se descarta.
+
+    Args:
+        token: Token devuelto por fijar_version
+    """
+    version, token_contexto = token
+    _version.reset(token_contexto)
+    with _lock:
+        _en_uso[version] -= 1
+        descartar = _en_uso[version] <= 0 and version not in (get_version_activa(), _estado["cargando"])
+        if _en_uso[version] <= 0:
+            del _en_uso[version]
+    if descartar:
+        descartar_version(version)
+
+
+def por_version(funcion):
+    """
+    Decorador para funciones de carga: guarda el resultado por versión de
+    datos (reemplaza a lru_cache). Como máximo se conservan
+    VERSIONES_EN_MEMORIA versiones; cargar una más descarta la menos usada.
+
+    Args:
+        funcion: Función de carga (argumentos hashables, posicionales o por nombre)
+
+    Returns:
+        Función decorada
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        version = version_actual()
+        clave = (funcion.__qualname__, args, tuple(sorted(kwargs.items())))
+        with _lock:
+            cargas = _cargas.get(version)
+            if cargas is not None and clave in cargas:
+                _cargas.move_to_end(version)
+                return cargas[clave]
+
+        resultado = funcion(*args, **kwargs)
+
+        with _lock:
+            _cargas.setdefault(version, {})[clave] = resultado
+            _cargas.move_to_end(version)
+            protegidas = (version, _estado["activa"], _estado["cargando"])
+            sobrantes = [v for v in _cargas if v not in protegidas][:max(0, len(_cargas) - VERSIONES_EN_MEMORIA)]
+        for anterior in sobrantes:
+            descartar_version(anterior)
+        return resultado
+
+    def cache_clear():
+        with _lock:
+            for cargas in _cargas.values():
+                for clave in [c for c in cargas if c[0] == funcion.__qualname__]:
+                    del cargas[clave]
+
+    envoltura.cache_clear = cache_clear
+    return envoltura
+
+
+def al_descartar(funcion):
+    """
+    Registra una función que se llama con la versión descartada, para borrar
+    las entradas de caché marcadas con ella. Se puede usar como decorador.
+
+    Args:
+        funcion: Función que recibe el identificador de versión
+
+    Returns:
+        La misma función
+    """
+    _al_descartar.append(funcion)
+    return funcion
+
+
+def descartar_version(version):
+    """
+    Libera los datos cargados de una versión e invalida sus entradas de caché.
+
+    Args:
+        version: Identificador de la versión
+    """
+    with _lock:
+        _cargas.pop(version, None)
+    for funcion in _al_descartar:
+        try:
+            funcion(version)
+        except Exception as e:
+            print(f"Error al invalidar la caché de la versión {version}: {str(e)}")
+    print(f"Versión de datos {version} descartada")
+
+
+def recargar(cargar):
+    """
+    Carga la versión de los archivos en disco si es distinta de la activa y,
+    al terminar, la activa. Mientras carga, las peticiones siguen usando la
+    versión activa.
+
+    Args:
+        cargar: Función sin argumentos que carga los datos (y, si se quiere,
+            precalcula resultados) de la versión fijada en el hilo
+
+    Returns:
+        True si se activó una versión nueva
+    """
+    nueva = _calcular()
+    with _lock:
+        anterior = _estado["activa"]
+        if nueva == anterior or nueva == _estado["cargando"]:
+            return False
+        _estado["cargando"] = nueva
+
+    print(f"Cargando versión de datos {nueva} (activa: {anterior})")
+    start = time.time()
+    token = fijar_version(nueva)
+    try:
+        cargar()
+        # Si los archivos cambiaron durante la carga, se reintentará en la siguiente revisión
+        if _calcular() != nueva:
+            raise RuntimeError("los archivos de datos cambiaron durante la carga")
+    except Exception as e:
+        print(f"Error al cargar la versión de datos {nueva}: {str(e)}")
+        with _lock:
+            _estado.update(cargando=None, error=str(e))
+        # Al liberarla, la versión a medio cargar se descarta
+        liberar_version(token)
+        return False
+
+    with _lock:
+        _estado.update(activa=nueva, cargando=None, ultima_recarga=time.time(), error=None)
+        descartar = anterior is not None and _en_uso[anterior] <= 0
+    liberar_version(token)
+
+    print(f"Versión de datos {nueva} activa en {time.time() - start:.2f} segundos")
+    if descartar:
+        descartar_version(anterior)
+    return True
+
+
+def iniciar_vigilancia(cargar, intervalo=INTERVALO_RECARGA):
+    """
+    Inicia (una sola vez por proceso) el hilo que revisa los archivos de datos
+    cada `intervalo` segundos y recarga cuando cambian.
+
+    Args:
+        cargar: Función de carga (ver recargar)
+        intervalo: Segundos entre revisiones; 0 no inicia el hilo
+
+    Returns:
+        Hilo de vigilancia, o None si no se inició
+    """
+    global _hilo
+    if intervalo <= 0:
+        return None
+
+    def vigilar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                recargar(cargar)
+            except Exception as e:
+                print(f"Error al revisar los archivos de datos: {str(e)}")
+
+    with _lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=vigilar, name="vigilancia-datos", daemon=True)
+            _hilo.start()
+        return _hilo
+
+
+def get_estado_versiones():
+    """
+    Obtiene el estado de las versiones de datos.
+
+    Returns:
+        Diccionario con la versión activa, la que se está cargando, la hora de
+        la última recarga, el último error, las versiones en memoria y el
+        número de peticiones en curso por versión
+    """
+    with _lock:
+        return dict(_estado, en_memoria=list(_cargas), en_uso=dict(_en_uso))
+
+
+def _despues_de_fork():
+    """En el proceso hijo el hilo de vigilancia del padre no existe."""
+    global _hilo, _lock
+    _lock = threading.RLock()
+    _hilo = None
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
@@ -0,0 +1,81 @@
+"""
+Configuración de gunicorn en modo "precargar y bifurcar".
+
+    gunicorn -c gunicorn.conf.py app:server
+
+El proceso maestro importa la aplicación (preload_app), carga los siniestros,
+expuestos, cubo, tablas acumuladas e índices y, si PRECARGA no es "0",
+precalcula las combinaciones por defecto. Recién entonces crea los workers
+con fork: todos heredan las mismas páginas de memoria (copy-on-write) en vez
+de cargar cada uno su propia copia de los datos.
+
+Los datos son arrays de NumPy que nadie modifica después de cargarlos, así
+que las páginas siguen compartidas mientras el servicio está en marcha.
+gc.freeze() evita que el recolector de basura toque los objetos heredados y
+fuerce su copia. Ver utils/memoria.py y la ruta /memoria para medir el uso
+de memoria de cada worker.
+
+Cada worker revisa por su cuenta los archivos de datos y carga las versiones
+nuevas (ver data/versiones.py); los datos recargados ya no se comparten con
+los demás workers hasta el siguiente reinicio, salvo las páginas del almacén
+columnar, que comparte el sistema operativo.
+
+Los resultados y la caché de memoización se comparten entre workers en
+disco (RESULTADOS_BACKEND=archivos y CACHE_TYPE=FileSystemCache) salvo que
+se configure otro backend compartido, como redis.
+"""
+import os
+import gc
+import time
+
+# La precarga la hace este proceso maestro, no un hilo de cada worker (ver app.py)
+os.environ.setdefault("PRECARGA_MODO", "maestro")
+
+# Con varios workers cada callback puede atenderlo un worker distinto del que
+# produjo el resultado: las claves de memoización y los resultados deben estar
+# en un almacén compartido (se fijan antes de que el maestro importe app.py)
+os.environ.setdefault("CACHE_TYPE", "FileSystemCache")
+os.environ.setdefault("RESULTADOS_BACKEND", "archivos")
+
+bind = os.environ.get("GUNICORN_BIND", ":8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = True
+
+if workers > 1 and (os.environ["RESULTADOS_BACKEND"] == "memoria" or os.environ["CACHE_TYPE"] == "SimpleCache"):
+    raise RuntimeError("Con varios workers RESULTADOS_BACKEND y CACHE_TYPE deben ser compartidos "
+                       "(archivos/FileSystemCache o redis/RedisCache)")
+
+
+def when_ready(server):
+    """Carga los datos (y precalcula) en el maestro antes de crear los workers."""
+    from app import calculos, server as flask_server
+    from preload import cargar_datos_base, precargar_datos_comunes
+    from data.ejecucion import cerrar_executor
+    from utils.memoria import uso_memoria
+
+    start = time.time()
+    if os.environ.get("PRECARGA", "1") != "0":
+        precargar_datos_comunes(calculos, flask_server)
+    else:
+        cargar_datos_base()
+
+    # Los workers no pueden usar el pool de procesos del maestro
+    cerrar_executor()
+
+    # Mover los objetos existentes a la generación permanente del recolector
+    gc.collect()
+    gc.freeze()
+
+    server.log.info("Datos cargados en el maestro en %.2f segundos: %s",
+                    time.time() - start, uso_memoria())
+
+
+def post_worker_init(worker):
+    """Registra la memoria de cada worker al iniciar e inicia la recarga en caliente."""
+    from app import recargar_datos
+    from data.versiones import iniciar_vigilancia
+    from utils.memoria import uso_memoria
+    iniciar_vigilancia(recargar_datos)
+    worker.log.info("Worker iniciado: %s", uso_memoria())
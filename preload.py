@@ -1,97 +1,206 @@
 """
 Módulo para precarga y caching de datos frecuentemente utilizados.
-Este script se ejecuta al iniciar la aplicación.
+Se ejecuta al iniciar la aplicación (ver app.py).
+
+La precarga llama a las mismas funciones memoizadas que usan los callbacks,
+con los valores por defecto de los filtros, de modo que los resultados quedan
+guardados exactamente bajo las claves que leerán los callbacks.
 """
-import time
 import os
+import time
 import threading
-from data.data_loader import load_siniestros, load_expuestos
-from data.data_processor import procesar_siniestros, asignar_periodos, calcular_tiempo_desarrollo
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from data.data_loader import (load_siniestros, load_expuestos, load_cubo, load_tablas_acumuladas,
+                              get_indice_siniestros, get_combinaciones_dimensiones, get_version_datos,
+                              get_date_range)
+from data.versiones import fijar_version, liberar_version
+
+
+# Combinaciones que se precalculan
+PERIODICIDADES = ["mes", "trimestre", "año"]
+TIPOS_TRIANGULO = ["plata", "severidad", "frecuencia"]
+TIPOS_VALOR = ["Bruto", "Retenido"]
+
+# Método de cálculo por defecto de la pestaña de triángulos
+METODO_DEFECTO = "auto"
 
+# Número máximo de hilos de precarga
+PRECARGA_WORKERS = int(os.environ.get("PRECARGA_WORKERS", 2))
 
-def precargar_datos_comunes(cache):
+_lock = threading.Lock()
+_estado = {
+    "estado": "pendiente",   # pendiente, en_curso, lista, error
+    "total": 0,
+    "completadas": 0,
+    "errores": 0,
+    "inicio": None,
+    "fin": None
+}
+
+
+def get_estado_precarga():
+    """
+    Obtiene el estado actual de la precarga.
+
+    Returns:
+        Diccionario con estado, total de tareas, completadas, errores y tiempos
     """
-    Precarga los datos más utilizados en la caché para acelerar la primera carga.
-    
+    with _lock:
+        return dict(_estado)
+
+
+def _actualizar_estado(**cambios):
+    """Actualiza el estado de la precarga de forma segura entre hilos."""
+    with _lock:
+        _estado.update(cambios)
+
+
+def cargar_datos_base():
+    """
+    Carga los datos y estructuras derivadas que comparten todos los cálculos
+    (siniestros, expuestos, cubo, tablas acumuladas e índices). Todas quedan
+    guardadas para la versión de datos actual, así que llamarla en el proceso
+    maestro de gunicorn antes de crear los workers hace que estos las hereden
+    sin volver a cargarlas.
+
+    Returns:
+        Tupla (fecha_inicio, fecha_fin) con el rango de fechas de los datos
+    """
+    get_version_datos()
+    load_siniestros()
+    load_expuestos()
+    load_cubo()
+    load_tablas_acumuladas()
+    get_indice_siniestros()
+    get_combinaciones_dimensiones()
+    return get_date_range()
+
+
+def _ejecutar(server, version, funcion, *args):
+    """
+    Ejecuta una función dentro del contexto de la aplicación Flask (necesario
+    para la caché) con la versión de datos de la precarga fijada, ya que los
+    hilos del pool no heredan la del hilo que los crea.
+    """
+    token = fijar_version(version)
+    try:
+        if server is None:
+            return funcion(*args)
+        with server.app_context():
+            return funcion(*args)
+    finally:
+        liberar_version(token)
+
+
+def _precargar_combinacion(calculos, periodicidad, tipo_triangulo, tipo_valor, fecha_inicio, fecha_fin):
+    """
+    Precalcula la cadena de resultados de una combinación con los filtros por
+    defecto: datos procesados, filtrados, resumen (métricas, gráficos y tabla de
+    ocurrencia), triángulo, factores y siniestralidad última.
+    """
+    calculos["procesar"](periodicidad, tipo_triangulo, tipo_valor)
+
+    filtrado = calculos["filtrar"](periodicidad, tipo_triangulo, tipo_valor, "", "", "", fecha_inicio, fecha_fin)
+    if filtrado:
+        calculos["resumen"](filtrado, tipo_valor)
+
+    triangulo = calculos["triangulo"](periodicidad, tipo_valor, tipo_triangulo, "", "", "", fecha_inicio, fecha_fin)
+    if not triangulo:
+        return
+
+    factores = calculos["factores"](triangulo)
+    expuestos = calculos["expuestos"](periodicidad, "", "", "")
+    if factores and expuestos:
+        calculos["ultima"](triangulo, factores, expuestos, METODO_DEFECTO, periodicidad, tipo_triangulo)
+
+
+def precargar_datos_comunes(calculos, server=None, max_workers=PRECARGA_WORKERS):
+    """
+    Precarga en la caché todas las combinaciones de periodicidad, tipo de
+    triángulo y tipo de valor (más los expuestos de cada periodicidad) con
+    los filtros por defecto.
+
     Args:
-        cache: Objeto de caché de Flask
+        calculos: Diccionario de funciones memoizadas devuelto por los
+            registros de callbacks
+        server: Aplicación Flask cuyo contexto usa la caché
+        max_workers: Número máximo de hilos de precarga
     """
     print("Iniciando precarga de datos comunes...")
     start_time = time.time()
-    
-    # Crear directorio de caché si no existe
-    if not os.path.exists("cache-directory"):
-        os.makedirs("cache-directory")
-        print("Directorio de caché creado.")
-    
-    # Cargar siniestros (este resultado será cacheado)
+
+    combinaciones = list(product(PERIODICIDADES, TIPOS_TRIANGULO, TIPOS_VALOR))
+    _actualizar_estado(estado="en_curso", total=len(combinaciones) + len(PERIODICIDADES),
+                       completadas=0, errores=0, inicio=start_time, fin=None)
+
     try:
-        siniestros = load_siniestros()
-        print(f"Datos de siniestros cargados: {len(siniestros)} filas")
-        
-        # Procesar siniestros para las combinaciones más comunes
-        # Estas serán las más usadas por los usuarios
-        periodicidades = ["mes", "trimestre"]
-        tipos_triangulo = ["plata", "severidad"]
-        tipos_valor = ["Bruto", "Retenido"]
-        
-        for periodicidad in periodicidades:
-            for tipo_triangulo in tipos_triangulo:
-                for tipo_valor in tipos_valor:
-                    # Clave para la caché
-                    cache_key = f"precarga_{periodicidad}_{tipo_triangulo}_{tipo_valor}"
-                    
-                    # Procesar datos
-                    try:
-                        print(f"Procesando datos para {cache_key}...")
-                        processed_data = procesar_siniestros(
-                            siniestros, 
-                            periodicidad, 
-                            tipo_triangulo,
-                            tipo_valor
-                        )
-                        
-                        # Guardar en caché
-                        cache.set(cache_key, processed_data.to_dict('records'))
-                        print(f"Datos procesados y cacheados para {cache_key}: {len(processed_data)} filas")
-                    except Exception as e:
-                        print(f"Error al procesar datos para {cache_key}: {str(e)}")
-        
+        # Cargas base (una sola vez, antes de repartir el trabajo)
+        version = get_version_datos()
+        fecha_inicio, fecha_fin = cargar_datos_base()
     except Exception as e:
-        print(f"Error en precarga de siniestros: {str(e)}")
-    
-    # Cargar expuestos (este resultado será cacheado)
-    try:
-        expuestos = load_expuestos()
-        print(f"Datos de expuestos cargados: {len(expuestos)} filas")
-        
-        # Procesar expuestos para periodicidades comunes
-        from data.data_processor import procesar_expuestos
-        for periodicidad in periodicidades:
-            # Clave para la caché
-            cache_key = f"expuestos_{periodicidad}"
-            
+        print(f"Error en precarga de datos base: {str(e)}")
+        _actualizar_estado(estado="error", fin=time.time())
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precarga") as executor:
+        tareas = {}
+        for periodicidad in PERIODICIDADES:
+            futuro = executor.submit(_ejecutar, server, version, calculos["expuestos"], periodicidad, "", "", "")
+            tareas[futuro] = f"expuestos_{periodicidad}"
+        for periodicidad, tipo_triangulo, tipo_valor in combinaciones:
+            futuro = executor.submit(_ejecutar, server, version, _precargar_combinacion, calculos,
+                                     periodicidad, tipo_triangulo, tipo_valor, fecha_inicio, fecha_fin)
+            tareas[futuro] = f"{periodicidad}_{tipo_triangulo}_{tipo_valor}"
+
+        for futuro in as_completed(tareas):
             try:
-                expuestos_procesados = procesar_expuestos(expuestos, periodicidad)
-                cache.set(cache_key, expuestos_procesados.to_dict('records'))
-                print(f"Expuestos procesados y cacheados para {cache_key}: {len(expuestos_procesados)} filas")
+                futuro.result()
+                with _lock:
+                    _estado["completadas"] += 1
             except Exception as e:
-                print(f"Error al procesar expuestos para {cache_key}: {str(e)}")
-    
-    except Exception as e:
-        print(f"Error en precarga de expuestos: {str(e)}")
-    
+                print(f"Error al precargar {tareas[futuro]}: {str(e)}")
+                with _lock:
+                    _estado["errores"] += 1
+
     elapsed = time.time() - start_time
-    print(f"Precarga de datos completada en {elapsed:.2f} segundos")
+    _actualizar_estado(estado="lista", fin=time.time())
+    estado = get_estado_precarga()
+    print(f"Precarga de datos completada en {elapsed:.2f} segundos "
+          f"({estado['completadas']} tareas, {estado['errores']} errores)")
+
+
+def cargar_version(calculos=None, server=None):
+    """
+    Carga una versión nueva de los datos para la recarga en caliente (ver
+    data.versiones.recargar): los datos base y, si se indican los cálculos,
+    la precarga de resultados, de modo que la versión se activa ya caliente.
+
+    Args:
+        calculos: Diccionario de funciones memoizadas, o None para cargar solo los datos base
+        server: Aplicación Flask cuyo contexto usa la caché
+    """
+    # A diferencia de la precarga, un error en los datos base debe impedir activar la versión
+    cargar_datos_base()
+    if calculos is not None:
+        precargar_datos_comunes(calculos, server)
 
 
-def iniciar_precarga(cache):
+def iniciar_precarga(calculos, server=None, max_workers=PRECARGA_WORKERS):
     """
     Inicia la precarga de datos en un hilo separado para no bloquear el inicio de la aplicación.
-    
+
     Args:
-        cache: Objeto de caché de Flask
+        calculos: Diccionario de funciones memoizadas devuelto por los
+            registros de callbacks
+        server: Aplicación Flask cuyo contexto usa la caché
+        max_workers: Número máximo de hilos de precarga
+
+    Returns:
+        Hilo de la precarga
     """
-    thread = threading.Thread(target=precargar_datos_comunes, args=(cache,))
+    thread = threading.Thread(target=precargar_datos_comunes, args=(calculos, server, max_workers), name="precarga")
     thread.daemon = True  # El hilo se cerrará cuando termine la aplicación
-    thread.start()
\ No newline at end of file
+    thread.start()
+    return thread
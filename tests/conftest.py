@@ -0,0 +1,107 @@
+"""
+Configuración común de las pruebas.
+
+Los archivos de tests/datos son extractos pequeños y las salidas del código
+original calculadas sobre ellos, que fijan los resultados que las versiones
+optimizadas deben reproducir.
+"""
+import sys
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# Permitir importar los paquetes de la aplicación (data, callbacks...) desde las pruebas
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+DATOS_PRUEBA = Path(__file__).resolve().parent / "datos"
+
+
+def cargar_esperado(nombre):
+    """Carga un archivo JSON de resultados esperados de tests/datos."""
+    with open(DATOS_PRUEBA / nombre, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def leer_muestra(path=DATOS_PRUEBA / "siniestros_muestra.txt"):
+    """Lee un extracto de siniestros igual que data_loader.load_siniestros."""
+    from data.data_loader import get_opciones_lectura_siniestros, ordenar_por_fecha
+    from data.dimensiones import codificar_dimensiones
+
+    df = pd.read_csv(path, low_memory=False, **get_opciones_lectura_siniestros())
+    return ordenar_por_fecha(codificar_dimensiones(df))
+
+
+def escribir_siniestros(path, df):
+    """Escribe un extracto de siniestros con el formato de siniestros.txt."""
+    df.to_csv(path, sep="\t", index=False, date_format="%Y-%m-%d")
+    return path
+
+
+def etiquetas(df):
+    """
+    Convierte una tabla de siniestros a una forma comparable: dimensiones
+    como texto (las categorías dependen del diccionario global), columnas en
+    orden fijo y filas ordenadas por todas las columnas.
+    """
+    df = df.reset_index(drop=True)
+    categoricas = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    df = df.assign(**{col: df[col].astype(object) for col in categoricas})
+    df = df[sorted(df.columns)]
+    return df.sort_values(list(df.columns), kind="stable").reset_index(drop=True)
+
+
+@pytest.fixture
+def siniestros_muestra():
+    """Siniestros del extracto de muestra (72 filas, 2020-2021, fechas de siniestro únicas)."""
+    return leer_muestra()
+
+
+@pytest.fixture
+def directorio_datos(tmp_path, monkeypatch):
+    """Directorio de datos temporal para data_loader (vacío al empezar)."""
+    from data import data_loader
+
+    monkeypatch.setattr(data_loader, "get_data_path", lambda: tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fijar_version():
+    """
+    Fija versiones de datos durante la prueba (por defecto la de los
+    archivos en disco) y las libera al terminar, de modo que las cargas
+    guardadas por versión no se mezclan entre pruebas.
+    """
+    from data import data_loader, versiones
+
+    tokens = []
+
+    def fijar(version=None):
+        tokens.append(versiones.fijar_version(version or data_loader.version_en_disco()))
+        return tokens[-1][0]
+
+    yield fijar
+    for token in reversed(tokens):
+        versiones.liberar_version(token)
+
+
+@pytest.fixture
+def lecturas_texto(monkeypatch):
+    """
+    Registra los archivos que se parsean con pd.read_csv durante la prueba
+    (para distinguir una carga desde el texto de una desde un almacén).
+    """
+    lecturas = []
+    read_csv = pd.read_csv
+
+    def registrar(archivo, *args, **kwargs):
+        nombre = archivo if isinstance(archivo, (str, Path)) else getattr(archivo, "name", "")
+        lecturas.append(Path(nombre).name)
+        return read_csv(archivo, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", registrar)
+    return lecturas
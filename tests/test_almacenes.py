@@ -0,0 +1,96 @@
+"""
+Reutilización y reconstrucción de los almacenes binarios de siniestros
+(almacén columnar y snapshot) según cambie o no el archivo de texto.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import DATOS_PRUEBA, etiquetas, leer_muestra
+from data import data_loader
+from data.columnas import metadatos_columnas
+from data.snapshot import leer_metadatos
+
+
+MUESTRA = DATOS_PRUEBA / "siniestros_muestra.txt"
+
+
+@pytest.fixture(params=["columnas", "snapshot"])
+def siniestros_txt(request, directorio_datos, monkeypatch):
+    """siniestros.txt con el extracto de muestra, con cada tipo de almacén."""
+    monkeypatch.setattr(data_loader, "ALMACEN_SINIESTROS", request.param)
+    path = directorio_datos / "siniestros.txt"
+    shutil.copy(MUESTRA, path)
+    os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    return path
+
+
+def metadatos_almacen(path):
+    if data_loader.ALMACEN_SINIESTROS == "columnas":
+        return metadatos_columnas(path)
+    return leer_metadatos(path)
+
+
+def cargar(fijar_version, version):
+    """Carga los siniestros con una versión nueva (como un proceso recién iniciado)."""
+    fijar_version(version)
+    return data_loader.load_siniestros()
+
+
+def test_almacen_se_reutiliza_si_el_archivo_no_cambia(siniestros_txt, fijar_version, lecturas_texto):
+    primera = cargar(fijar_version, "inicial")
+    assert lecturas_texto == ["siniestros.txt"]
+    meta = metadatos_almacen(siniestros_txt)
+    assert meta is not None
+
+    segunda = cargar(fijar_version, "reinicio")
+    assert lecturas_texto == ["siniestros.txt"]
+    assert metadatos_almacen(siniestros_txt)["directorio"] == meta["directorio"]
+    pd.testing.assert_frame_equal(etiquetas(segunda), etiquetas(primera))
+    pd.testing.assert_frame_equal(etiquetas(segunda), etiquetas(leer_muestra(siniestros_txt)))
+
+
+def test_almacen_se_reutiliza_si_solo_cambia_la_fecha(siniestros_txt, fijar_version, lecturas_texto):
+    cargar(fijar_version, "inicial")
+    meta = metadatos_almacen(siniestros_txt)
+
+    # Archivo copiado o tocado sin cambios: se compara el hash y se actualiza la firma
+    os.utime(siniestros_txt, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    cargar(fijar_version, "tocado")
+
+    assert lecturas_texto == ["siniestros.txt"]
+    actual = metadatos_almacen(siniestros_txt)
+    assert actual["directorio"] == meta["directorio"]
+    assert actual["firma"]["mtime_ns"] == os.stat(siniestros_txt).st_mtime_ns
+
+
+@pytest.mark.parametrize("cambio", ["mismo_tamano", "otro_tamano"])
+def test_almacen_se_reconstruye_si_el_archivo_cambia(siniestros_txt, fijar_version, lecturas_texto, cambio):
+    cargar(fijar_version, "inicial")
+    meta = metadatos_almacen(siniestros_txt)
+
+    texto = siniestros_txt.read_text(encoding="utf-8")
+    if cambio == "mismo_tamano":
+        # Un pago modificado sin cambiar el tamaño (la fecha de modificación cambia en 1 ns)
+        texto = texto.replace("\t14000\t3500\t", "\t15000\t3500\t", 1)
+    else:
+        # Filas borradas: el archivo se acorta
+        texto = "".join(texto.splitlines(keepends=True)[:-5])
+    siniestros_txt.write_text(texto, encoding="utf-8")
+    if cambio == "mismo_tamano":
+        os.utime(siniestros_txt, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_001))
+
+    df = cargar(fijar_version, "modificado")
+
+    assert lecturas_texto == ["siniestros.txt", "siniestros.txt"]
+    assert metadatos_almacen(siniestros_txt)["directorio"] != meta["directorio"]
+
+    # La carga siguiente ya usa el almacén nuevo
+    reinicio = cargar(fijar_version, "reinicio")
+    assert lecturas_texto == ["siniestros.txt", "siniestros.txt"]
+
+    esperado = etiquetas(leer_muestra(siniestros_txt))
+    pd.testing.assert_frame_equal(etiquetas(df), esperado)
+    pd.testing.assert_frame_equal(etiquetas(reinicio), esperado)
@@ -0,0 +1,89 @@
+"""
+Archivos de datos comprimidos: siniestros.txt.gz, .bz2, .xz y .zst se cargan
+igual que el texto plano, también con la ingesta por bloques y desde el
+almacén guardado después de la primera carga.
+"""
+import bz2
+import gzip
+import lzma
+
+import pandas as pd
+import pytest
+
+from conftest import DATOS_PRUEBA, etiquetas
+from data import data_loader
+from data.compresion import compresion_de, buscar_archivo
+
+
+MUESTRA = DATOS_PRUEBA / "siniestros_muestra.txt"
+
+
+def comprimir_zstd(datos):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(datos)
+
+
+COMPRESORES = {
+    ".gz": gzip.compress,
+    ".bz2": bz2.compress,
+    ".xz": lzma.compress,
+    ".zst": comprimir_zstd
+}
+
+
+@pytest.fixture(params=list(COMPRESORES))
+def comprimido(request, directorio_datos):
+    """siniestros.txt de muestra comprimido con cada formato (sin la variante de texto plano)."""
+    extension = request.param
+    path = directorio_datos / f"siniestros.txt{extension}"
+    path.write_bytes(COMPRESORES[extension](MUESTRA.read_bytes()))
+    return path
+
+
+@pytest.fixture
+def plano(fijar_version, tmp_path_factory):
+    """Siniestros y agregados cargados desde el texto plano."""
+    directorio = tmp_path_factory.mktemp("plano")
+    (directorio / "siniestros.txt").write_bytes(MUESTRA.read_bytes())
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(data_loader, "get_data_path", lambda: directorio)
+        fijar_version()
+        return data_loader.load_siniestros(), data_loader.load_agregados_siniestros()
+
+
+@pytest.mark.parametrize("almacen", ["columnas", "snapshot"])
+def test_comprimido_igual_a_texto_plano(plano, comprimido, fijar_version, lecturas_texto, monkeypatch, almacen):
+    monkeypatch.setattr(data_loader, "ALMACEN_SINIESTROS", almacen)
+    siniestros, _ = plano
+    assert data_loader.get_archivo_datos("siniestros.txt") == comprimido
+
+    fijar_version()
+    df = data_loader.load_siniestros()
+    assert lecturas_texto == [comprimido.name]
+    pd.testing.assert_frame_equal(etiquetas(df), etiquetas(siniestros))
+
+    # La carga siguiente usa el almacén validado con el archivo comprimido
+    fijar_version("reinicio")
+    reinicio = data_loader.load_siniestros()
+    assert lecturas_texto == [comprimido.name]
+    pd.testing.assert_frame_equal(etiquetas(reinicio), etiquetas(siniestros))
+
+
+def test_comprimido_por_bloques(plano, comprimido, fijar_version, monkeypatch):
+    monkeypatch.setattr(data_loader, "MODO_INGESTA", "bloques")
+    _, agregados = plano
+
+    fijar_version()
+    resultado = data_loader.load_agregados_siniestros(chunksize=10)
+    pd.testing.assert_frame_equal(etiquetas(resultado), etiquetas(agregados), check_dtype=False)
+
+
+def test_buscar_archivo_prefiere_texto_plano(tmp_path):
+    for extension in (".xz", ".gz"):
+        (tmp_path / f"siniestros.txt{extension}").write_bytes(b"")
+    assert buscar_archivo(tmp_path, "siniestros.txt") == tmp_path / "siniestros.txt.gz"
+
+    (tmp_path / "siniestros.txt").write_bytes(b"")
+    assert buscar_archivo(tmp_path, "siniestros.txt") == tmp_path / "siniestros.txt"
+    assert compresion_de(tmp_path / "siniestros.txt") is None
+    assert compresion_de(tmp_path / "siniestros.txt.ZST") == "zstd"
@@ -0,0 +1,98 @@
+"""
+Paridad de los factores de desarrollo con el código original.
+
+factores_base.json guarda, para varios triángulos, la salida de la versión
+original de calcular_factores_desarrollo (bucles por período y por
+desarrollo): triángulos con denominadores cero y recobros, con huecos NaN
+dentro de la diagonal y un desarrollo sin factores, con valores muy
+pequeños y dos triángulos de triangulos_base.json.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import cargar_esperado
+from data.data_processor import calcular_factores_arrays, calcular_factores_desarrollo
+
+
+ESPERADOS = cargar_esperado("factores_base.json")
+
+# Triángulos de la misma forma, para calcularlos apilados
+APILABLES = ["regular", "ceros", "nan", "pequenos"]
+
+
+def array(valores):
+    return np.array(valores, dtype=np.float64)
+
+
+def comprobar(obtenido, esperado):
+    """Compara con el resultado original (las sumas pueden variar en el último bit)."""
+    np.testing.assert_allclose(obtenido, array(esperado), rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("nombre", list(ESPERADOS))
+def test_factores_desarrollo_reproduce_original(nombre):
+    esperado = ESPERADOS[nombre]
+    triangulo = pd.DataFrame(array(esperado["triangulo"]))
+
+    factores, estadisticas, promedio, acumulados = calcular_factores_desarrollo(triangulo)
+
+    comprobar(factores.values, esperado["factores"])
+    comprobar(promedio, esperado["promedio"])
+    comprobar(acumulados, esperado["acumulados"])
+    assert estadisticas["Estadistica"].tolist() == ["Factor Promedio", "Factor Acumulado", "Número de Datos",
+                                                    "Valor Mínimo", "Valor Máximo", "Desviación Estándar"]
+    comprobar(estadisticas.drop(columns="Estadistica").values.astype(np.float64), esperado["estadisticas"])
+
+
+def test_factores_arrays_apilados():
+    triangulos = np.stack([array(ESPERADOS[nombre]["triangulo"]) for nombre in APILABLES])
+
+    resultado = calcular_factores_arrays(triangulos)
+
+    for k, nombre in enumerate(APILABLES):
+        esperado = ESPERADOS[nombre]
+        estadisticas = array(esperado["estadisticas"])
+        comprobar(resultado["factores"][k], esperado["factores"])
+        comprobar(resultado["promedio"][k], esperado["promedio"])
+        comprobar(resultado["acumulados"][k], esperado["acumulados"])
+        np.testing.assert_array_equal(resultado["conteo"][k], estadisticas[2])
+        comprobar(resultado["minimo"][k], estadisticas[3])
+        comprobar(resultado["maximo"][k], estadisticas[4])
+        comprobar(resultado["desviacion"][k], estadisticas[5])
+
+    # Cada triángulo de la pila da lo mismo que calculado por separado
+    for k, nombre in enumerate(APILABLES):
+        individual = calcular_factores_arrays(triangulos[k])
+        for clave, valor in individual.items():
+            np.testing.assert_array_equal(resultado[clave][k], valor)
+
+
+def test_denominadores_cero_y_nan():
+    resultado = calcular_factores_arrays(array(ESPERADOS["ceros"]["triangulo"]))
+
+    # Sin valor actual positivo no hay factor individual, y un desarrollo
+    # sin denominador positivo tiene factor promedio 1
+    assert np.isnan(resultado["factores"][[1, 3], 0]).all()
+    assert np.isnan(resultado["factores"][:, 1]).all()
+    assert resultado["promedio"][1] == 1.0
+    assert resultado["conteo"][1] == 0
+    assert np.isnan(resultado["desviacion"][1])
+
+    resultado = calcular_factores_arrays(array(ESPERADOS["nan"]["triangulo"]))
+    assert resultado["conteo"].tolist() == [3, 2, 2, 0, 0]
+    assert resultado["promedio"][3] == 1.0 and resultado["promedio"][4] == 1.0
+
+
+def test_desviacion_valores_pequenos():
+    resultado = calcular_factores_arrays(array(ESPERADOS["pequenos"]["triangulo"]))
+
+    # Desviación poblacional (como np.std) y 0 con un único factor
+    factores = resultado["factores"]
+    for j in range(factores.shape[1]):
+        columna = factores[:, j][~np.isnan(factores[:, j])]
+        esperada = np.std(columna) if len(columna) > 1 else 0.0
+        np.testing.assert_allclose(resultado["desviacion"][j], esperada, rtol=1e-9, atol=1e-18)
+    assert resultado["conteo"][-1] == 1
+    assert resultado["desviacion"][-1] == 0.0
+    assert (resultado["desviacion"][:-1] > 0).all()
@@ -0,0 +1,98 @@
+"""
+Frecuencia y severidad por fecha de siniestro.
+
+La Frecuencia de una fila es el número de siniestros con su misma fecha de
+siniestro dentro del conjunto filtrado, y la Severidad es el pago dividido
+por esa frecuencia. En el código original la búsqueda del conteo fallaba y
+la Frecuencia era siempre 1; estas pruebas fijan el comportamiento actual y
+que la pestaña de datos y los triángulos lo calculan igual.
+"""
+import dash
+import numpy as np
+import pandas as pd
+import pytest
+from flask_caching import Cache
+
+from conftest import escribir_siniestros
+from data.data_processor import (procesar_siniestros, asignar_periodos, calcular_tiempo_desarrollo,
+                                 crear_triangulo_siniestralidad)
+from data.dimensiones import codificar_dimensiones
+from data.ejecucion import tarea_triangulo
+from data.resultados import obtener_resultado
+from callbacks.filter_callbacks import register_filter_callbacks
+
+
+EDUCATIVO = "096 - EDUCATIVO"
+VIDA = "083 - VIDA DE GRUPO"
+
+
+def siniestros_fechas_repetidas():
+    """Siniestros con varias fechas compartidas entre dos ramos (uno sin pago)."""
+    filas = [
+        ("2021-01-05", "2021-01-20", 100.0, 50.0, EDUCATIVO),
+        ("2021-01-05", "2021-03-02", 0.0, 0.0, EDUCATIVO),
+        ("2021-01-05", "2021-02-11", 300.0, 300.0, VIDA),
+        ("2021-01-06", "2021-01-30", 80.0, 40.0, EDUCATIVO),
+        ("2021-02-10", "2021-02-15", 600.0, 600.0, VIDA),
+        ("2021-02-10", "2021-04-01", 900.0, 450.0, VIDA),
+        ("2021-03-15", "2021-05-20", 120.0, 120.0, EDUCATIVO),
+        ("2021-03-15", "2021-03-28", 60.0, 30.0, EDUCATIVO),
+    ]
+    df = pd.DataFrame(filas, columns=["Fecha_Siniestro", "Fecha_Registro", "Pago_Bruto", "Pago_Retenido",
+                                      "Ramo_Desc"])
+    df["Fecha_Siniestro"] = pd.to_datetime(df["Fecha_Siniestro"])
+    df["Fecha_Registro"] = pd.to_datetime(df["Fecha_Registro"])
+    df["Pago_Bruto"] = df["Pago_Bruto"].astype(np.float32)
+    df["Pago_Retenido"] = df["Pago_Retenido"].astype(np.float32)
+    df["Apertura_Canal_Desc"] = "Resto"
+    df["Apertura_Amparo_Desc"] = "RESTO"
+    df["Agrupacion_Reservas"] = df["Ramo_Desc"].str[:3]
+    return df
+
+
+def test_frecuencia_cuenta_siniestros_por_fecha():
+    df = procesar_siniestros(codificar_dimensiones(siniestros_fechas_repetidas()), "mes", "plata", "Bruto")
+
+    # La fila sin pago se descarta, pero cuenta para la frecuencia de su fecha
+    assert df["Frecuencia"].tolist() == [3, 3, 1, 2, 2, 2, 2]
+    np.testing.assert_array_equal(df["Severidad_Bruta"].values, df["Pago_Bruto"].values / df["Frecuencia"].values)
+
+
+def test_frecuencia_es_del_segmento_filtrado():
+    df = procesar_siniestros(codificar_dimensiones(siniestros_fechas_repetidas()), "mes", "severidad", "Retenido",
+                             ramo=EDUCATIVO)
+
+    assert df["Fecha_Siniestro"].dt.strftime("%Y-%m-%d").tolist() == ["2021-01-05", "2021-01-06",
+                                                                      "2021-03-15", "2021-03-15"]
+    assert df["Frecuencia"].tolist() == [2, 1, 2, 2]
+    assert df["Valor"].tolist() == [25.0, 40.0, 60.0, 15.0]
+
+
+@pytest.fixture
+def funciones_filtro(directorio_datos, fijar_version):
+    """Funciones memoizadas de los callbacks de filtros sobre un archivo de siniestros temporal."""
+    escribir_siniestros(directorio_datos / "siniestros.txt", siniestros_fechas_repetidas())
+    fijar_version()
+
+    app = dash.Dash(__name__)
+    cache = Cache(app.server, config={"CACHE_TYPE": "SimpleCache"})
+    return register_filter_callbacks(app, cache)
+
+
+@pytest.mark.parametrize("tipo_triangulo", ["severidad", "frecuencia"])
+@pytest.mark.parametrize("ramo", [EDUCATIVO, VIDA, ""])
+def test_pestana_datos_coincide_con_triangulos(funciones_filtro, tipo_triangulo, ramo):
+    fechas = ("2021-01-01", "2021-12-31")
+    handle = funciones_filtro["filtrar"]("mes", tipo_triangulo, "Bruto", ramo, "", "", *fechas)
+    datos = obtener_resultado(handle)
+
+    # Triángulo armado con las filas de la pestaña de datos
+    df = calcular_tiempo_desarrollo(asignar_periodos(datos))
+    triangulo = crear_triangulo_siniestralidad(df, "mes", "Bruto", tipo_triangulo)
+
+    # Triángulo de la pestaña de triángulos (cubo de desarrollo)
+    periodos, desarrollos, valores = tarea_triangulo("mes", "Bruto", tipo_triangulo, ramo, "", "", *fechas)
+
+    assert list(triangulo.index.strftime("%Y-%m-%d")) == periodos
+    assert list(triangulo.columns) == desarrollos
+    np.testing.assert_allclose(triangulo.values.astype(np.float64), valores, rtol=1e-12)
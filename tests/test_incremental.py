@@ -0,0 +1,115 @@
+"""
+Ingesta incremental: un extracto que solo creció al final se carga leyendo
+únicamente las filas nuevas; cualquier otro cambio reconstruye todo.
+"""
+import pandas as pd
+import pytest
+
+from conftest import DATOS_PRUEBA, etiquetas, leer_muestra
+from data import data_loader
+from data.ingesta import agregar_bloque, codificar_agregados
+from data.cubo import construir_cubo
+
+
+FILAS_NUEVAS = 6
+
+
+@pytest.fixture(params=["columnas", "snapshot"])
+def extracto(request, directorio_datos, monkeypatch):
+    """
+    siniestros.txt con el extracto de muestra sin sus últimas filas, y las
+    líneas de esas filas para agregarlas después.
+    """
+    monkeypatch.setattr(data_loader, "ALMACEN_SINIESTROS", request.param)
+    lineas = (DATOS_PRUEBA / "siniestros_muestra.txt").read_text(encoding="utf-8").splitlines(keepends=True)
+    path = directorio_datos / "siniestros.txt"
+    path.write_text("".join(lineas[:-FILAS_NUEVAS]), encoding="utf-8")
+    return path, lineas[-FILAS_NUEVAS:]
+
+
+@pytest.fixture
+def anexos(monkeypatch):
+    """Número de filas leídas por cada lectura de anexo."""
+    filas = []
+    leer_anexo = data_loader.leer_anexo
+
+    def registrar(*args, **kwargs):
+        nuevas = leer_anexo(*args, **kwargs)
+        filas.append(len(nuevas))
+        return nuevas
+
+    monkeypatch.setattr(data_loader, "leer_anexo", registrar)
+    return filas
+
+
+def cargar_todo(fijar_version, version):
+    """Carga siniestros, agregados y cubo con una versión nueva de los datos."""
+    fijar_version(version)
+    return data_loader.load_siniestros(), data_loader.load_agregados_siniestros(), data_loader.load_cubo()
+
+
+def comprobar_completo(path, siniestros, agregados, cubo):
+    """Compara con las tablas calculadas desde cero con el archivo completo."""
+    completo = leer_muestra(path)
+    esperados = codificar_agregados(agregar_bloque(completo))
+    pd.testing.assert_frame_equal(etiquetas(siniestros), etiquetas(completo))
+    pd.testing.assert_frame_equal(etiquetas(agregados), etiquetas(esperados), check_dtype=False)
+    pd.testing.assert_frame_equal(etiquetas(cubo), etiquetas(construir_cubo(esperados)), check_dtype=False)
+
+
+def test_anexo_lee_solo_las_filas_nuevas(extracto, fijar_version, lecturas_texto, anexos):
+    path, nuevas = extracto
+    cargar_todo(fijar_version, "anterior")
+    assert lecturas_texto == ["siniestros.txt"]
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(nuevas)
+    tablas = cargar_todo(fijar_version, "anexo")
+
+    # Una sola lectura adicional (la cola), con las filas nuevas
+    assert anexos == [FILAS_NUEVAS]
+    assert len(lecturas_texto) == 2
+    comprobar_completo(path, *tablas)
+
+
+def test_prefijo_modificado_reconstruye(extracto, fijar_version, lecturas_texto, anexos):
+    path, nuevas = extracto
+    cargar_todo(fijar_version, "anterior")
+
+    # Filas agregadas al final, pero también un pago modificado al principio
+    texto = path.read_text(encoding="utf-8").replace("\t14000\t3500\t", "\t15000\t3500\t", 1)
+    path.write_text(texto + "".join(nuevas), encoding="utf-8")
+    tablas = cargar_todo(fijar_version, "reescrito")
+
+    assert anexos == []
+    assert lecturas_texto == ["siniestros.txt", "siniestros.txt"]
+    comprobar_completo(path, *tablas)
+
+
+def test_archivo_acortado_reconstruye(extracto, fijar_version, lecturas_texto, anexos):
+    path, _ = extracto
+    cargar_todo(fijar_version, "anterior")
+
+    lineas = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text("".join(lineas[:-3]), encoding="utf-8")
+    tablas = cargar_todo(fijar_version, "acortado")
+
+    assert anexos == []
+    assert lecturas_texto == ["siniestros.txt", "siniestros.txt"]
+    comprobar_completo(path, *tablas)
+
+
+def test_anexo_con_codigos_numericos(extracto, fijar_version, anexos):
+    path, nuevas = extracto
+    cargar_todo(fijar_version, "anterior")
+
+    # Todas las filas nuevas con una agrupación de solo dígitos ("096"): se
+    # leen como texto y no se registran como enteros en el diccionario
+    nuevas = [linea for linea in nuevas if linea.rstrip("\n").endswith("\t096")]
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(nuevas)
+    siniestros, agregados, cubo = cargar_todo(fijar_version, "anexo")
+
+    assert anexos == [len(nuevas)]
+    assert all(isinstance(valor, str) for valor in siniestros["Agrupacion_Reservas"].cat.categories)
+    comprobar_completo(path, siniestros, agregados, cubo)
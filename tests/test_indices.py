@@ -0,0 +1,134 @@
+"""
+Filtros resueltos con los índices de dimensiones (listas de filas por
+código) y con la búsqueda binaria de fechas: procesar_siniestros con indice
+y el recorte por fechas de la pestaña de datos dan lo mismo que las máscaras
+sobre las columnas.
+"""
+import shutil
+
+import dash
+import pandas as pd
+import pytest
+from flask_caching import Cache
+
+from conftest import DATOS_PRUEBA
+from data.data_processor import procesar_siniestros
+from data.indices import construir_indice, filas_segmento, rango_fechas, COLUMNA_FECHA
+from data.resultados import obtener_resultado
+from callbacks.filter_callbacks import register_filter_callbacks
+
+
+EDUCATIVO = "096 - EDUCATIVO"
+VIDA_GRUPO = "083 - VIDA DE GRUPO"
+TARJETA = "Tarjeta de Credito Bancolombia"
+
+
+@pytest.fixture
+def indice_muestra(siniestros_muestra):
+    return construir_indice(siniestros_muestra)
+
+
+def comprobar_igual_a_mascaras(siniestros, indice, **filtros):
+    """Procesa con y sin índice y compara; devuelve el resultado."""
+    esperado = procesar_siniestros(siniestros, "mes", "plata", "Bruto", **filtros)
+    resultado = procesar_siniestros(siniestros, "mes", "plata", "Bruto", indice=indice, **filtros)
+    pd.testing.assert_frame_equal(resultado, esperado)
+    return resultado
+
+
+@pytest.mark.parametrize("filtros", [
+    {"ramo": EDUCATIVO},
+    {"canal": TARJETA},
+    {"ramo": VIDA_GRUPO, "canal": TARJETA},
+    {"ramo": EDUCATIVO, "canal": "Resto", "amparo": "RESTO"},
+    {"agrupacion_reservas": "083_RESTO", "ramo": VIDA_GRUPO, "canal": "Resto"},
+    {"ramo": EDUCATIVO, "canal": "", "amparo": None},
+])
+def test_filtros_de_segmento_con_indice(siniestros_muestra, indice_muestra, filtros):
+    resultado = comprobar_igual_a_mascaras(siniestros_muestra, indice_muestra, **filtros)
+    assert 0 < len(resultado) < len(siniestros_muestra)
+
+
+@pytest.mark.parametrize("filtros", [
+    # Etiqueta que no está en el diccionario de dimensiones
+    {"ramo": "999 - INEXISTENTE"},
+    {"ramo": EDUCATIVO, "canal": "Canal inexistente"},
+    # Etiquetas existentes sin filas en común
+    {"agrupacion_reservas": "096", "ramo": VIDA_GRUPO},
+])
+def test_filtros_sin_filas_con_indice(siniestros_muestra, indice_muestra, filtros):
+    resultado = comprobar_igual_a_mascaras(siniestros_muestra, indice_muestra, **filtros)
+    assert resultado.empty
+
+
+def test_filas_segmento(siniestros_muestra, indice_muestra):
+    ramo = siniestros_muestra["Ramo_Desc"].astype(object)
+    canal = siniestros_muestra["Apertura_Canal_Desc"].astype(object)
+
+    filas = filas_segmento(indice_muestra, {"Ramo_Desc": EDUCATIVO, "Apertura_Canal_Desc": TARJETA})
+    esperadas = ((ramo == EDUCATIVO) & (canal == TARJETA)).values.nonzero()[0]
+    assert filas.tolist() == esperadas.tolist()
+
+    # Sin filtros son todas las filas; una etiqueta desconocida, ninguna
+    assert filas_segmento(indice_muestra, {"Ramo_Desc": "", "Apertura_Canal_Desc": None}) is None
+    assert len(filas_segmento(indice_muestra, {"Ramo_Desc": "999 - INEXISTENTE"})) == 0
+
+
+RANGOS = [
+    ("2020-03-01", "2020-09-30"),
+    # Con hora: un inicio después de medianoche excluye su propio día y un fin
+    # con hora incluye el suyo (las fechas de siniestro no tienen hora)
+    ("2020-03-05 12:00:00", "2020-06-29 18:30:00"),
+    ("2020-03-05 00:00:00", "2020-06-29"),
+    ("2020-01-01", "2020-01-01"),
+    ("2021-11-19", "2030-01-01"),
+    ("2019-01-01", "2019-12-31"),
+]
+
+
+@pytest.mark.parametrize("fecha_inicio, fecha_fin", RANGOS)
+@pytest.mark.parametrize("ramo", [None, EDUCATIVO])
+def test_rango_de_fechas_con_indice(siniestros_muestra, indice_muestra, ramo, fecha_inicio, fecha_fin):
+    assert COLUMNA_FECHA in indice_muestra
+    comprobar_igual_a_mascaras(siniestros_muestra, indice_muestra, ramo=ramo,
+                               fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+    # El rango es el corte contiguo de filas con fechas dentro de él
+    inicio, fin = rango_fechas(indice_muestra, fecha_inicio, fecha_fin)
+    fechas = siniestros_muestra["Fecha_Siniestro"]
+    esperadas = ((fechas >= fecha_inicio) & (fechas <= fecha_fin)).values.nonzero()[0]
+    assert list(range(inicio, fin)) == esperadas.tolist()
+
+
+def test_tabla_sin_ordenar_usa_mascaras(siniestros_muestra):
+    desordenados = siniestros_muestra.sample(frac=1, random_state=0).reset_index(drop=True)
+    indice = construir_indice(desordenados)
+
+    assert COLUMNA_FECHA not in indice
+    assert rango_fechas(indice, "2020-03-01", "2020-09-30") is None
+    comprobar_igual_a_mascaras(desordenados, indice, ramo=EDUCATIVO,
+                               fecha_inicio="2020-03-01", fecha_fin="2020-09-30")
+
+
+@pytest.fixture
+def funciones_filtro(directorio_datos, fijar_version):
+    """Funciones memoizadas de los callbacks de filtros sobre siniestros_muestra.txt."""
+    shutil.copy(DATOS_PRUEBA / "siniestros_muestra.txt", directorio_datos / "siniestros.txt")
+    fijar_version()
+
+    app = dash.Dash(__name__)
+    cache = Cache(app.server, config={"CACHE_TYPE": "SimpleCache"})
+    return register_filter_callbacks(app, cache)
+
+
+@pytest.mark.parametrize("fecha_inicio, fecha_fin", RANGOS[:-1])
+@pytest.mark.parametrize("tipo_triangulo", ["plata", "frecuencia"])
+def test_recorte_de_fechas_de_la_pestana_datos(funciones_filtro, tipo_triangulo, fecha_inicio, fecha_fin):
+    procesados = obtener_resultado(funciones_filtro["procesar"]("mes", tipo_triangulo, "Bruto"))
+    fechas = procesados["Fecha_Siniestro"]
+    esperado = procesados[(fechas >= fecha_inicio) & (fechas <= fecha_fin)]
+
+    handle = funciones_filtro["filtrar"]("mes", tipo_triangulo, "Bruto", "", "", "", fecha_inicio, fecha_fin)
+
+    assert len(esperado) > 0
+    pd.testing.assert_frame_equal(obtener_resultado(handle), esperado)
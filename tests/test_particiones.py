@@ -0,0 +1,124 @@
+"""
+Carga de un conjunto particionado: un filtro por una clave de partición solo
+lee los archivos de las particiones que pueden contener filas de la
+selección, y da las mismas filas que el archivo sin particionar.
+"""
+from urllib.parse import quote
+
+import pandas as pd
+import pytest
+
+from conftest import DATOS_PRUEBA, escribir_siniestros, etiquetas
+from data import data_loader
+
+
+MUESTRA = DATOS_PRUEBA / "siniestros_muestra.txt"
+
+EDUCATIVO = "096 - EDUCATIVO"
+VIDA_GRUPO = "083 - VIDA DE GRUPO"
+
+
+@pytest.fixture
+def particionado(tmp_path, monkeypatch):
+    """
+    El extracto de muestra como siniestros.txt en un directorio y, en otro,
+    particionado por ramo=/year= (sin la columna Ramo_Desc en los archivos;
+    el año 2020 de EDUCATIVO repartido en dos archivos).
+    """
+    plano = tmp_path / "plano"
+    plano.mkdir()
+    (plano / "siniestros.txt").write_bytes(MUESTRA.read_bytes())
+
+    raiz = tmp_path / "particionado"
+    df = pd.read_csv(MUESTRA, sep="\t", dtype=str)
+    anios = df["Fecha_Siniestro"].str[:4]
+    for (ramo, anio), grupo in df.groupby(["Ramo_Desc", anios]):
+        directorio = raiz / "siniestros" / f"ramo={quote(ramo)}" / f"year={anio}"
+        directorio.mkdir(parents=True)
+        grupo = grupo.drop(columns="Ramo_Desc")
+        partes = [grupo]
+        if (ramo, anio) == (EDUCATIVO, "2020"):
+            partes = [grupo.iloc[:len(grupo) // 2], grupo.iloc[len(grupo) // 2:]]
+        for i, parte in enumerate(partes):
+            escribir_siniestros(directorio / f"part-{i:04d}.txt", parte)
+
+    def usar(directorio):
+        monkeypatch.setattr(data_loader, "get_data_path", lambda: directorio)
+
+    return plano, raiz, usar
+
+
+@pytest.fixture
+def lecturas_particiones(monkeypatch):
+    """Archivos de partición leídos (ramo/año/archivo)."""
+    leidas = []
+    leer_particion = data_loader._leer_particion
+
+    def registrar(particion):
+        leidas.append("/".join(particion["path"].parts[-3:]))
+        return leer_particion(particion)
+
+    monkeypatch.setattr(data_loader, "_leer_particion", registrar)
+    return leidas
+
+
+def filas_seleccion(df, ramos=None, fecha_inicio=None, fecha_fin=None):
+    mask = pd.Series(True, index=df.index)
+    if ramos:
+        mask &= df["Ramo_Desc"].astype(object).isin(ramos)
+    if fecha_inicio:
+        mask &= df["Fecha_Siniestro"] >= pd.Timestamp(fecha_inicio)
+    if fecha_fin:
+        mask &= df["Fecha_Siniestro"] <= pd.Timestamp(fecha_fin)
+    return etiquetas(df[mask])
+
+
+@pytest.mark.parametrize("ramos, fecha_inicio, fecha_fin, archivos", [
+    (None, None, None, 5),
+    ((EDUCATIVO,), None, None, 3),
+    ((VIDA_GRUPO,), None, None, 2),
+    ((EDUCATIVO,), "2021-01-01", None, 1),
+    (None, "2020-03-15", "2020-09-30", 3),
+    ((EDUCATIVO, VIDA_GRUPO), "2021-02-01", "2021-12-31", 2),
+])
+def test_filtro_lee_solo_las_particiones_de_la_seleccion(particionado, fijar_version, lecturas_particiones,
+                                                         ramos, fecha_inicio, fecha_fin, archivos):
+    plano, raiz, usar = particionado
+    usar(plano)
+    fijar_version()
+    completo = data_loader.load_siniestros()
+
+    usar(raiz)
+    fijar_version()
+    df = data_loader.load_siniestros_particiones(ramos, fecha_inicio, fecha_fin)
+
+    # Solo se abren los archivos de los ramos y años de la selección
+    assert len(lecturas_particiones) == archivos
+    for leida in lecturas_particiones:
+        ramo, anio = leida.split("/")[:2]
+        assert ramos is None or ramo in {f"ramo={quote(r)}" for r in ramos}
+        anio = int(anio.split("=")[1])
+        assert fecha_inicio is None or anio >= pd.Timestamp(fecha_inicio).year
+        assert fecha_fin is None or anio <= pd.Timestamp(fecha_fin).year
+
+    # Las mismas filas que el archivo sin particionar con el mismo filtro
+    assert len(df) > 0
+    assert df["Fecha_Siniestro"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(etiquetas(df), filas_seleccion(completo, ramos, fecha_inicio, fecha_fin))
+
+
+def test_load_siniestros_usa_el_conjunto_particionado(particionado, fijar_version, lecturas_particiones,
+                                                      monkeypatch):
+    plano, raiz, usar = particionado
+    usar(plano)
+    fijar_version()
+    completo = data_loader.load_siniestros()
+
+    monkeypatch.setattr(data_loader, "RAMOS_SINIESTROS", (VIDA_GRUPO,))
+    usar(raiz)
+    fijar_version()
+    df = data_loader.load_siniestros()
+
+    assert sorted(lecturas_particiones) == [f"ramo={quote(VIDA_GRUPO)}/year=2020/part-0000.txt",
+                                           f"ramo={quote(VIDA_GRUPO)}/year=2021/part-0000.txt"]
+    pd.testing.assert_frame_equal(etiquetas(df), filas_seleccion(completo, [VIDA_GRUPO]))
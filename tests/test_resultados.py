@@ -0,0 +1,88 @@
+"""
+Memoización de resultados por versión de los datos.
+"""
+import flask
+import pandas as pd
+import pytest
+from dash.exceptions import PreventUpdate
+from flask_caching import Cache
+
+from data import resultados
+from data.resultados import memoizar_resultado, guardar_resultado, recuperar_resultado
+from callbacks.data_callbacks import resultado_requerido
+
+
+def crear_cache():
+    return Cache(flask.Flask(__name__), config={"CACHE_TYPE": "SimpleCache"})
+
+
+def test_clave_recalculada_se_registra_una_vez(fijar_version):
+    version = fijar_version("prueba-registro")
+    cache = crear_cache()
+    llamadas = []
+
+    @memoizar_resultado(cache)
+    def calcular(valor):
+        llamadas.append(valor)
+        return valor * 2
+
+    assert calcular(3) == 6
+    assert calcular(3) == 6
+    assert llamadas == [3]
+
+    # La entrada expira (o se desaloja) y se vuelve a calcular varias veces
+    (clave,) = [c for _, c in resultados._claves_version[version]]
+    for _ in range(3):
+        cache.delete(clave)
+        assert calcular(3) == 6
+    assert llamadas == [3, 3, 3, 3]
+
+    assert len(resultados._claves_version[version]) == 1
+    calcular(4)
+    assert len(resultados._claves_version[version]) == 2
+
+
+def test_resultado_desalojado_se_recalcula(fijar_version):
+    fijar_version("prueba-desalojo")
+    cache = crear_cache()
+    llamadas = []
+
+    @memoizar_resultado(cache, devuelve_handle=True)
+    def producir(filas):
+        llamadas.append(filas)
+        return guardar_resultado(pd.DataFrame({"valor": range(filas)}))
+
+    handle = producir(5)
+    assert producir(5) == handle and llamadas == [5]
+
+    # Desalojado del LRU (o creado por otro proceso sin backend compartido)
+    with resultados._lock:
+        del resultados._resultados[handle]
+    assert resultados.obtener_resultado(handle) is None
+
+    df = recuperar_resultado(handle)
+    assert llamadas == [5, 5]
+    pd.testing.assert_frame_equal(df, pd.DataFrame({"valor": range(5)}))
+    assert resultados.obtener_resultado(handle) is df
+
+
+def test_resultado_sin_productor_no_actualiza_la_interfaz():
+    handle = "0" * 24
+    assert recuperar_resultado(handle) is None
+    with pytest.raises(PreventUpdate):
+        resultado_requerido(handle)
+
+
+@pytest.mark.parametrize("backend", ["redis", "archivos"])
+def test_backend_compartido_no_disponible(monkeypatch, backend):
+    def fallar(*args):
+        raise ConnectionError("backend no disponible")
+
+    monkeypatch.setattr(resultados, "RESULTADOS_BACKEND", backend)
+    monkeypatch.setattr(resultados, "_existe_compartido", fallar)
+    monkeypatch.setattr(resultados, "_escribir_compartido", fallar)
+
+    # El resultado queda disponible en este proceso
+    df = pd.DataFrame({"a": [1, 2]})
+    handle = guardar_resultado(df)
+    assert resultados.obtener_resultado(handle) is df
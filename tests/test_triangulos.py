@@ -0,0 +1,172 @@
+"""
+Paridad de los triángulos con el código original.
+
+triangulos_base.json guarda los triángulos que producía la versión original
+de crear_triangulo_siniestralidad (pivote de pandas y acumulación columna a
+columna) sobre siniestros_muestra.txt. El extracto tiene huecos en los
+desarrollos (meses 3, 6, 8, 10-25; trimestres 4-7; año 1) y meses sin
+siniestros, y sus fechas de siniestro son únicas, de modo que la frecuencia
+por fecha es 1 igual que en el código original.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import cargar_esperado
+from data import ejecucion
+from data.data_processor import (procesar_siniestros, asignar_periodos, calcular_tiempo_desarrollo,
+                                 crear_triangulo_siniestralidad, construir_triangulo_acumulado,
+                                 acumular_triangulo)
+from data.ingesta import agregar_bloque, codificar_agregados
+from data.cubo import construir_cubo
+from data.acumulados import construir_tablas_acumuladas, triangulo_plata
+
+
+ESPERADOS = cargar_esperado("triangulos_base.json")
+
+
+def calcular_triangulo(siniestros, escenario):
+    """Calcula un triángulo con el procesamiento por filas de la aplicación."""
+    df = procesar_siniestros(siniestros, **escenario)
+    df = calcular_tiempo_desarrollo(asignar_periodos(df))
+    return crear_triangulo_siniestralidad(df, escenario["periodicidad"], escenario["tipo_valor"],
+                                          escenario["tipo_triangulo"])
+
+
+@pytest.mark.parametrize("nombre", list(ESPERADOS))
+def test_triangulo_reproduce_original(siniestros_muestra, nombre):
+    esperado = ESPERADOS[nombre]
+    triangulo = calcular_triangulo(siniestros_muestra, esperado["escenario"])
+
+    assert list(triangulo.index.strftime("%Y-%m-%d")) == esperado["periodos"]
+    assert list(triangulo.columns) == esperado["desarrollos"]
+    valores = np.array(esperado["valores"], dtype=np.float64)
+    np.testing.assert_array_equal(triangulo.values.astype(np.float64), valores)
+
+
+def test_construir_triangulo_desde_arrays(siniestros_muestra):
+    esperado = ESPERADOS["periodicidad=mes|tipo_triangulo=plata|tipo_valor=Bruto"]
+    df = procesar_siniestros(siniestros_muestra, "mes", "plata", "Bruto")
+    df = calcular_tiempo_desarrollo(asignar_periodos(df))
+
+    # El orden de las filas no cambia el resultado
+    orden = np.random.default_rng(0).permutation(len(df))
+    periodos, desarrollos, matriz = construir_triangulo_acumulado(
+        df["Mes_Ocurrencia"].values[orden],
+        df["Desarrollo_Meses"].values[orden].astype(int),
+        df["Pago_Bruto"].values[orden]
+    )
+
+    assert list(pd.DatetimeIndex(periodos).strftime("%Y-%m-%d")) == esperado["periodos"]
+    assert list(desarrollos) == esperado["desarrollos"]
+    np.testing.assert_array_equal(matriz, np.array(esperado["valores"], dtype=np.float64))
+
+
+def test_acumular_reinicia_en_huecos():
+    # Desarrollos 0, 1, 3, 4, 8, 9: el 3 y el 8 no siguen a un desarrollo
+    # existente y el 9, aunque sigue al 8, supera el número de columnas (como
+    # en el bucle original por etiqueta), así que los tres reinician la acumulación
+    desarrollos = np.array([0, 1, 3, 4, 8, 9])
+    matriz = np.tile([1.0, 2.0, 4.0, 8.0, 16.0, 32.0], (7, 1))
+
+    acumulado = acumular_triangulo(matriz.copy(), desarrollos)
+
+    nan = np.nan
+    np.testing.assert_array_equal(acumulado, np.array([
+        [1.0, 3.0, 4.0, 12.0, 16.0, 32.0],
+        [1.0, 3.0, 4.0, 12.0, 16.0, 32.0],
+        [1.0, 3.0, 4.0, 12.0, 16.0, nan],
+        [1.0, 3.0, 4.0, 12.0, nan, nan],
+        [1.0, 3.0, 4.0, nan, nan, nan],
+        [1.0, 3.0, nan, nan, nan, nan],
+        [1.0, nan, nan, nan, nan, nan],
+    ]))
+
+
+def test_acumular_desarrollos_consecutivos():
+    desarrollos = np.arange(4)
+    matriz = np.arange(1.0, 17.0).reshape(4, 4)
+
+    acumulado = acumular_triangulo(matriz.copy(), desarrollos)
+
+    nan = np.nan
+    np.testing.assert_array_equal(acumulado, np.array([
+        [1.0, 3.0, 6.0, 10.0],
+        [5.0, 11.0, 18.0, nan],
+        [9.0, 19.0, nan, nan],
+        [13.0, nan, nan, nan],
+    ]))
+
+
+@pytest.fixture
+def tablas_muestra(siniestros_muestra, monkeypatch):
+    """
+    Agregados, cubo y tablas acumuladas de siniestros_muestra.txt, también
+    como las cargas que usa tarea_triangulo.
+    """
+    agregados = codificar_agregados(agregar_bloque(siniestros_muestra))
+    cubo = construir_cubo(agregados)
+    fechas = agregados["Fecha_Siniestro"]
+    tablas = construir_tablas_acumuladas(cubo, fechas.min(), fechas.max())
+    monkeypatch.setattr(ejecucion, "load_agregados_siniestros", lambda: agregados)
+    monkeypatch.setattr(ejecucion, "load_cubo", lambda: cubo)
+    monkeypatch.setattr(ejecucion, "load_tablas_acumuladas", lambda: tablas)
+    return tablas
+
+
+FILTROS_PLATA = [
+    {},
+    {"ramo": "096 - EDUCATIVO"},
+    {"ramo": "083 - VIDA DE GRUPO", "canal": "Tarjeta de Credito Bancolombia"},
+    {"fecha_inicio": "2020-01-01", "fecha_fin": "2021-12-31"},
+    {"fecha_inicio": "2020-04-01", "fecha_fin": "2021-06-30"},
+    {"ramo": "096 - EDUCATIVO", "fecha_inicio": "2020-07-01", "fecha_fin": "2020-12-31"},
+    # Extremos fuera de los datos: no recortan, aunque no empiecen el día 1
+    {"fecha_inicio": "2019-06-15", "fecha_fin": "2021-03-31"},
+    {"fecha_inicio": "2020-10-01", "fecha_fin": "2022-02-10"},
+]
+
+
+@pytest.mark.parametrize("filtros", FILTROS_PLATA)
+@pytest.mark.parametrize("tipo_valor", ["Bruto", "Retenido"])
+@pytest.mark.parametrize("periodicidad", ["mes", "trimestre", "año"])
+def test_triangulo_plata_igual_a_filas(siniestros_muestra, tablas_muestra, periodicidad, tipo_valor, filtros):
+    escenario = dict(periodicidad=periodicidad, tipo_triangulo="plata", tipo_valor=tipo_valor, **filtros)
+    esperado = calcular_triangulo(siniestros_muestra, escenario)
+
+    triangulo = triangulo_plata(tablas_muestra, periodicidad, tipo_valor, **filtros)
+
+    assert list(triangulo.index) == list(esperado.index)
+    assert list(triangulo.columns) == list(esperado.columns)
+    np.testing.assert_allclose(triangulo.values, esperado.values.astype(np.float64), rtol=1e-9, atol=0)
+
+    # tarea_triangulo lo toma de las tablas acumuladas, con los períodos como texto
+    periodos, desarrollos, valores = ejecucion.tarea_triangulo(periodicidad, tipo_valor, "plata", **filtros)
+    assert periodos == list(esperado.index.strftime("%Y-%m-%d"))
+    assert desarrollos == list(esperado.columns)
+    np.testing.assert_array_equal(valores, triangulo.values)
+
+
+@pytest.mark.parametrize("fecha_inicio, fecha_fin", [("2020-01-15", "2021-06-30"), ("2020-04-01", "2021-06-20")])
+def test_triangulo_plata_meses_parciales_usa_el_cubo(siniestros_muestra, tablas_muestra, monkeypatch,
+                                                      fecha_inicio, fecha_fin):
+    assert triangulo_plata(tablas_muestra, "mes", "Bruto", fecha_inicio=fecha_inicio, fecha_fin=fecha_fin) is None
+
+    desde_cubo = []
+    triangulo_desde_cubo = ejecucion._triangulo_desde_cubo
+
+    def registrar(*args):
+        desde_cubo.append(args)
+        return triangulo_desde_cubo(*args)
+
+    monkeypatch.setattr(ejecucion, "_triangulo_desde_cubo", registrar)
+    periodos, desarrollos, valores = ejecucion.tarea_triangulo("mes", "Bruto", "plata",
+                                                               fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+
+    assert len(desde_cubo) == 1
+    esperado = calcular_triangulo(siniestros_muestra, dict(periodicidad="mes", tipo_triangulo="plata",
+                                                           tipo_valor="Bruto", fecha_inicio=fecha_inicio,
+                                                           fecha_fin=fecha_fin))
+    assert periodos == list(esperado.index.strftime("%Y-%m-%d"))
+    assert desarrollos == list(esperado.columns)
+    np.testing.assert_allclose(valores, esperado.values.astype(np.float64), rtol=1e-9, atol=0)
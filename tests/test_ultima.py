@@ -0,0 +1,123 @@
+"""
+Paridad de la siniestralidad última con el código original.
+
+ultima_base.json guarda la salida de la versión original de
+calcular_siniestralidad_ultima (bucle por período) para triángulos de
+triangulos_base.json y factores_base.json, con los tres métodos de cálculo,
+un período sin valores y expuestos con un período ausente y otro en cero.
+Los períodos llegan como texto, igual que en la aplicación.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import cargar_esperado
+from data.data_processor import (calcular_siniestralidad_ultima, proyectar_siniestralidad_ultima,
+                                 alinear_expuestos)
+
+
+ESPERADOS = cargar_esperado("ultima_base.json")
+
+
+def triangulo_de(esperado):
+    valores = np.array([[np.nan if v is None else v for v in fila] for fila in esperado["valores"]])
+    return pd.DataFrame(valores, index=esperado["periodos"], columns=esperado["desarrollos"])
+
+
+def calcular(esperado):
+    expuestos = pd.DataFrame({
+        "Periodo": pd.to_datetime(esperado["expuestos"]["Periodo"]),
+        "Total_Expuestos": esperado["expuestos"]["Total_Expuestos"]
+    })
+    return calcular_siniestralidad_ultima(
+        triangulo_de(esperado),
+        np.array(esperado["factores_promedio"]),
+        np.array(esperado["factores_acumulados"]),
+        expuestos,
+        esperado["metodo_calculo"],
+        esperado["periodicidad"],
+        esperado["tipo_triangulo"]
+    )
+
+
+@pytest.mark.parametrize("nombre", list(ESPERADOS))
+def test_ultima_reproduce_original(nombre):
+    esperado = ESPERADOS[nombre]
+    resultado = calcular(esperado)
+
+    assert list(resultado.columns) == esperado["columnas"]
+    filas = pd.DataFrame(esperado["filas"], columns=esperado["columnas"])
+
+    # Orden descendente por período con la fila TOTAL primero
+    assert resultado["Periodo"].tolist() == filas["Periodo"].tolist()
+    assert resultado["Periodo"].iloc[0] == "TOTAL"
+    assert resultado["Metodo"].tolist() == filas["Metodo"].tolist()
+
+    numericas = [col for col in esperado["columnas"] if col not in ("Periodo", "Metodo")]
+    np.testing.assert_allclose(resultado[numericas].values.astype(np.float64),
+                               filas[numericas].values.astype(np.float64), rtol=1e-12, atol=0)
+
+
+def test_fila_total():
+    resultado = calcular(ESPERADOS["mes_plata|auto"])
+    total = resultado[resultado["Periodo"] == "TOTAL"].iloc[0]
+    periodos = resultado[resultado["Periodo"] != "TOTAL"]
+
+    assert total["Metodo"] == "Combinado"
+    for columna in ("Expuestos", "Valor_Inicial", "Valor_Actual", "Siniestralidad_Ultima", "IBNR"):
+        np.testing.assert_allclose(total[columna], periodos[columna].sum(), rtol=1e-12)
+    np.testing.assert_allclose(total["Loss_Ratio"], total["Siniestralidad_Ultima"] / total["Expuestos"], rtol=1e-12)
+
+
+def test_auto_usa_bf_en_el_ultimo_anio():
+    esperado = ESPERADOS["mes_plata|auto"]
+    resultado = calcular(esperado).set_index("Periodo").drop("TOTAL")
+
+    fechas = pd.to_datetime(resultado.index)
+    recientes = fechas >= fechas.max() - pd.DateOffset(years=1)
+    assert recientes.any() and not recientes.all()
+    assert (resultado["Metodo"][recientes] == "bornhuetter_ferguson").all()
+    assert (resultado["Metodo"][~recientes] == "chain_ladder").all()
+
+
+def test_proyeccion_apilada_igual_a_individual():
+    triangulos = [triangulo_de(ESPERADOS[nombre]) for nombre in ("regular_fila_vacia|auto",
+                                                                  "regular_fila_vacia|bornhuetter_ferguson")]
+    valores = np.stack([t.values for t in triangulos])
+    factores = np.array([ESPERADOS["regular_fila_vacia|auto"]["factores_acumulados"],
+                         np.linspace(1.5, 1.0, valores.shape[2] - 1)])
+    expuestos = np.array([[1000.0, 2000.0, 1500.0, 800.0, 1200.0, 900.0],
+                          [500.0, 700.0, 600.0, 650.0, 800.0, 750.0]])
+    recientes = np.array([False, False, False, True, True, True])
+
+    apilada = proyectar_siniestralidad_ultima(valores, factores, expuestos, recientes)
+
+    for k in range(len(valores)):
+        individual = proyectar_siniestralidad_ultima(valores[k], factores[k], expuestos[k], recientes)
+        for clave, valor in individual.items():
+            np.testing.assert_array_equal(apilada[clave][k], valor)
+
+    # Período sin valores: última diagonal desconocida y siniestralidad cero
+    assert apilada["posiciones"][0, 2] == -1
+    assert apilada["siniestralidad_ultima"][0, 2] == 0.0
+
+
+def test_alinear_expuestos_por_mes():
+    expuestos = pd.DataFrame({
+        "Periodo": pd.to_datetime(["2021-01-01", "2021-02-15", "2021-04-01", "2021-04-01", "2021-05-01"]),
+        "Total_Expuestos": [100.0, 200.0, 300.0, 400.0, 0.0]
+    })
+
+    # Cruce por la clave entera del mes, con cualquier día del mes; los
+    # duplicados toman el último y los ausentes o no positivos el valor por defecto
+    periodos = ["2021-01-01", "2021-02-01", "2021-03-01", "2021-04-01", "2021-05-01"]
+    esperados = [100.0, 200.0, 1000.0, 400.0, 1000.0]
+    np.testing.assert_array_equal(alinear_expuestos(expuestos, periodos), esperados)
+    np.testing.assert_array_equal(alinear_expuestos(expuestos, pd.to_datetime(periodos)), esperados)
+    np.testing.assert_array_equal(alinear_expuestos(expuestos, [f"{p} 00:00:00" for p in periodos]), esperados)
+
+    # Trimestres: el período es el mes en que empieza
+    np.testing.assert_array_equal(alinear_expuestos(expuestos, ["2021-01-01", "2021-04-01"], valor_defecto=1),
+                                  [100.0, 400.0])
+
+    np.testing.assert_array_equal(alinear_expuestos(pd.DataFrame(), periodos), np.full(5, 1000.0))
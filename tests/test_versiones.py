@@ -0,0 +1,164 @@
+"""
+Recarga en caliente: una versión nueva de los archivos se activa sin afectar
+a las peticiones que ya fijaron la anterior, y al descartar la anterior se
+borran sus datos y sus entradas de caché.
+"""
+import contextvars
+import os
+import shutil
+
+import flask
+import pytest
+from flask_caching import Cache
+
+from conftest import DATOS_PRUEBA
+from data import data_loader, data_processor, resultados, versiones
+from data.resultados import clave_frecuencia, memoizar_resultado
+
+
+class Peticion:
+    """Petición en curso: fija la versión activa en su propio contexto hasta terminar."""
+
+    def __init__(self):
+        self.contexto = contextvars.Context()
+        self.token = self.contexto.run(versiones.fijar_version)
+        self.version = self.token[0]
+
+    def run(self, funcion, *args):
+        return self.contexto.run(funcion, *args)
+
+    def terminar(self):
+        self.contexto.run(versiones.liberar_version, self.token)
+
+
+@pytest.fixture
+def datos(directorio_datos, monkeypatch):
+    """siniestros.txt de muestra, sin versión activa ni recarga en curso."""
+    monkeypatch.setattr(data_loader, "ALMACEN_SINIESTROS", "snapshot")
+    monkeypatch.setitem(versiones._estado, "activa", None)
+    monkeypatch.setitem(versiones._estado, "cargando", None)
+    monkeypatch.setitem(versiones._estado, "error", None)
+    path = directorio_datos / "siniestros.txt"
+    shutil.copy(DATOS_PRUEBA / "siniestros_muestra.txt", path)
+    os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    yield path
+    versiones.descartar_version(versiones._estado["activa"])
+
+
+def modificar(path):
+    """Borra las últimas filas del archivo (cambia su firma y su contenido)."""
+    lineas = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text("".join(lineas[:-5]), encoding="utf-8")
+
+
+def crear_cache():
+    return Cache(flask.Flask(__name__), config={"CACHE_TYPE": "SimpleCache"})
+
+
+def test_recarga_activa_la_version_nueva(datos):
+    anterior = versiones.get_version_activa()
+    peticion = Peticion()
+    filas = len(peticion.run(data_loader.load_siniestros))
+    peticion.terminar()
+
+    # Sin cambios en los archivos no hay recarga
+    assert versiones.recargar(data_loader.load_siniestros) is False
+
+    modificar(datos)
+    assert versiones.recargar(data_loader.load_siniestros) is True
+
+    nueva = versiones.get_version_activa()
+    assert nueva != anterior and nueva == data_loader.version_en_disco()
+    peticion = Peticion()
+    assert peticion.version == nueva
+    assert len(peticion.run(data_loader.load_siniestros)) == filas - 5
+    peticion.terminar()
+
+    # Nadie usa la anterior: se descartó al activar la nueva
+    assert versiones.get_estado_versiones()["en_memoria"] == [nueva]
+
+
+def test_peticion_en_curso_conserva_su_version(datos):
+    peticion = Peticion()
+    siniestros = peticion.run(data_loader.load_siniestros)
+
+    modificar(datos)
+    assert versiones.recargar(data_loader.load_siniestros) is True
+    assert versiones.get_version_activa() != peticion.version
+
+    # La petición sigue viendo los mismos datos, aunque el archivo ya cambió
+    assert peticion.run(versiones.version_actual) == peticion.version
+    assert peticion.run(data_loader.load_siniestros) is siniestros
+    assert peticion.version in versiones.get_estado_versiones()["en_memoria"]
+
+    # Al terminar, la versión anterior ya no la usa nadie y se descarta
+    peticion.terminar()
+    assert versiones.get_estado_versiones()["en_memoria"] == [versiones.get_version_activa()]
+
+
+def test_descartar_borra_las_caches_de_la_version(datos):
+    cache = crear_cache()
+
+    @memoizar_resultado(cache)
+    def calcular(valor):
+        return valor * 2
+
+    def calcular_en_version():
+        clave = clave_frecuencia(ramo="096")
+        fechas = data_loader.load_siniestros()["Fecha_Siniestro"].values
+        data_processor.conteo_por_fecha(fechas, clave=clave)
+        calcular(3)
+        (clave_memoizada,) = [c for _, c in resultados._claves_version[versiones.version_actual()]]
+        return clave, clave_memoizada
+
+    peticion = Peticion()
+    frecuencia_anterior, resultado_anterior = peticion.run(calcular_en_version)
+
+    modificar(datos)
+    assert versiones.recargar(data_loader.load_siniestros) is True
+    nueva = Peticion()
+    frecuencia_nueva, resultado_nueva = nueva.run(calcular_en_version)
+
+    # Mientras la petición anterior siga en curso se conservan sus entradas
+    assert frecuencia_anterior in data_processor._frecuencias
+    assert cache.get(resultado_anterior) == 6
+
+    peticion.terminar()
+    assert peticion.version not in resultados._claves_version
+    assert frecuencia_anterior not in data_processor._frecuencias
+    assert cache.get(resultado_anterior) is None
+
+    # Las de la versión activa no se tocan
+    assert frecuencia_nueva in data_processor._frecuencias
+    assert cache.get(resultado_nueva) == 6
+    assert resultados._claves_version[nueva.version] == {(cache.cache, resultado_nueva)}
+    nueva.terminar()
+
+
+def test_error_de_un_descarte_no_detiene_los_demas(monkeypatch):
+    llamadas = []
+
+    def fallar(version):
+        raise RuntimeError("caché no disponible")
+
+    monkeypatch.setattr(versiones, "_al_descartar", [fallar, llamadas.append])
+    versiones.descartar_version("descartada")
+    assert llamadas == ["descartada"]
+
+
+def test_recarga_fallida_mantiene_la_version_activa(datos):
+    anterior = versiones.get_version_activa()
+    modificar(datos)
+
+    def cargar():
+        data_loader.load_siniestros()
+        raise ValueError("archivo incompleto")
+
+    assert versiones.recargar(cargar) is False
+    estado = versiones.get_estado_versiones()
+    assert estado["activa"] == anterior and estado["cargando"] is None
+    assert estado["error"] == "archivo incompleto"
+
+    # La versión a medio cargar se descartó
+    assert data_loader.version_en_disco() not in estado["en_memoria"]
+    assert estado["en_uso"] == {}
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from data.periodos import periodo_fecha
+
 
 def format_currency(value, decimals=0):
     """
@@ -97,12 +99,8 @@ def categorize_periods(df, date_column, period_type="month"):
     if df[date_column].dtype != "datetime64[ns]":
         df[date_column] = pd.to_datetime(df[date_column])
     
-    # Categorizar según tipo de período
-    if period_type == "month":
-        df["Period"] = df[date_column].dt.to_period("M").dt.to_timestamp()
-    elif period_type == "quarter":
-        df["Period"] = df[date_column].dt.to_period("Q").dt.to_timestamp()
-    elif period_type == "year":
-        df["Period"] = df[date_column].dt.to_period("Y").dt.to_timestamp()
+    # Categorizar según tipo de período (aritmética entera de meses)
+    if period_type in ("month", "quarter", "year"):
+        df["Period"] = periodo_fecha(df[date_column], period_type)
     
     return df
\ No newline at end of file
@@ -0,0 +1,52 @@
+import os
+import sys
+
+
+def uso_memoria(pid=None):
+    """
+    Obtiene el uso de memoria de un proceso.
+
+    En Linux se lee /proc/<pid>/smaps_rollup, que distingue la memoria
+    compartida con otros procesos (por ejemplo, los datos heredados del
+    proceso maestro de gunicorn) de la privada. PSS reparte cada página
+    compartida entre los procesos que la usan, así que la suma de los PSS de
+    todos los workers es la memoria física real del servicio.
+
+    Args:
+        pid: Identificador del proceso (por defecto el actual)
+
+    Returns:
+        Diccionario con pid y memoria en MB: rss, pss, compartida y privada
+        (solo rss máximo del proceso actual si /proc no está disponible)
+    """
+    pid = pid or os.getpid()
+    campos = {
+        "Rss": "rss_mb",
+        "Pss": "pss_mb",
+        "Shared_Clean": "compartida_mb",
+        "Shared_Dirty": "compartida_mb",
+        "Private_Clean": "privada_mb",
+        "Private_Dirty": "privada_mb"
+    }
+
+    try:
+        resultado = {"pid": pid, "rss_mb": 0.0, "pss_mb": 0.0, "compartida_mb": 0.0, "privada_mb": 0.0}
+        with open(f"/proc/{pid}/smaps_rollup") as archivo:
+            for linea in archivo:
+                partes = linea.split()
+                nombre = partes[0].rstrip(":")
+                if nombre in campos:
+                    resultado[campos[nombre]] += int(partes[1]) / 1024
+        return {clave: round(valor, 1) if isinstance(valor, float) else valor for clave, valor in resultado.items()}
+    except (OSError, IndexError, ValueError):
+        pass
+
+    # Sin /proc: solo el máximo de memoria residente del proceso actual (no existe en Windows)
+    try:
+        import resource
+    except ImportError:
+        return {"pid": os.getpid()}
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    divisor = 1024 ** 2 if sys.platform == "darwin" else 1024
+    return {"pid": os.getpid(), "rss_max_mb": round(maximo / divisor, 1)}